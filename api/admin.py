@@ -16,7 +16,8 @@ from .models import (
     Webhook, CopyField, StagePublisher, Quiz, ResponseFlattener, TaskAward,
     DynamicJson, PreviousManual, AutoNotification, ConditionalLimit,
     DatetimeSort, ErrorItem, TestWebhook, CampaignLinker, ApproveLink,
-    Language, Category, Country, TranslationAdapter, TranslateKey, Translation, CountTasksModifier, Volume, StageVolume
+    Language, Category, Country, TranslationAdapter, TranslateKey, Translation, CountTasksModifier, Volume, StageVolume,
+    PropagationJob, TaskStageCounter, PropagationStepStat, ExportJob
 )
 from django.contrib import messages
 from django.utils.translation import ngettext
@@ -244,6 +245,7 @@ class ChainAdmin(admin.ModelAdmin):
     list_filter = (
         "is_individual",
         "order_in_individuals",
+        "async_propagation",
         AutocompleteFilterFactory("Campaign", "campaign"),
     )
     autocomplete_fields = ("campaign",)
@@ -1099,6 +1101,40 @@ class StageVolumeAdmin(admin.ModelAdmin):
     )
 
 
+class PropagationJobAdmin(admin.ModelAdmin):
+    list_display = ("id", "task", "status", "next_direct_task",
+                    "created_at", "updated_at")
+    list_filter = ("status", "created_at")
+    search_fields = ("task__id",)
+    raw_id_fields = ("task", "next_direct_task")
+
+
+class ExportJobAdmin(admin.ModelAdmin):
+    list_display = ("id", "kind", "user", "campaign", "status", "rows_done",
+                    "rows_total", "size", "created_at", "updated_at")
+    list_filter = ("kind", "status", "created_at")
+    search_fields = ("user__email", "file")
+    raw_id_fields = ("user", "campaign")
+    exclude = ("query",)
+
+
+class TaskStageCounterAdmin(admin.ModelAdmin):
+    list_display = ("id", "stage", "tasks", "complete_tasks", "assignees",
+                    "complete_assignees", "updated_at")
+    search_fields = ("stage__id", "stage__name")
+    raw_id_fields = ("stage",)
+    readonly_fields = ("tasks", "complete_tasks", "assignees",
+                       "complete_assignees")
+
+
+class PropagationStepStatAdmin(admin.ModelAdmin):
+    list_display = ("id", "stage", "step", "calls", "seconds", "max_seconds",
+                    "queries", "tasks", "updated_at")
+    list_filter = ("step",)
+    search_fields = ("stage__id", "stage__name")
+    raw_id_fields = ("campaign", "chain", "stage")
+
+
 admin.site.register(Token, TokenAdmin)
 admin.site.register(Country, CountryAdmin)
 admin.site.register(Language, LanguageAdmin)
@@ -1141,4 +1177,8 @@ admin.site.register(ErrorItem, ErrorItemAdmin)
 admin.site.register(TestWebhook, TestWebhookAdmin)
 admin.site.register(CountTasksModifier, CountTasksModifierAdmin)
 admin.site.register(Volume, VolumeAdmin)
+admin.site.register(PropagationJob, PropagationJobAdmin)
+admin.site.register(ExportJob, ExportJobAdmin)
+admin.site.register(TaskStageCounter, TaskStageCounterAdmin)
+admin.site.register(PropagationStepStat, PropagationStepStatAdmin)
 admin.site.register(StageVolume, StageVolumeAdmin)
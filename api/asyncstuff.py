@@ -1,26 +1,34 @@
 import json
 import math
-import sys
 import traceback
+from itertools import islice
 
 import requests
 from django.apps import apps
+from django.conf import settings
+from django.db import IntegrityError, transaction
 from django.db.models import F, Count
 from django.utils import timezone
+from django_q.tasks import async_task
 from rest_framework import status
 
 from api.api_exceptions import CustomApiException
 from api.constans import (
     TaskStageConstants, AutoNotificationConstants, ErrorConstants,
-    ConditionalStageConstants)
+    PropagationJobConstants, PropagationStepConstants, ExportJobConstants)
 from api.models import (
-    TaskStage, ConditionalStage, Task, Case,
-    RankLimit, DatetimeSort, ApproveLink
+    ConditionalStage, Task, Case,
+    RankLimit, ApproveLink, PropagationJob, TaskStageCounter, ExportJob
 )
+from api.utils import profiling
+from api.utils.chain_graph import get_stage_node
+from api.utils.conditional_rules import get_compiled_conditions
+from api.utils.exports import get_fingerprint, write_export
 from api.utils.utils import find_user, value_from_json, reopen_task, \
     get_ranks_where_user_have_parent_ranks, \
-    connect_user_with_ranks, give_task_awards, process_auto_completed_task, \
+    connect_user_with_ranks, give_task_awards, \
     get_conditional_limit_count
+from api.utils.webhook_transport import transport
 
 
 def get_next_direct_task(next_direct_task, task):
@@ -35,21 +43,24 @@ def get_next_direct_task(next_direct_task, task):
 
 
 def process_on_chain(current_stage, task):
-    in_conditional_pingpong_stages = ConditionalStage.objects \
-        .filter(out_stages=current_stage) \
-        .filter(pingpong=True)
+    in_conditional_pingpong_stages = get_stage_node(current_stage) \
+        .in_pingpong_stages
     if len(in_conditional_pingpong_stages) > 0:
         for stage in in_conditional_pingpong_stages:
             if evaluate_conditional_stage(stage, task):
-                in_tasks = Task.objects.filter(out_tasks=task)
-                for in_task in in_tasks:
-                    in_task.complete = False
-                    in_task.reopened = True
-                    in_task.save()
+                with profiling.step(PropagationStepConstants.PINGPONG,
+                                    current_stage):
+                    Task.objects.filter(out_tasks=task).update(
+                        complete=False, reopened=True,
+                        updated_at=timezone.now())
             else:
-                process_out_stages(current_stage, task)
+                with profiling.step(PropagationStepConstants.OUT_STAGES,
+                                    current_stage):
+                    process_out_stages(current_stage, task)
     else:
-        process_out_stages(current_stage, task)
+        with profiling.step(PropagationStepConstants.OUT_STAGES,
+                            current_stage):
+            process_out_stages(current_stage, task)
 
 
 def give_rank_by_campaignlinks(task):
@@ -75,13 +86,20 @@ def create_translation_based_on_answers(stage, task):
     )
 
 def process_completed_task(task):
+    with profiling.trace(), \
+            profiling.step(PropagationStepConstants.TOTAL, task.stage):
+        return propagate_completed_task(task)
+
+
+def propagate_completed_task(task):
     current_stage = task.stage
 
     # Check if task is a quiz, and if so, score and save result inside
     # responses as meta_quiz_score. If quiz threshold is set, quiz with
     # score lower than threshold will be opened and returned without
     # chain propagation.
-    task, is_reopened = task.evaluate_quiz()
+    with profiling.step(PropagationStepConstants.QUIZ, current_stage):
+        task, is_reopened = task.evaluate_quiz()
     if is_reopened:
         return task
     del is_reopened
@@ -96,40 +114,207 @@ def process_completed_task(task):
     if next_direct_task is not None and not task.stage.chain.is_individual:
         return get_next_direct_task(next_direct_task, task)
 
-    create_translation_based_on_answers(current_stage, task)
+    with profiling.step(PropagationStepConstants.TRANSLATION_ADAPTER,
+                        current_stage):
+        create_translation_based_on_answers(current_stage, task)
 
     process_on_chain(current_stage, task)
-    detecting_auto_notifications(current_stage, task)
-
-    give_task_awards(current_stage, task)
-    give_rank_by_campaignlinks(task)
-
-    next_direct_task = task.get_next_demo()
+    with profiling.step(PropagationStepConstants.AUTO_NOTIFICATIONS,
+                        current_stage):
+        detecting_auto_notifications(current_stage, task)
+
+    with profiling.step(PropagationStepConstants.TASK_AWARDS, current_stage):
+        give_task_awards(current_stage, task)
+    with profiling.step(PropagationStepConstants.CAMPAIGN_LINKERS,
+                        current_stage):
+        give_rank_by_campaignlinks(task)
+
+    with profiling.step(PropagationStepConstants.DEMO_NEXT, current_stage):
+        next_direct_task = task.get_next_demo()
     if next_direct_task is not None:
         if next_direct_task.assignee == task.assignee:
             return next_direct_task
     return None
 
 
-def process_out_stages(current_stage, task):
-    out_task_stages = TaskStage.objects \
-        .filter(in_stages=current_stage)
-    out_conditional_stages = ConditionalStage.objects \
-        .filter(in_stages=current_stage).exclude(
-        conditional_limit__isnull=False
+def enqueue_completed_task(task):
+    """Schedules chain propagation of the completed task on the django_q
+    cluster. While previous propagation of the task is not started yet,
+    the same job is returned, so repeated submits are propagated once.
+    """
+    job = task.propagation_jobs.filter(
+        status=PropagationJobConstants.PENDING
+    ).first()
+    if job is None:
+        job = PropagationJob.objects.create(task=task)
+        transaction.on_commit(
+            lambda: async_task(run_propagation_job, job.id,
+                               task_name='process_completed_task',
+                               group='follow_chain')
+        )
+    return job
+
+
+def enqueue_completed_tasks(tasks):
+    """Same as enqueue_completed_task for many tasks at once. New jobs are
+    created in one query and run by one django_q task.
+    Returns jobs by task ids.
+    """
+    jobs = {
+        job.task_id: job for job in PropagationJob.objects.filter(
+            task__in=tasks, status=PropagationJobConstants.PENDING
+        ).order_by('created_at')
+    }
+    new_jobs = PropagationJob.objects.bulk_create([
+        PropagationJob(task=task) for task in tasks if task.id not in jobs
+    ])
+    if new_jobs:
+        job_ids = [job.id for job in new_jobs]
+        transaction.on_commit(
+            lambda: async_task(run_propagation_jobs, job_ids,
+                               task_name='process_completed_tasks',
+                               group='follow_chain')
+        )
+    jobs.update({job.task_id: job for job in new_jobs})
+    return jobs
+
+
+def run_propagation_jobs(job_ids):
+    return [run_propagation_job(job_id) for job_id in job_ids]
+
+
+def run_propagation_job(job_id):
+    """Propagates the task of a pending job. The job stays locked and
+    pending until propagation is committed, so a worker that crashes midway
+    leaves it pending for a retry. Jobs locked by another worker are
+    skipped.
+    """
+    try:
+        with transaction.atomic():
+            job = PropagationJob.objects \
+                .select_for_update(skip_locked=True) \
+                .filter(id=job_id, status=PropagationJobConstants.PENDING) \
+                .first()
+            if job is None:
+                return None
+            job.next_direct_task = process_completed_task(job.task)
+            job.status = PropagationJobConstants.DONE
+            job.save()
+            return job
+    except Exception as exc:
+        PropagationJob.objects.filter(
+            id=job_id, status=PropagationJobConstants.PENDING
+        ).update(status=PropagationJobConstants.FAILED, error=str(exc),
+                 updated_at=timezone.now())
+        return PropagationJob.objects.get(id=job_id)
+
+
+def enqueue_export_job(user, kind, params, campaign=None, shared=False):
+    """Schedules a CSV export on the django_q cluster. While an identical
+    export is in progress, its job is returned instead. Rows of shared
+    exports don't depend on the user, so they are shared between users.
+    """
+    fingerprint = get_fingerprint(kind, params, None if shared else user.id)
+    expire_export_jobs(fingerprint)
+    in_progress = ExportJob.objects.filter(
+        fingerprint=fingerprint,
+        status__in=ExportJobConstants.IN_PROGRESS
+    )
+    job = in_progress.first()
+    if job is not None:
+        return job
+
+    def create_job():
+        with transaction.atomic():
+            return ExportJob.objects.create(
+                user=user, campaign=campaign, kind=kind, params=params,
+                fingerprint=fingerprint
+            )
+
+    try:
+        job = create_job()
+    except IntegrityError:
+        job = in_progress.first()
+        if job is not None:
+            return job
+        # The conflicting job finished before it could be read.
+        job = create_job()
+    transaction.on_commit(
+        lambda: async_task(run_export_job, job.id,
+                           task_name='export', group='export',
+                           timeout=settings.EXPORT_JOB_TIMEOUT)
     )
-    out_conditional_limit_stages = ConditionalStage.objects.filter(
-        in_stages=current_stage,
-        conditional_limit__isnull=False
-    ).order_by('conditional_limit__order', 'conditional_limit__created_at')
-    for stage in out_conditional_stages:
+    return job
+
+
+def expire_export_jobs(fingerprint):
+    """Fails in progress jobs of the fingerprint whose lease expired:
+    jobs not updated for EXPORT_JOB_LEASE seconds, as running jobs save
+    progress after every chunk. Their workers were killed or their
+    django_q tasks lost, so new identical exports are not blocked by them.
+    """
+    now = timezone.now()
+    ExportJob.objects.filter(
+        fingerprint=fingerprint,
+        status__in=ExportJobConstants.IN_PROGRESS,
+        updated_at__lt=now - timezone.timedelta(
+            seconds=settings.EXPORT_JOB_LEASE)
+    ).update(status=ExportJobConstants.FAILED,
+             error=ErrorConstants.EXPORT_JOB_EXPIRED,
+             updated_at=now)
+
+
+def run_export_job(job_id):
+    with transaction.atomic():
+        job = ExportJob.objects.select_for_update() \
+            .filter(id=job_id, status=ExportJobConstants.PENDING) \
+            .first()
+        if job is None:
+            return None
+        job.status = ExportJobConstants.RUNNING
+        job.save()
+
+    try:
+        job.file, job.size = write_export(job)
+    except Exception as exc:
+        job.status = ExportJobConstants.FAILED
+        job.error = str(exc)
+        job.save(update_fields=["status", "error", "updated_at"])
+        return job
+
+    job.status = ExportJobConstants.DONE
+    job.save(update_fields=["status", "file", "size", "updated_at"])
+    return job
+
+
+def process_out_stages(current_stage, task):
+    node = get_stage_node(current_stage)
+    for stage in node.out_conditional_stages:
         process_conditional(stage, task)
-    for stage in out_conditional_limit_stages:
+    for stage in node.out_conditional_limit_stages:
         is_conditional_limit_created = process_conditional_limit(stage, task)
         if is_conditional_limit_created:
             break
-    for stage in out_task_stages:
-        create_new_task(stage, task)
+    webhook_stages = [i for i in node.out_task_stages if i.webhook_address]
+    webhook_results = dict(zip(
+        [stage.id for stage in webhook_stages],
+        send_webhook_requests(webhook_stages, task)
+    )) if len(webhook_stages) > 1 else {}
+    builders = []
+    for stage in node.out_task_stages:
+        if TaskBuilder.can_build(stage):
+            with profiling.step(PropagationStepConstants.CREATE_TASK, stage,
+                                tasks=1):
+                builders.append(TaskBuilder(stage, task).build())
+        else:
+            create_new_task(stage, task,
+                            webhook_result=webhook_results.get(stage.id))
+    with profiling.step(PropagationStepConstants.WRITE_TASKS, current_stage,
+                        tasks=len(builders)):
+        TaskBuilder.write_all(builders)
+    for builder in builders:
+        process_create_new_task_based_and_stage_assign(
+            builder.stage, builder.task, task)
 
 
 def process_conditional_limit(stage, in_task):
@@ -139,7 +324,7 @@ def process_conditional_limit(stage, in_task):
     return False
 
 
-def send_webhook_request(stage, in_task):
+def get_webhook_params(stage, in_task):
     params = {}
     if stage.webhook_payload_field:
         params[stage.webhook_payload_field] = json.dumps(in_task.responses)
@@ -148,8 +333,43 @@ def send_webhook_request(stage, in_task):
     if stage.webhook_params:
         params.update(stage.webhook_params)
     params["in_task_id"] = in_task.id
-    response = requests.get(stage.webhook_address, params=params)
-    if response:
+    return params
+
+
+def copy_fields_to_webhook_input(stage, in_task):
+    for copy_field in get_stage_node(stage).copy_fields:
+        in_task.responses = copy_field.copy_response(in_task)
+
+
+def send_webhook_requests(stages, in_task):
+    """Sends requests of several webhook stages concurrently. Returns
+    pairs of sent params and response or exception in order of stages.
+    """
+    params = []
+    for stage in stages:
+        copy_fields_to_webhook_input(stage, in_task)
+        # Params of the stages share in task responses, so each request
+        # gets a snapshot as it would have been sent sequentially.
+        params.append(dict(get_webhook_params(stage, in_task)))
+    responses = transport.map(
+        [("GET", stage.webhook_address, {"params": stage_params})
+         for stage, stage_params in zip(stages, params)],
+        error_sources=stages
+    )
+    return list(zip(params, responses))
+
+
+def send_webhook_request(stage, in_task, result=None):
+    if result is None:
+        params = get_webhook_params(stage, in_task)
+        try:
+            response = transport.get(stage.webhook_address, params=params,
+                                     error_source=stage)
+        except requests.RequestException as exc:
+            response = exc
+    else:
+        params, response = result
+    if not isinstance(response, Exception) and response:
         if stage.webhook_response_field:
             response = response.json()[stage.webhook_response_field]
         else:
@@ -158,18 +378,18 @@ def send_webhook_request(stage, in_task):
     else:
         stage.generate_error(
             type(KeyError),
-            "Error on the webhook side: {0}".format(stage.webhook),
+            "Error on the webhook side: {0}".format(stage.webhook_address),
             tb_info=traceback.format_exc(),
-            data=f"{params}\nStage: {stage}"
+            data=f"{params}\nStage: {stage}\nResponse: {response}"
         )
         raise CustomApiException(503,
                                  "Service can't handle this request due to unforeseen behaviour of another service.")
 
 
-def process_webhook(stage, in_task, data=None):
+def process_webhook(stage, in_task, data=None, webhook_result=None):
     data = data if data else dict()
     data['stage'], data['case'] = stage, in_task.case
-    response = send_webhook_request(stage, in_task)
+    response = send_webhook_request(stage, in_task, webhook_result)
     data["responses"] = response
     data["complete"] = True
     new_task = in_task.out_tasks.filter(stage=stage).first()
@@ -198,92 +418,137 @@ def process_integration(stage, in_task):
         return in_task
 
 
-def process_stage_assign(stage, data, in_task, user):
-    if user:
-        data["assignee"] = user
-    elif stage.assign_user_by == TaskStageConstants.STAGE:
-        if stage.assign_user_from_stage is not None:
-            assignee_task = Task.objects \
-                .filter(stage=stage.assign_user_from_stage) \
-                .filter(case=in_task.case)
-            data["assignee"] = assignee_task[0].assignee
-    new_task = in_task.out_tasks.filter(stage=stage).first()
-    if stage.chain.is_individual and new_task:
-        # implement new logic task creation
-        # Task.objects.filter(id=new_task.id).update(**data)
-        pass
-    else:
-        new_task = Task.objects.create(**data)
-        new_task.in_tasks.add(in_task)
-    return new_task
-
-
-def trigger_on_copy_input(stage, new_task, in_task):
-    if stage.copy_input:
-        new_task.responses = in_task.responses
-    return new_task
-
-
-def trigger_on_webhook(stage, new_task):
-    webhook = stage.get_webhook()
-    if webhook and webhook.is_triggered:
-        webhook.trigger(new_task)
-
-
-def set_copied_fields(stage, new_task, responses=None):
-    responses = responses if responses else {}
-    for copy_field in stage.copy_fields.all():
-        responses.update(copy_field.copy_response(new_task))
-
-    if new_task.responses:
-        new_task.responses.update(responses)
-    else:
-        new_task.responses = responses
-
-    new_task.save()
-
-    return new_task
-
-
-def set_count_tasks_fields(stage, new_task, responses=None):
-    responses = responses if responses else {}
-    for count_tasks_modifier in stage.count_tasks_modifier.all():
-
-        task_query = Task.objects.filter(stage=count_tasks_modifier.stage_to_count_tasks_from)
-
-        if count_tasks_modifier.count_unique_users:
-            task_query = task_query.values('assignee').distinct()
-
-        responses[count_tasks_modifier.field_to_write_count_to] = task_query.count()
-
-        #Complete tasks
-        task_query = Task.objects.filter(stage=count_tasks_modifier.stage_to_count_tasks_from,
-                                         complete=True)
-
-        if count_tasks_modifier.count_unique_users:
-            task_query = task_query.values('assignee').distinct()
-
-        responses[count_tasks_modifier.field_to_write_count_complete] = task_query.count()
+class TaskBuilder:
+    """Collects fields of the next task of the stage in memory, so the
+    task is written with a single INSERT and a single in_tasks row.
+    Builders of tasks created on one completion are written together
+    with write_all.
+    """
 
-    if new_task.responses:
-        new_task.responses.update(responses)
-    else:
-        new_task.responses = responses
+    def __init__(self, stage, in_task, user=None):
+        self.stage = stage
+        self.in_task = in_task
+        self.user = user
+        self.node = get_stage_node(stage)
+        self.task = None
+
+    @staticmethod
+    def can_build(stage):
+        return not stage.webhook_address and not stage.get_integration() \
+            and not stage._translation_adapter
+
+    def build(self):
+        self.assign()
+        self.copy_input()
+        self.trigger_webhook()
+        self.set_period()
+        self.set_copied_fields()
+        self.set_count_tasks_fields()
+        self.set_auto_complete()
+        self.assign_by_previous_manual()
+        return self
+
+    def assign(self):
+        data = {"stage": self.stage, "case": self.in_task.case}
+        if self.user:
+            data["assignee"] = self.user
+        elif self.stage.assign_user_by == TaskStageConstants.STAGE:
+            if self.stage.assign_user_from_stage_id is not None:
+                assignee_task = Task.objects \
+                    .filter(stage_id=self.stage.assign_user_from_stage_id) \
+                    .filter(case=self.in_task.case)
+                data["assignee"] = assignee_task[0].assignee
+        if self.stage.chain.is_individual:
+            # implement new logic task creation
+            # Task.objects.filter(id=new_task.id).update(**data)
+            self.task = self.in_task.out_tasks.filter(stage=self.stage) \
+                .first()
+        if self.task is None:
+            self.task = Task(**data)
+
+    def copy_input(self):
+        if self.stage.copy_input:
+            self.task.responses = self.in_task.responses
+
+    def trigger_webhook(self):
+        webhook = self.stage.get_webhook()
+        if webhook and webhook.is_triggered:
+            # Webhook data may be injected from in tasks of the new task,
+            # so it has to be written before the request.
+            self.write()
+            webhook.trigger(self.task)
+
+    def set_period(self):
+        datetime_task = self.node.datetime_sort
+        if datetime_task:
+            if datetime_task.how_much and datetime_task.after_how_much:
+                start_period = timezone.now() + \
+                               timezone.timedelta(hours=datetime_task.after_how_much)
+                end_period = start_period + timezone.timedelta(hours=datetime_task.how_much)
+                self.task.start_period = start_period
+                self.task.end_period = end_period
+
+    def set_copied_fields(self):
+        responses = {}
+        for copy_field in self.node.copy_fields:
+            responses.update(copy_field.copy_response(self.task))
+        self.update_responses(responses)
+
+    def set_count_tasks_fields(self):
+        responses = {}
+        for count_tasks_modifier in self.node.count_tasks_modifiers:
+            counter = TaskStageCounter.get_for_stage(
+                count_tasks_modifier.stage_to_count_tasks_from_id)
+
+            if count_tasks_modifier.count_unique_users:
+                responses[count_tasks_modifier.field_to_write_count_to] = counter.assignees
+                responses[count_tasks_modifier.field_to_write_count_complete] = counter.complete_assignees
+            else:
+                responses[count_tasks_modifier.field_to_write_count_to] = counter.tasks
+                responses[count_tasks_modifier.field_to_write_count_complete] = counter.complete_tasks
+        self.update_responses(responses)
 
-    new_task.save()
+    def update_responses(self, responses):
+        if self.task.responses:
+            self.task.responses.update(responses)
+        else:
+            self.task.responses = responses
 
-    return new_task
+    def set_auto_complete(self):
+        if self.stage.assign_user_by == TaskStageConstants.AUTO_COMPLETE:
+            self.task.complete = True
 
+    def assign_by_previous_manual(self):
+        if self.stage.assign_user_by == TaskStageConstants.PREVIOUS_MANUAL:
+            assign_by_previous_manual(self.stage, self.task, self.in_task)
 
-def process_previous_manual_assign(stage, new_task, in_task):
-    if stage.assign_user_by == TaskStageConstants.PREVIOUS_MANUAL:
-        new_task = assign_by_previous_manual(stage, new_task, in_task)
-    return new_task
+    def write(self):
+        if self.task.pk is None:
+            self.task.save()
+            self.task.in_tasks.add(self.in_task)
+        else:
+            self.task.save()
+        return self.task
+
+    @classmethod
+    def write_all(cls, builders):
+        new_builders = [i for i in builders if i.task.pk is None]
+        for builder in builders:
+            if builder.task.pk is not None:
+                builder.write()
+        if not new_builders:
+            return
+        Task.objects.bulk_create([i.task for i in new_builders])
+        Task.in_tasks.through.objects.bulk_create([
+            Task.in_tasks.through(from_task_id=i.task.id,
+                                  to_task_id=i.in_task.id)
+            for i in new_builders
+        ])
 
 
 def process_create_new_task_based_and_stage_assign(stage, new_task, in_task):
     if stage.webhook_address or stage.assign_user_by in [TaskStageConstants.AUTO_COMPLETE, TaskStageConstants.INTEGRATOR]:
-        task_award = stage.task_stage_verified.all()
+        task_award = get_stage_node(stage).task_awards
         if not task_award and new_task:
             process_completed_task(new_task)
         if task_award:
@@ -298,89 +563,101 @@ def process_create_new_task_based_and_stage_assign(stage, new_task, in_task):
                 process_completed_task(new_task)
 
 
-def create_new_task(stage, in_task, user=None):
-    data = {"stage": stage, "case": in_task.case}
-    new_task = None
-    if stage.webhook_address:
-        for copy_field in stage.copy_fields.all():
-            in_task.responses = copy_field.copy_response(in_task)
-        new_task = process_webhook(stage, in_task, data)
-    elif stage.get_integration():
-        in_task = process_integration(stage, in_task)
-    elif stage._translation_adapter:
-        stage._translation_adapter.generate_translation_tasks([in_task])
-    else:
-        # #Check if the user already has created next stage
-        # check_user = None
-        # if user:
-        #     check_user = user
-        # elif stage.assign_user_by == TaskStageConstants.STAGE:
-        #     if stage.assign_user_from_stage is not None:
-        #         assignee_task = Task.objects \
-        #             .filter(stage=stage.assign_user_from_stage) \
-        #             .filter(case=in_task.case)
-        #         check_user = assignee_task[0].assignee
-        # tasks_with_same_stage_case_and_user_count = Task.objects.filter(
-        #     stage=in_task.stage,
-        #     case=in_task.case,
-        #     assignee=check_user
-        # ).count()
-        # if tasks_with_same_stage_case_and_user_count > 0:
-        #     return None
-
-        new_task = process_stage_assign(stage, data, in_task, user)
-        new_task = trigger_on_copy_input(stage, new_task, in_task)
-        trigger_on_webhook(stage, new_task)
-        set_period(stage, new_task)
-        new_task = set_copied_fields(stage, new_task)
-        new_task = set_count_tasks_fields(stage, new_task)
-        process_auto_completed_task(stage, new_task)
-        new_task = process_previous_manual_assign(stage, new_task, in_task)
+def create_new_task(stage, in_task, user=None, webhook_result=None):
+    with profiling.step(PropagationStepConstants.CREATE_TASK, stage,
+                        tasks=1):
+        data = {"stage": stage, "case": in_task.case}
+        new_task = None
+        if stage.webhook_address:
+            if webhook_result is None:
+                copy_fields_to_webhook_input(stage, in_task)
+            new_task = process_webhook(stage, in_task, data, webhook_result)
+        elif stage.get_integration():
+            in_task = process_integration(stage, in_task)
+        elif stage._translation_adapter:
+            stage._translation_adapter.generate_translation_tasks([in_task])
+        else:
+            # #Check if the user already has created next stage
+            # check_user = None
+            # if user:
+            #     check_user = user
+            # elif stage.assign_user_by == TaskStageConstants.STAGE:
+            #     if stage.assign_user_from_stage is not None:
+            #         assignee_task = Task.objects \
+            #             .filter(stage=stage.assign_user_from_stage) \
+            #             .filter(case=in_task.case)
+            #         check_user = assignee_task[0].assignee
+            # tasks_with_same_stage_case_and_user_count = Task.objects.filter(
+            #     stage=in_task.stage,
+            #     case=in_task.case,
+            #     assignee=check_user
+            # ).count()
+            # if tasks_with_same_stage_case_and_user_count > 0:
+            #     return None
+
+            new_task = TaskBuilder(stage, in_task, user).build().write()
 
     process_create_new_task_based_and_stage_assign(stage, new_task, in_task)
 
 
-def set_period(stage, new_task):
-    datetime_task = DatetimeSort.objects.filter(stage_id=stage.id)
-    if datetime_task:
-        datetime_task = datetime_task[0]
-        if datetime_task.how_much and datetime_task.after_how_much:
-            start_period = timezone.now() + \
-                           timezone.timedelta(hours=datetime_task.after_how_much)
-            end_period = start_period + timezone.timedelta(hours=datetime_task.how_much)
-            new_task.start_period = start_period
-            new_task.end_period = end_period
-
-
 def process_conditional(stage, in_task):
     if evaluate_conditional_stage(stage, in_task) and not stage.pingpong:
         process_out_stages(stage, in_task)
     elif stage.pingpong:
-        out_task_stages = TaskStage.objects \
-            .filter(in_stages=stage)
-        for stage in out_task_stages:
-            out_tasks = in_task.out_tasks.filter(stage=stage)
-            if len(out_tasks) > 0:
-                for out_task in out_tasks:
-                    if out_task.stage.webhook_address:
-                        for copy_field in stage.copy_fields.all():
-                            in_task.responses = copy_field.copy_response(in_task)
-                        response = send_webhook_request(out_task.stage, in_task)
-                        out_task.responses = response
-                        out_task.complete = True
-                        out_task.save()
-                        process_completed_task(out_task)
-                    else:
-                        out_task.complete = False
-                        out_task.reopened = True
-                        if stage.copy_input:
-                            out_task.responses = update_responses(out_task.responses,
-                                                                  in_task.responses)
-                        for copy_field in stage.copy_fields.all():
-                            out_task.responses.update(copy_field.copy_response(out_task))
-                        out_task.save()
-            else:
-                create_new_task(stage, in_task)
+        process_pingpong(stage, in_task)
+
+
+def process_pingpong(stage, in_task):
+    """Sends the case back to the out tasks of the pingpong stage. Out
+    tasks are fetched with one query and written with one bulk update,
+    webhooks of webhook stages are requested concurrently. Stages without
+    out tasks yet get new tasks.
+    """
+    out_task_stages = get_stage_node(stage).out_task_stages
+    out_tasks = {}
+    for out_task in in_task.out_tasks.filter(stage__in=out_task_stages):
+        out_tasks.setdefault(out_task.stage_id, []).append(out_task)
+
+    reopened, webhook_tasks = [], []
+    for out_stage in out_task_stages:
+        if out_stage.id not in out_tasks:
+            create_new_task(out_stage, in_task)
+            continue
+        copy_fields = get_stage_node(out_stage).copy_fields
+        for out_task in out_tasks[out_stage.id]:
+            out_task.stage = out_stage
+            if out_stage.webhook_address:
+                webhook_tasks.append(out_task)
+                continue
+            out_task.complete = False
+            out_task.reopened = True
+            if out_stage.copy_input:
+                out_task.responses = update_responses(out_task.responses,
+                                                      in_task.responses)
+            for copy_field in copy_fields:
+                out_task.responses.update(copy_field.copy_response(out_task))
+            reopened.append(out_task)
+
+    if len(webhook_tasks) > 1:
+        webhook_results = send_webhook_requests(
+            [out_task.stage for out_task in webhook_tasks], in_task)
+    else:
+        webhook_results = [None] * len(webhook_tasks)
+    for out_task, result in zip(webhook_tasks, webhook_results):
+        if result is None:
+            copy_fields_to_webhook_input(out_task.stage, in_task)
+        out_task.responses = send_webhook_request(out_task.stage, in_task,
+                                                  result)
+        out_task.complete = True
+
+    now = timezone.now()
+    for out_task in reopened + webhook_tasks:
+        out_task.updated_at = now
+    Task.objects.bulk_update(reopened + webhook_tasks,
+                             ['complete', 'reopened', 'responses',
+                              'updated_at'])
+    for out_task in webhook_tasks:
+        process_completed_task(out_task)
 
 
 def evaluate_conditional_stage(stage, task, is_limited=False):
@@ -390,7 +667,6 @@ def evaluate_conditional_stage(stage, task, is_limited=False):
     rules = stage.conditions
     rules = rules if rules else []
     responses = task.responses
-    results = list()
 
     # Check not to create duplicate tasks
     if stage.prevent_duplicate:
@@ -411,63 +687,38 @@ def evaluate_conditional_stage(stage, task, is_limited=False):
     if responses is None:
         return False
 
-    for rule in rules:
-        control_value = rule.get("value")
-        condition = rule.get("condition")
-        type_ = rule.get("type") if rule.get("type") else "string"
-
-        if not ConditionalStageConstants.SUPPORTED_TYPES.get(type_):
-            stage.generate_error(
-                exc_type=ValueError,
-                details=f"Invalid type {type_} provided on conditional stage {stage.id}",
-                tb=traceback.format_tb,
-                data=f"{rules}\n{rule}"
-            )
-            raise CustomApiException(status.HTTP_400_BAD_REQUEST,
-                                     f'{ErrorConstants.UNSUPPORTED_TYPE % type_} {ErrorConstants.SEND_TO_MODERATORS}')
+    compiled = get_compiled_conditions(stage)
+    if is_limited:
+        return compiled.evaluate(
+            stage, responses, get_conditional_limit_count(stage, rules))
+    return compiled.evaluate(stage, responses)
 
-        actual_value = None
-        if not is_limited:
-            actual_value = get_value_from_dotted(rule["field"], responses)
-        elif is_limited:
-            actual_value = get_conditional_limit_count(stage, rule)
 
-        try:
-            control_value = ConditionalStageConstants.SUPPORTED_TYPES.get(type_)(control_value)
-            f = ConditionalStageConstants.OPERATORS.get(condition)
-            results.append(f(control_value, actual_value))
-        except Exception as e:
-            exc_type, value, tb = sys.exc_info()
-            stage.generate_error(
-                exc_type=exc_type,
-                details=f"Invalid conditions in conditional stage {stage.id}",
-                tb=tb, tb_info=traceback.format_exc(),
-                data=json.dumps({"responses": responses, "conditions": rules})
-                )
-            raise CustomApiException(status.HTTP_400_BAD_REQUEST,
-                                     f'{ErrorConstants.UNSUPPORTED_TYPE % type_} {ErrorConstants.SEND_TO_MODERATORS}')
-
-    return all(results)
+def evaluate_conditional_stage_batch(stage, tasks, chunk_size=2000):
+    """Evaluates conditions of the stage against responses of many
+    tasks in one pass. Returns dict of task id and evaluation result.
+    """
+    compiled = get_compiled_conditions(stage)
+    results = dict()
+    rows = tasks.values_list("id", "responses").iterator(
+        chunk_size=chunk_size)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+        ids, responses = zip(*chunk)
+        results.update(zip(ids, compiled.evaluate_many(responses)))
+    return results
 
 
 def evaluate_conditional_logic_stage(stage: ConditionalStage, task: Task):
-    rules = stage.conditions
-    rules = rules if rules else []
-    responses = task.responses
-    results = list()
-
-    if responses is None:
+    if task.responses is None:
         return False
 
-    for rule in rules:
-        control_value = rule.get("value")
-        condition = rule.get("condition")
-        actual_value = stage.out_stages.get().tasks.count()
-
-        f = ConditionalStageConstants.OPERATORS.get(condition)
-        results.append(f(control_value, actual_value))
-
-    return all(results)
+    compiled = get_compiled_conditions(stage)
+    actual_value = stage.out_stages.get().tasks.count()
+    return all(rule.operator(rule.rule.get("value"), actual_value)
+               for rule in compiled.rules)
 
 
 def assign_by_previous_manual(stage, new_task, in_task):
@@ -483,16 +734,17 @@ def assign_by_previous_manual(stage, new_task, in_task):
 
     if not user:
         reopen_task(task_with_email)
-        new_task.delete()
+        if new_task.pk is not None:
+            new_task.delete()
         raise CustomApiException(status.HTTP_400_BAD_REQUEST, ErrorConstants.ENTITY_DOESNT_EXIST % ('User', value))
 
     if not user.ranks.filter(ranklimits__in=RankLimit.objects.filter(stage__chain__campaign_id=stage.get_campaign())):
         reopen_task(task_with_email)
-        new_task.delete()
+        if new_task.pk is not None:
+            new_task.delete()
         raise CustomApiException(status.HTTP_400_BAD_REQUEST, ErrorConstants.ENTITY_IS_NOT_IN_CAMPAIGN % 'User')
 
     new_task.assignee = user
-    new_task.save()
 
     return new_task
 
@@ -705,14 +957,16 @@ def detecting_auto_notifications(stage, task):
             send_auto_notifications(stage, task, task.case, {'go': AutoNotificationConstants.BACKWARD})
         else:
             send_auto_notifications(stage, task, task.case, {'go': AutoNotificationConstants.LAST_ONE})
-    elif not stage.in_stages.count():
+    elif not get_stage_node(stage).in_stage_ids:
         in_tasks, out_tasks = task.in_tasks.all(), task.out_tasks.all()
         if (not in_tasks or in_tasks and in_tasks[0].complete) and task.complete and not out_tasks:
             send_auto_notifications(stage, task, task.case, {'go': AutoNotificationConstants.LAST_ONE})
 
 
 def send_auto_notifications(trigger, task, case, filters=None):
-    for auto_notification in trigger.auto_notification_trigger_stages.filter(**filters):
+    auto_notifications = get_stage_node(trigger).get_auto_notifications(
+        filters['go'])
+    for auto_notification in auto_notifications:
         try:
             receiver_task = case.tasks.get(
                 stage=auto_notification.recipient_stage
@@ -15,6 +15,66 @@ class TaskStageConstants:
     PREVIOUS_MANUAL = 'PA'
 
 
+class PropagationJobConstants:
+    PENDING = 'PE'
+    RUNNING = 'RU'
+    DONE = 'DO'
+    FAILED = 'FA'
+    IN_PROGRESS = [PENDING, RUNNING]
+
+
+class BulkCompleteConstants:
+    MAX_ITEMS = 500
+    COMPLETED = 'completed'
+    SAVED = 'saved'
+    LOCKED = 'locked'
+    FORBIDDEN = 'forbidden'
+    NOT_FOUND = 'not_found'
+    DUPLICATE = 'duplicate'
+    ERROR = 'error'
+
+
+class ResponseFlattenerConstants:
+    CHUNK_SIZE = 2000
+    DESCRIPTION_COLUMN = 'description'
+
+
+class ExportJobConstants:
+    PENDING = 'PE'
+    RUNNING = 'RU'
+    DONE = 'DO'
+    FAILED = 'FA'
+    IN_PROGRESS = [PENDING, RUNNING]
+    RESPONSE_FLATTENER = 'RF'
+    USER_ACTIVITY = 'UA'
+    CHUNK_SIZE = 2000
+    DOWNLOAD_CHUNK_SIZE = 64 * 1024
+    USER_ACTIVITY_COLUMNS = [
+        "stage", "stage__name", "chain_id", "chain", "case", "assignee",
+        "email", "rank_ids", "rank_names", "complete_true", "complete_false",
+        "force_complete_false", "force_complete_true", "count_tasks",
+    ]
+
+
+class TaskChangeFeedConstants:
+    DEFAULT_LIMIT = 500
+    MAX_LIMIT = 5000
+
+
+class PropagationStepConstants:
+    TOTAL = 'total'
+    QUIZ = 'quiz'
+    TRANSLATION_ADAPTER = 'translation_adapter'
+    OUT_STAGES = 'out_stages'
+    PINGPONG = 'pingpong'
+    AUTO_NOTIFICATIONS = 'auto_notifications'
+    TASK_AWARDS = 'task_awards'
+    CAMPAIGN_LINKERS = 'campaign_linkers'
+    DEMO_NEXT = 'demo_next'
+    CREATE_TASK = 'create_task'
+    WRITE_TASKS = 'write_tasks'
+
+
 class TaskStageSchemaSourceConstants:
     STAGE = 'ST'
     TASK = 'TA'
@@ -109,6 +169,11 @@ class ErrorConstants:
     SEND_TO_MODERATORS = 'Please send this message to your moderators.'
     ENTITY_DOESNT_EXIST = '%s %s doesn\'t exist.'
     ENTITY_IS_NOT_IN_CAMPAIGN = '%s is not in the campaign.'
+    EXPORT_NOT_READY = 'Export is not ready yet.'
+    EXPORT_JOB_EXPIRED = 'Export stopped updating and was abandoned.'
+    INVALID_CURSOR = 'Cursor is not valid.'
+    BULK_COMPLETE_FAILED = 'Task could not be completed, the error is ' \
+                           'reported to the campaign.'
 
 
 class DjangoORMConstants:
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from api.models import CountTasksModifier, TaskStageCounter
+
+
+class Command(BaseCommand):
+    help = "Recounts task counters of stages counted by CountTasksModifier."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--stage", type=int, nargs="+", dest="stages",
+            help="Ids of stages to recount. All counted stages by default."
+        )
+
+    def handle(self, *args, **options):
+        stage_ids = options["stages"]
+        if not stage_ids:
+            stage_ids = set(CountTasksModifier.objects.values_list(
+                "stage_to_count_tasks_from_id", flat=True))
+            stage_ids.update(TaskStageCounter.objects.values_list(
+                "stage_id", flat=True))
+
+        for stage_id in sorted(stage_ids):
+            before = TaskStageCounter.objects.filter(stage_id=stage_id) \
+                .values("tasks", "complete_tasks", "assignees",
+                        "complete_assignees").first()
+            counter = TaskStageCounter.reconcile(stage_id)
+            after = {"tasks": counter.tasks,
+                     "complete_tasks": counter.complete_tasks,
+                     "assignees": counter.assignees,
+                     "complete_assignees": counter.complete_assignees}
+            if before is not None and before != after:
+                self.stdout.write(self.style.WARNING(
+                    f"Stage {stage_id}: fixed {before} -> {after}"))
+            else:
+                self.stdout.write(f"Stage {stage_id}: {after}")
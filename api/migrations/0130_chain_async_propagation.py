@@ -0,0 +1,36 @@
+# Generated by Django 3.2.8 on 2026-10-17 20:44
+
+import api.models.campaign
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0129_auto_20250228_0403'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chain',
+            name='async_propagation',
+            field=models.BooleanField(default=False, help_text='If true, completed tasks are propagated along the chain by the django_q cluster and submit returns right away with a propagation job id.'),
+        ),
+        migrations.CreateModel(
+            name='PropagationJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, help_text='Time of creation')),
+                ('updated_at', models.DateTimeField(auto_now=True, help_text='Last update time')),
+                ('status', models.CharField(choices=[('PE', 'Pending'), ('RU', 'Running'), ('DO', 'Done'), ('FA', 'Failed')], default='PE', help_text='Current state of the propagation.', max_length=2)),
+                ('error', models.TextField(blank=True, help_text='Error description if propagation failed.')),
+                ('next_direct_task', models.ForeignKey(blank=True, help_text='Next direct task of the same assignee, available when propagation is done.', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='api.task')),
+                ('task', models.ForeignKey(help_text='Completed task to propagate along the chain.', on_delete=django.db.models.deletion.CASCADE, related_name='propagation_jobs', to='api.task')),
+            ],
+            options={
+                'abstract': False,
+            },
+            bases=(models.Model, api.models.campaign.CampaignInterface),
+        ),
+    ]
@@ -0,0 +1,133 @@
+# Generated by Django 3.2.8 on 2026-10-17 21:03
+
+import api.models.campaign
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+COUNTERS_SQL = """
+CREATE UNIQUE INDEX api_taskstageassigneecounter_stage_assignee_uniq
+    ON api_taskstageassigneecounter (stage_id, (COALESCE(assignee_id, 0)));
+
+CREATE FUNCTION api_count_task(p_stage bigint, p_assignee bigint,
+                               p_complete boolean, p_delta integer)
+RETURNS void AS $$
+DECLARE
+    assignee_tasks bigint;
+    assignee_complete_tasks bigint;
+    complete_delta integer := CASE WHEN p_complete THEN p_delta ELSE 0 END;
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM api_taskstagecounter
+                   WHERE stage_id = p_stage) THEN
+        RETURN;
+    END IF;
+
+    INSERT INTO api_taskstageassigneecounter
+        (created_at, updated_at, stage_id, assignee_id, tasks, complete_tasks)
+    VALUES (now(), now(), p_stage, p_assignee, 0, 0)
+    ON CONFLICT (stage_id, (COALESCE(assignee_id, 0))) DO NOTHING;
+
+    UPDATE api_taskstageassigneecounter
+    SET tasks = tasks + p_delta,
+        complete_tasks = complete_tasks + complete_delta,
+        updated_at = now()
+    WHERE stage_id = p_stage
+      AND COALESCE(assignee_id, 0) = COALESCE(p_assignee, 0)
+    RETURNING tasks, complete_tasks
+    INTO assignee_tasks, assignee_complete_tasks;
+
+    UPDATE api_taskstagecounter
+    SET tasks = tasks + p_delta,
+        complete_tasks = complete_tasks + complete_delta,
+        assignees = assignees + CASE
+            WHEN p_delta > 0 AND assignee_tasks = p_delta THEN 1
+            WHEN p_delta < 0 AND assignee_tasks = 0 THEN -1
+            ELSE 0 END,
+        complete_assignees = complete_assignees + CASE
+            WHEN complete_delta > 0
+                 AND assignee_complete_tasks = complete_delta THEN 1
+            WHEN complete_delta < 0 AND assignee_complete_tasks = 0 THEN -1
+            ELSE 0 END,
+        updated_at = now()
+    WHERE stage_id = p_stage;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE FUNCTION api_task_count_trigger() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM api_count_task(OLD.stage_id, OLD.assignee_id,
+                               OLD.complete, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM api_count_task(NEW.stage_id, NEW.assignee_id,
+                               NEW.complete, 1);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER api_task_count_insert_delete
+    AFTER INSERT OR DELETE ON api_task
+    FOR EACH ROW EXECUTE PROCEDURE api_task_count_trigger();
+
+CREATE TRIGGER api_task_count_update
+    AFTER UPDATE OF stage_id, assignee_id, complete ON api_task
+    FOR EACH ROW
+    WHEN (OLD.stage_id IS DISTINCT FROM NEW.stage_id
+          OR OLD.assignee_id IS DISTINCT FROM NEW.assignee_id
+          OR OLD.complete IS DISTINCT FROM NEW.complete)
+    EXECUTE PROCEDURE api_task_count_trigger();
+"""
+
+REVERSE_COUNTERS_SQL = """
+DROP TRIGGER api_task_count_update ON api_task;
+DROP TRIGGER api_task_count_insert_delete ON api_task;
+DROP FUNCTION api_task_count_trigger();
+DROP FUNCTION api_count_task(bigint, bigint, boolean, integer);
+DROP INDEX api_taskstageassigneecounter_stage_assignee_uniq;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0130_chain_async_propagation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskStageCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, help_text='Time of creation')),
+                ('updated_at', models.DateTimeField(auto_now=True, help_text='Last update time')),
+                ('tasks', models.BigIntegerField(default=0, help_text='Count of all tasks of the stage')),
+                ('complete_tasks', models.BigIntegerField(default=0, help_text='Count of complete tasks of the stage')),
+                ('assignees', models.BigIntegerField(default=0, help_text='Count of distinct assignees of the tasks')),
+                ('complete_assignees', models.BigIntegerField(default=0, help_text='Count of distinct assignees of the complete tasks')),
+                ('stage', models.OneToOneField(help_text='TaskStage whose tasks are counted', on_delete=django.db.models.deletion.CASCADE, related_name='counter', to='api.taskstage')),
+            ],
+            options={
+                'abstract': False,
+            },
+            bases=(models.Model, api.models.campaign.CampaignInterface),
+        ),
+        migrations.CreateModel(
+            name='TaskStageAssigneeCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, help_text='Time of creation')),
+                ('updated_at', models.DateTimeField(auto_now=True, help_text='Last update time')),
+                ('tasks', models.BigIntegerField(default=0, help_text='Count of tasks of the assignee')),
+                ('complete_tasks', models.BigIntegerField(default=0, help_text='Count of complete tasks of the assignee')),
+                ('assignee', models.ForeignKey(blank=True, db_constraint=False, help_text='Assignee of the counted tasks', null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('stage', models.ForeignKey(help_text='TaskStage whose tasks are counted', on_delete=django.db.models.deletion.CASCADE, related_name='assignee_counters', to='api.taskstage')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.RunSQL(COUNTERS_SQL, REVERSE_COUNTERS_SQL),
+    ]
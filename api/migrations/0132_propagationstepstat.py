@@ -0,0 +1,36 @@
+# Generated by Django 3.2.8 on 2026-10-17 21:14
+
+import api.models.campaign
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0131_task_stage_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PropagationStepStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, help_text='Time of creation')),
+                ('updated_at', models.DateTimeField(auto_now=True, help_text='Last update time')),
+                ('step', models.CharField(help_text='Name of the propagation step', max_length=50)),
+                ('calls', models.BigIntegerField(default=0, help_text='Count of sampled runs of the step')),
+                ('seconds', models.FloatField(default=0, help_text='Total wall time of the sampled runs in seconds')),
+                ('max_seconds', models.FloatField(default=0, help_text='Longest sampled run in seconds')),
+                ('queries', models.BigIntegerField(default=0, help_text='Total count of database queries of the sampled runs')),
+                ('tasks', models.BigIntegerField(default=0, help_text='Count of tasks created by the sampled runs')),
+                ('campaign', models.ForeignKey(help_text='Campaign of the stage', on_delete=django.db.models.deletion.CASCADE, related_name='propagation_step_stats', to='api.campaign')),
+                ('chain', models.ForeignKey(help_text='Chain of the stage', on_delete=django.db.models.deletion.CASCADE, related_name='propagation_step_stats', to='api.chain')),
+                ('stage', models.ForeignKey(help_text='Stage the step was run for', on_delete=django.db.models.deletion.CASCADE, related_name='propagation_step_stats', to='api.stage')),
+            ],
+            options={
+                'unique_together': {('stage', 'step')},
+            },
+            bases=(models.Model, api.models.campaign.CampaignInterface),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 3.2.8 on 2026-10-17 21:24
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Index is built concurrently, so task writes aren't blocked.
+    atomic = False
+
+    dependencies = [
+        ('api', '0132_propagationstepstat'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='task',
+            index=models.Index(condition=models.Q(('assignee__isnull', True), ('complete', False)), fields=['stage', 'start_period', 'end_period'], name='api_task_open_pool_idx'),
+        ),
+    ]
@@ -0,0 +1,142 @@
+# Generated by Django 3.2.8 on 2026-10-17 21:50
+
+import api.models.campaign
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+FILTER_VALUES_SQL = """
+CREATE FUNCTION api_task_filter_values_trigger() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        DELETE FROM api_taskfiltervalue WHERE task_id = OLD.id;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO api_taskfiltervalue
+            (created_at, updated_at, task_id, case_id, field_id,
+             text_value, number_value)
+        SELECT now(), now(), NEW.id, NEW.case_id, f.id,
+               CASE WHEN octet_length(v.value #>> '{}') <= 2000
+                    THEN v.value #>> '{}' END,
+               CASE WHEN jsonb_typeof(v.value) = 'number'
+                    THEN (v.value #>> '{}')::double precision END
+        FROM api_taskfilterfield f
+        CROSS JOIN LATERAL (
+            SELECT NEW.responses #> string_to_array(f.field_name, '__')
+                AS value
+        ) v
+        WHERE f.stage_id = NEW.stage_id
+          AND jsonb_typeof(v.value) IN ('string', 'number', 'boolean');
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER api_task_filter_values_insert_delete
+    AFTER INSERT OR DELETE ON api_task
+    FOR EACH ROW EXECUTE PROCEDURE api_task_filter_values_trigger();
+
+CREATE TRIGGER api_task_filter_values_update
+    AFTER UPDATE OF responses, stage_id, case_id ON api_task
+    FOR EACH ROW
+    WHEN (OLD.responses IS DISTINCT FROM NEW.responses
+          OR OLD.stage_id IS DISTINCT FROM NEW.stage_id
+          OR OLD.case_id IS DISTINCT FROM NEW.case_id)
+    EXECUTE PROCEDURE api_task_filter_values_trigger();
+"""
+
+REVERSE_FILTER_VALUES_SQL = """
+DROP TRIGGER api_task_filter_values_update ON api_task;
+DROP TRIGGER api_task_filter_values_insert_delete ON api_task;
+DROP FUNCTION api_task_filter_values_trigger();
+"""
+
+
+BACKFILL_SQL = """
+INSERT INTO api_taskfiltervalue
+    (created_at, updated_at, task_id, case_id, field_id,
+     text_value, number_value)
+SELECT now(), now(), t.id, t.case_id, f.id,
+       CASE WHEN octet_length(v.value #>> '{}') <= 2000
+            THEN v.value #>> '{}' END,
+       CASE WHEN jsonb_typeof(v.value) = 'number'
+            THEN (v.value #>> '{}')::double precision END
+FROM api_taskfilterfield f
+JOIN api_task t ON t.stage_id = f.stage_id
+CROSS JOIN LATERAL (
+    SELECT t.responses #> string_to_array(f.field_name, '__') AS value
+) v
+WHERE jsonb_typeof(v.value) IN ('string', 'number', 'boolean')
+"""
+
+
+def track_filter_fields(apps, schema_editor):
+    TaskStage = apps.get_model("api", "TaskStage")
+    TaskFilterField = apps.get_model("api", "TaskFilterField")
+    fields = set()
+    for schema in TaskStage.objects.exclude(filter_fields_schema=None) \
+            .values_list("filter_fields_schema", flat=True):
+        if not isinstance(schema, list):
+            continue
+        fields.update((int(i["stage_id"]), i["field_name"]) for i in schema
+                      if i.get("stage_id") and i.get("field_name"))
+    stage_ids = set(TaskStage.objects.filter(
+        pk__in={stage_id for stage_id, _ in fields}
+    ).values_list("pk", flat=True))
+    TaskFilterField.objects.bulk_create([
+        TaskFilterField(stage_id=stage_id, field_name=field_name)
+        for stage_id, field_name in fields if stage_id in stage_ids
+    ])
+    schema_editor.execute(BACKFILL_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0133_task_open_pool_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskFilterField',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, help_text='Time of creation')),
+                ('updated_at', models.DateTimeField(auto_now=True, help_text='Last update time')),
+                ('field_name', models.CharField(help_text='Name of the response field, nested keys are separated with __', max_length=255)),
+                ('stage', models.ForeignKey(help_text='Stage whose task responses hold the field', on_delete=django.db.models.deletion.CASCADE, related_name='filter_fields', to='api.taskstage')),
+            ],
+            bases=(models.Model, api.models.campaign.CampaignInterface),
+        ),
+        migrations.CreateModel(
+            name='TaskFilterValue',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, help_text='Time of creation')),
+                ('updated_at', models.DateTimeField(auto_now=True, help_text='Last update time')),
+                ('text_value', models.TextField(help_text='Value as text', null=True)),
+                ('number_value', models.FloatField(help_text='Value as number if it is a number', null=True)),
+                ('case', models.ForeignKey(blank=True, db_constraint=False, db_index=False, help_text='Case of the task', null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='api.case')),
+                ('field', models.ForeignKey(help_text='Field the value belongs to', on_delete=django.db.models.deletion.CASCADE, related_name='values', to='api.taskfilterfield')),
+                ('task', models.ForeignKey(db_constraint=False, help_text='Task whose responses hold the value', on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='api.task')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='taskfiltervalue',
+            index=models.Index(fields=['case', 'field'], name='api_taskfilter_case_field_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='taskfiltervalue',
+            index=models.Index(fields=['field', 'number_value'], name='api_taskfilter_number_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='taskfiltervalue',
+            index=models.Index(fields=['field', 'text_value'], name='api_taskfilter_text_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='taskfilterfield',
+            unique_together={('stage', 'field_name')},
+        ),
+        migrations.RunSQL(FILTER_VALUES_SQL, REVERSE_FILTER_VALUES_SQL),
+        migrations.RunPython(track_filter_fields, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,84 @@
+# Generated by Django 3.2.8 on 2026-10-17 21:58
+
+import api.models.campaign
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+CHAIN_PROGRESS_SQL = """
+CREATE FUNCTION api_mark_chain_progress_stale(p_user bigint, p_stage bigint)
+RETURNS void AS $$
+BEGIN
+    IF p_user IS NULL THEN
+        RETURN;
+    END IF;
+    UPDATE api_chainprogress
+    SET stale = true
+    WHERE user_id = p_user
+      AND chain_id = (SELECT chain_id FROM api_stage WHERE id = p_stage)
+      AND NOT stale;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE FUNCTION api_task_chain_progress_trigger() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM api_mark_chain_progress_stale(OLD.assignee_id, OLD.stage_id);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM api_mark_chain_progress_stale(NEW.assignee_id, NEW.stage_id);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER api_task_chain_progress_insert_delete
+    AFTER INSERT OR DELETE ON api_task
+    FOR EACH ROW EXECUTE PROCEDURE api_task_chain_progress_trigger();
+
+CREATE TRIGGER api_task_chain_progress_update
+    AFTER UPDATE OF stage_id, assignee_id, complete, reopened ON api_task
+    FOR EACH ROW
+    WHEN (OLD.stage_id IS DISTINCT FROM NEW.stage_id
+          OR OLD.assignee_id IS DISTINCT FROM NEW.assignee_id
+          OR OLD.complete IS DISTINCT FROM NEW.complete
+          OR OLD.reopened IS DISTINCT FROM NEW.reopened)
+    EXECUTE PROCEDURE api_task_chain_progress_trigger();
+"""
+
+REVERSE_CHAIN_PROGRESS_SQL = """
+DROP TRIGGER api_task_chain_progress_update ON api_task;
+DROP TRIGGER api_task_chain_progress_insert_delete ON api_task;
+DROP FUNCTION api_task_chain_progress_trigger();
+DROP FUNCTION api_mark_chain_progress_stale(bigint, bigint);
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0134_task_filter_values'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChainProgress',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, help_text='Time of creation')),
+                ('updated_at', models.DateTimeField(auto_now=True, help_text='Last update time')),
+                ('data', models.JSONField(default=list, help_text='Stages of the chain with ids of completed, opened and reopened tasks of the user')),
+                ('complete', models.BooleanField(default=False, help_text='True if the user completed all stages required to complete the individual chain')),
+                ('stale', models.BooleanField(default=True, help_text='True if the snapshot has to be rebuilt')),
+                ('version', models.PositiveIntegerField(default=0, help_text='Incremented every time the snapshot changes')),
+                ('chain', models.ForeignKey(help_text='Chain the progress is on', on_delete=django.db.models.deletion.CASCADE, related_name='progress', to='api.chain')),
+                ('user', models.ForeignKey(help_text='User whose progress it is', on_delete=django.db.models.deletion.CASCADE, related_name='chain_progress', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('user', 'chain')},
+            },
+            bases=(models.Model, api.models.campaign.CampaignInterface),
+        ),
+        migrations.RunSQL(CHAIN_PROGRESS_SQL, REVERSE_CHAIN_PROGRESS_SQL),
+    ]
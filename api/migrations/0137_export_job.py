@@ -0,0 +1,40 @@
+# Generated by Django 3.2.8 on 2026-10-17 22:19
+
+import api.models.campaign
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0135_chain_progress'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, help_text='Time of creation')),
+                ('updated_at', models.DateTimeField(auto_now=True, help_text='Last update time')),
+                ('kind', models.CharField(choices=[('RF', 'Response flattener'), ('UA', 'User activity')], help_text='What is exported', max_length=2)),
+                ('params', models.JSONField(blank=True, default=dict, help_text='Parameters the export was requested with')),
+                ('fingerprint', models.CharField(help_text='Hash of kind, parameters and user if the rows depend on them. Used to share identical exports', max_length=64)),
+                ('status', models.CharField(choices=[('PE', 'Pending'), ('RU', 'Running'), ('DO', 'Done'), ('FA', 'Failed')], default='PE', help_text='Current state of the export.', max_length=2)),
+                ('rows_done', models.PositiveIntegerField(default=0, help_text='Rows written so far')),
+                ('rows_total', models.PositiveIntegerField(blank=True, help_text='Estimated count of rows to write', null=True)),
+                ('file', models.CharField(blank=True, help_text='Name of the file in the export storage', max_length=255)),
+                ('size', models.BigIntegerField(default=0, help_text='Size of the file in bytes')),
+                ('error', models.TextField(blank=True, help_text='Error description if export failed.')),
+                ('campaign', models.ForeignKey(blank=True, help_text='Campaign whose managers may download the export', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='export_jobs', to='api.campaign')),
+                ('user', models.ForeignKey(help_text='User who requested the export', on_delete=django.db.models.deletion.CASCADE, related_name='export_jobs', to=settings.AUTH_USER_MODEL)),
+            ],
+            bases=(models.Model, api.models.campaign.CampaignInterface),
+        ),
+        migrations.AddConstraint(
+            model_name='exportjob',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['PE', 'RU'])), fields=('fingerprint',), name='api_exportjob_unique_in_progress'),
+        ),
+    ]
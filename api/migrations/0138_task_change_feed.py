@@ -0,0 +1,116 @@
+# Generated by Django 3.2.8 on 2026-10-17 22:23
+
+from django.db import migrations, models
+
+
+# Tasks and tombstones are stamped with the id of the transaction that
+# wrote them, see api.utils.change_feed. pg_current_xact_id needs
+# PostgreSQL 13. The column of api_task is not a model field, so it is not
+# serialized or exported with the system fields of tasks.
+TASK_CHANGE_FEED_SQL = [
+    "ALTER TABLE api_task ADD COLUMN change_xid bigint NOT NULL DEFAULT 0;",
+    """
+    CREATE FUNCTION api_task_set_change_xid() RETURNS trigger AS $$
+    BEGIN
+        NEW.change_xid := pg_current_xact_id()::text::bigint;
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql;
+    """,
+    """
+    CREATE TRIGGER api_task_change_xid_insert
+        BEFORE INSERT ON api_task
+        FOR EACH ROW EXECUTE PROCEDURE api_task_set_change_xid();
+    """,
+    """
+    CREATE TRIGGER api_task_change_xid_update
+        BEFORE UPDATE ON api_task
+        FOR EACH ROW
+        WHEN (OLD.* IS DISTINCT FROM NEW.*)
+        EXECUTE PROCEDURE api_task_set_change_xid();
+    """,
+    """
+    CREATE FUNCTION api_task_tombstone_trigger() RETURNS trigger AS $$
+    BEGIN
+        INSERT INTO api_tasktombstone
+            (created_at, updated_at, change_xid, task_id, stage_id, case_id,
+             campaign_id)
+        VALUES (
+            clock_timestamp(), clock_timestamp(),
+            pg_current_xact_id()::text::bigint, OLD.id, OLD.stage_id,
+            OLD.case_id,
+            (SELECT c.campaign_id
+             FROM api_stage s
+             JOIN api_chain c ON c.id = s.chain_id
+             WHERE s.id = OLD.stage_id)
+        );
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+    """,
+    """
+    CREATE TRIGGER api_task_tombstone
+        AFTER DELETE ON api_task
+        FOR EACH ROW EXECUTE PROCEDURE api_task_tombstone_trigger();
+    """,
+]
+
+REVERSE_TASK_CHANGE_FEED_SQL = [
+    "DROP TRIGGER api_task_tombstone ON api_task;",
+    "DROP FUNCTION api_task_tombstone_trigger();",
+    "DROP TRIGGER api_task_change_xid_update ON api_task;",
+    "DROP TRIGGER api_task_change_xid_insert ON api_task;",
+    "DROP FUNCTION api_task_set_change_xid();",
+    "ALTER TABLE api_task DROP COLUMN change_xid;",
+]
+
+# change_xid is not a model field, so its indexes can't be added with
+# AddIndexConcurrently and are created by SQL.
+TASK_CHANGE_FEED_INDEXES_SQL = [
+    "CREATE INDEX CONCURRENTLY api_task_change_xid_idx "
+    "ON api_task (change_xid, id);",
+    "CREATE INDEX CONCURRENTLY api_task_stage_change_xid_idx "
+    "ON api_task (stage_id, change_xid, id);",
+]
+
+REVERSE_TASK_CHANGE_FEED_INDEXES_SQL = [
+    "DROP INDEX CONCURRENTLY api_task_stage_change_xid_idx;",
+    "DROP INDEX CONCURRENTLY api_task_change_xid_idx;",
+]
+
+
+class Migration(migrations.Migration):
+    # Indexes of api_task are built concurrently, so task writes aren't
+    # blocked.
+    atomic = False
+
+    dependencies = [
+        ('api', '0137_export_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, help_text='Time of creation')),
+                ('updated_at', models.DateTimeField(auto_now=True, help_text='Last update time')),
+                ('change_xid', models.BigIntegerField(default=0, help_text='Id of the transaction that deleted the task')),
+                ('task_id', models.BigIntegerField(help_text='Id of the deleted task')),
+                ('stage_id', models.BigIntegerField(help_text='Stage of the deleted task')),
+                ('case_id', models.BigIntegerField(blank=True, help_text='Case of the deleted task', null=True)),
+                ('campaign_id', models.BigIntegerField(blank=True, help_text='Campaign of the stage of the deleted task', null=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='tasktombstone',
+            index=models.Index(fields=['change_xid', 'task_id'], name='api_tombstone_feed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tasktombstone',
+            index=models.Index(fields=['campaign_id', 'change_xid'], name='api_tombstone_campaign_idx'),
+        ),
+        migrations.RunSQL(TASK_CHANGE_FEED_SQL, REVERSE_TASK_CHANGE_FEED_SQL),
+        migrations.RunSQL(TASK_CHANGE_FEED_INDEXES_SQL,
+                          REVERSE_TASK_CHANGE_FEED_INDEXES_SQL),
+    ]
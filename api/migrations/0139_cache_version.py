@@ -0,0 +1,20 @@
+# Generated by Django 3.2.8 on 2026-10-17 22:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0138_task_change_feed'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CacheVersion',
+            fields=[
+                ('key', models.CharField(help_text='Name of the cached data', max_length=100, primary_key=True, serialize=False)),
+                ('version', models.BigIntegerField(default=0, help_text='Incremented every time the data changes')),
+            ],
+        ),
+    ]
@@ -2,10 +2,12 @@ from .base import BaseModel, BaseDatesModel
 from .campaign import Campaign, CampaignInterface
 from .admin_pref import AdminPreference
 from .approve_link import ApproveLink
+from .cache_version import CacheVersion
 from .campaign_linker import CampaignLinker
 from .campaign_management import CampaignManagement
 from .case import Case
 from .chain import Chain
+from .chain_progress import ChainProgress
 from .category import Category
 from .conditional_limit import ConditionalLimit
 from .copy_field import CopyField
@@ -22,7 +24,12 @@ from .rank_limit import RankLimit
 from .rank_record import RankRecord
 from .response_flattener import ResponseFlattener
 from .task import Task
+from .propagation_job import PropagationJob
+from .export_job import ExportJob
+from .propagation_step_stat import PropagationStepStat
 from .task_award import TaskAward
+from .task_filter import TaskFilterField, TaskFilterValue
+from .task_tombstone import TaskTombstone
 from .track import Track
 from .user import CustomUser, UserDelete
 
@@ -34,6 +41,8 @@ from .stage import (
 )
 from .webhook import Webhook, TestWebhook
 from .modifiers.count_tasks_modifier import CountTasksModifier
+from .modifiers.task_stage_counter import TaskStageCounter, \
+    TaskStageAssigneeCounter
 
 from .volume import Volume
 from .stage.stage_volume import StageVolume
@@ -0,0 +1,21 @@
+from django.db import models
+
+
+class CacheVersion(models.Model):
+    """Version of data processes cache, see api.utils.cache_versions.
+    Versions are bumped in the transaction changing the data, so every
+    process sees the change once it is committed, whatever cache backend
+    it uses.
+    """
+    key = models.CharField(
+        max_length=100,
+        primary_key=True,
+        help_text="Name of the cached data"
+    )
+    version = models.BigIntegerField(
+        default=0,
+        help_text="Incremented every time the data changes"
+    )
+
+    def __str__(self):
+        return f"{self.key}: {self.version}"
@@ -28,6 +28,13 @@ class Chain(BaseModel, CampaignInterface):
         help_text="Use new task view mode"
     )
 
+    async_propagation = models.BooleanField(
+        default=False,
+        help_text="If true, completed tasks are propagated along the chain "
+                  "by the django_q cluster and submit returns right away "
+                  "with a propagation job id."
+    )
+
     ORDER_TYPE_CHOICES = [
         (ChainConstants.CHRONOLOGICALLY, 'Chronologically'),
         (ChainConstants.GRAPH_FLOW, 'By Graph order'),
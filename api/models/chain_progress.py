@@ -0,0 +1,52 @@
+from django.db import models
+
+from api.models import BaseDatesModel, CampaignInterface
+
+
+class ChainProgress(BaseDatesModel, CampaignInterface):
+    """Snapshot of a user's progress on an individual chain as served by
+    ChainViewSet.individuals, see api.utils.chain_progress. Snapshots are
+    marked stale by database triggers on api_task when tasks of the user
+    on the chain change, see migration 0135, and by signals when the
+    chain changes. Stale snapshots are rebuilt on read. Stages are laid
+    out by api.utils.chain_layout.
+    """
+    user = models.ForeignKey(
+        "CustomUser",
+        on_delete=models.CASCADE,
+        related_name="chain_progress",
+        help_text="User whose progress it is"
+    )
+    chain = models.ForeignKey(
+        "Chain",
+        on_delete=models.CASCADE,
+        related_name="progress",
+        help_text="Chain the progress is on"
+    )
+    data = models.JSONField(
+        default=list,
+        help_text="Stages of the chain with ids of completed, opened and "
+                  "reopened tasks of the user"
+    )
+    complete = models.BooleanField(
+        default=False,
+        help_text="True if the user completed all stages required to "
+                  "complete the individual chain"
+    )
+    stale = models.BooleanField(
+        default=True,
+        help_text="True if the snapshot has to be rebuilt"
+    )
+    version = models.PositiveIntegerField(
+        default=0,
+        help_text="Incremented every time the snapshot changes"
+    )
+
+    class Meta:
+        unique_together = ['user', 'chain']
+
+    def get_campaign(self):
+        return self.chain.campaign
+
+    def __str__(self):
+        return f"Progress of {self.user_id} on chain #{self.chain_id}"
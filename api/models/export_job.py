@@ -0,0 +1,97 @@
+from django.db import models
+
+from api.constans import ExportJobConstants
+from api.models import BaseDatesModel, CampaignInterface
+
+
+class ExportJob(BaseDatesModel, CampaignInterface):
+    """CSV export run on the django_q cluster and written to the export
+    storage, see api.utils.exports. Identical exports requested while one
+    is in progress share the job.
+    """
+    user = models.ForeignKey(
+        "CustomUser",
+        on_delete=models.CASCADE,
+        related_name="export_jobs",
+        help_text="User who requested the export"
+    )
+    campaign = models.ForeignKey(
+        "Campaign",
+        on_delete=models.CASCADE,
+        related_name="export_jobs",
+        blank=True,
+        null=True,
+        help_text="Campaign whose managers may download the export"
+    )
+    KIND_CHOICES = [
+        (ExportJobConstants.RESPONSE_FLATTENER, 'Response flattener'),
+        (ExportJobConstants.USER_ACTIVITY, 'User activity'),
+    ]
+    kind = models.CharField(
+        max_length=2,
+        choices=KIND_CHOICES,
+        help_text="What is exported"
+    )
+    params = models.JSONField(
+        default=dict,
+        blank=True,
+        help_text="Parameters the export was requested with"
+    )
+    fingerprint = models.CharField(
+        max_length=64,
+        help_text="Hash of kind, parameters and user if the rows depend "
+                  "on them. Used to share identical exports"
+    )
+    STATUS_CHOICES = [
+        (ExportJobConstants.PENDING, 'Pending'),
+        (ExportJobConstants.RUNNING, 'Running'),
+        (ExportJobConstants.DONE, 'Done'),
+        (ExportJobConstants.FAILED, 'Failed'),
+    ]
+    status = models.CharField(
+        max_length=2,
+        choices=STATUS_CHOICES,
+        default=ExportJobConstants.PENDING,
+        help_text="Current state of the export."
+    )
+    rows_done = models.PositiveIntegerField(
+        default=0,
+        help_text="Rows written so far"
+    )
+    rows_total = models.PositiveIntegerField(
+        blank=True,
+        null=True,
+        help_text="Estimated count of rows to write"
+    )
+    file = models.CharField(
+        max_length=255,
+        blank=True,
+        help_text="Name of the file in the export storage"
+    )
+    size = models.BigIntegerField(
+        default=0,
+        help_text="Size of the file in bytes"
+    )
+    error = models.TextField(
+        blank=True,
+        help_text="Error description if export failed."
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["fingerprint"],
+                condition=models.Q(status__in=ExportJobConstants.IN_PROGRESS),
+                name="api_exportjob_unique_in_progress",
+            ),
+        ]
+
+    @property
+    def is_ready(self):
+        return self.status == ExportJobConstants.DONE
+
+    def get_campaign(self):
+        return self.campaign
+
+    def __str__(self):
+        return f"Export #{self.id} ({self.kind}): {self.status}"
@@ -0,0 +1,111 @@
+from django.apps import apps
+from django.db import models, transaction
+from django.db.models import Count, Q
+
+from api.models import BaseDatesModel, CampaignInterface
+
+
+class TaskStageCounter(BaseDatesModel, CampaignInterface):
+    """Task counts of a stage counted by CountTasksModifier. Rows are kept
+    up to date by database triggers on api_task in the same transaction
+    as the task write, see migration 0131.
+    """
+    stage = models.OneToOneField(
+        "TaskStage",
+        on_delete=models.CASCADE,
+        related_name="counter",
+        help_text="TaskStage whose tasks are counted"
+    )
+    tasks = models.BigIntegerField(
+        default=0,
+        help_text="Count of all tasks of the stage"
+    )
+    complete_tasks = models.BigIntegerField(
+        default=0,
+        help_text="Count of complete tasks of the stage"
+    )
+    assignees = models.BigIntegerField(
+        default=0,
+        help_text="Count of distinct assignees of the tasks"
+    )
+    complete_assignees = models.BigIntegerField(
+        default=0,
+        help_text="Count of distinct assignees of the complete tasks"
+    )
+
+    @classmethod
+    def get_for_stage(cls, stage_id):
+        counter = cls.objects.filter(stage_id=stage_id).first()
+        if counter is None:
+            counter = cls.reconcile(stage_id)
+        return counter
+
+    @classmethod
+    def reconcile(cls, stage_id):
+        """Recounts tasks of the stage from scratch and starts tracking
+        the stage if it isn't tracked yet.
+        """
+        with transaction.atomic():
+            counter, _ = cls.objects.select_for_update() \
+                .get_or_create(stage_id=stage_id)
+            per_assignee = apps.get_model("api.task").objects \
+                .filter(stage_id=stage_id) \
+                .values("assignee") \
+                .annotate(tasks=Count("id"),
+                          complete_tasks=Count("id", filter=Q(complete=True))) \
+                .order_by()
+            rows = [
+                TaskStageAssigneeCounter(
+                    stage_id=stage_id,
+                    assignee_id=i["assignee"],
+                    tasks=i["tasks"],
+                    complete_tasks=i["complete_tasks"]
+                )
+                for i in per_assignee
+            ]
+            TaskStageAssigneeCounter.objects.filter(stage_id=stage_id).delete()
+            TaskStageAssigneeCounter.objects.bulk_create(rows)
+
+            counter.tasks = sum(i.tasks for i in rows)
+            counter.complete_tasks = sum(i.complete_tasks for i in rows)
+            counter.assignees = len(rows)
+            counter.complete_assignees = len(
+                [i for i in rows if i.complete_tasks])
+            counter.save()
+        return counter
+
+    def get_campaign(self):
+        return self.stage.get_campaign()
+
+    def __str__(self):
+        return f"Counter of stage #{self.stage_id}: {self.tasks} tasks"
+
+
+class TaskStageAssigneeCounter(BaseDatesModel):
+    """Task counts of a single assignee on a counted stage, used to keep
+    distinct assignee counts of TaskStageCounter. Tasks without assignee
+    are counted in the row with empty assignee.
+    """
+    stage = models.ForeignKey(
+        "TaskStage",
+        on_delete=models.CASCADE,
+        related_name="assignee_counters",
+        help_text="TaskStage whose tasks are counted"
+    )
+    assignee = models.ForeignKey(
+        "CustomUser",
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        blank=True,
+        null=True,
+        related_name="+",
+        help_text="Assignee of the counted tasks"
+    )
+    tasks = models.BigIntegerField(
+        default=0,
+        help_text="Count of tasks of the assignee"
+    )
+    complete_tasks = models.BigIntegerField(
+        default=0,
+        help_text="Count of complete tasks of the assignee"
+    )
@@ -0,0 +1,48 @@
+from django.db import models
+
+from api.constans import PropagationJobConstants
+from api.models import BaseDatesModel, CampaignInterface
+
+
+class PropagationJob(BaseDatesModel, CampaignInterface):
+    task = models.ForeignKey(
+        "Task",
+        on_delete=models.CASCADE,
+        related_name="propagation_jobs",
+        help_text="Completed task to propagate along the chain."
+    )
+    STATUS_CHOICES = [
+        (PropagationJobConstants.PENDING, 'Pending'),
+        (PropagationJobConstants.RUNNING, 'Running'),
+        (PropagationJobConstants.DONE, 'Done'),
+        (PropagationJobConstants.FAILED, 'Failed'),
+    ]
+    status = models.CharField(
+        max_length=2,
+        choices=STATUS_CHOICES,
+        default=PropagationJobConstants.PENDING,
+        help_text="Current state of the propagation."
+    )
+    next_direct_task = models.ForeignKey(
+        "Task",
+        on_delete=models.SET_NULL,
+        related_name="+",
+        blank=True,
+        null=True,
+        help_text="Next direct task of the same assignee, "
+                  "available when propagation is done."
+    )
+    error = models.TextField(
+        blank=True,
+        help_text="Error description if propagation failed."
+    )
+
+    @property
+    def is_ready(self):
+        return self.status == PropagationJobConstants.DONE
+
+    def get_campaign(self):
+        return self.task.get_campaign()
+
+    def __str__(self):
+        return f"Propagation #{self.id} of task #{self.task_id}: {self.status}"
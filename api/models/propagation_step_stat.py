@@ -0,0 +1,62 @@
+from django.db import models
+
+from api.models import BaseDatesModel, CampaignInterface
+
+
+class PropagationStepStat(BaseDatesModel, CampaignInterface):
+    """Accumulated cost of one step of chain propagation on a stage,
+    collected from sampled propagations, see api.utils.profiling.
+    Time and queries of a step include the nested propagation of tasks
+    completed automatically during the step.
+    """
+    campaign = models.ForeignKey(
+        "Campaign",
+        on_delete=models.CASCADE,
+        related_name="propagation_step_stats",
+        help_text="Campaign of the stage"
+    )
+    chain = models.ForeignKey(
+        "Chain",
+        on_delete=models.CASCADE,
+        related_name="propagation_step_stats",
+        help_text="Chain of the stage"
+    )
+    stage = models.ForeignKey(
+        "Stage",
+        on_delete=models.CASCADE,
+        related_name="propagation_step_stats",
+        help_text="Stage the step was run for"
+    )
+    step = models.CharField(
+        max_length=50,
+        help_text="Name of the propagation step"
+    )
+    calls = models.BigIntegerField(
+        default=0,
+        help_text="Count of sampled runs of the step"
+    )
+    seconds = models.FloatField(
+        default=0,
+        help_text="Total wall time of the sampled runs in seconds"
+    )
+    max_seconds = models.FloatField(
+        default=0,
+        help_text="Longest sampled run in seconds"
+    )
+    queries = models.BigIntegerField(
+        default=0,
+        help_text="Total count of database queries of the sampled runs"
+    )
+    tasks = models.BigIntegerField(
+        default=0,
+        help_text="Count of tasks created by the sampled runs"
+    )
+
+    class Meta:
+        unique_together = ["stage", "step"]
+
+    def get_campaign(self):
+        return self.campaign
+
+    def __str__(self):
+        return f"{self.step} of stage #{self.stage_id}: {self.calls} calls"
@@ -1,10 +1,43 @@
-import json
-import re
-
 from django.apps import apps
-from django.db import models
+from django.db import connection, models
 
+from api.constans import ResponseFlattenerConstants
 from api.models import BaseDatesModel, CampaignInterface
+from api.utils.flatten_plan import get_flatten_plan
+
+FIRST_LEVEL_KEYS_SQL = """
+SELECT DISTINCT e.key
+FROM api_task t
+CROSS JOIN LATERAL jsonb_each(t.responses) e
+WHERE t.stage_id = %s
+  AND jsonb_typeof(t.responses) = 'object'
+  AND jsonb_typeof(e.value) NOT IN ('object', 'array')
+"""
+
+# Paths to the values flatten_all copies: non empty strings and arrays,
+# non zero integers and true.
+ALL_PATHS_SQL = """
+WITH RECURSIVE paths(path, value) AS (
+    SELECT e.key, e.value
+    FROM api_task t
+    CROSS JOIN LATERAL jsonb_each(t.responses) e
+    WHERE t.stage_id = %s
+      AND jsonb_typeof(t.responses) = 'object'
+    UNION ALL
+    SELECT p.path || '__' || e.key, e.value
+    FROM paths p
+    CROSS JOIN LATERAL jsonb_each(p.value) e
+    WHERE jsonb_typeof(p.value) = 'object'
+)
+SELECT DISTINCT path
+FROM paths
+WHERE (jsonb_typeof(value) = 'string' AND value #>> '{}' <> '')
+   OR (jsonb_typeof(value) = 'number'
+       AND value #>> '{}' ~ '^-?[0-9]+$'
+       AND (value #>> '{}')::numeric <> 0)
+   OR (jsonb_typeof(value) = 'boolean' AND value = 'true')
+   OR (jsonb_typeof(value) = 'array' AND jsonb_array_length(value) > 0)
+"""
 
 
 class ResponseFlattener(BaseDatesModel, CampaignInterface):
@@ -44,39 +77,7 @@ class ResponseFlattener(BaseDatesModel, CampaignInterface):
     )
 
     def flatten_response(self, task):
-        result = {"id": task.id}
-        ui = json.loads(self.task_stage.get_ui_schema())
-        if task.responses and not self.flatten_all:
-            if self.copy_first_level:
-                for key, value in task.responses.items():
-                    if key not in self.exclude_list and \
-                            not isinstance(value, dict) and \
-                            not isinstance(value, list):
-                        result[key] = value
-            for path in list(self.columns):
-                value = self.follow_path(task.responses, path, ui)
-                if value:
-                    result[path] = value
-        elif self.flatten_all and task.responses:
-            result = self.flatten_all_response(task, result, ui)
-        if self.copy_system_fields:
-            result.update(task.__dict__)
-            list_of_unnecessary_keys = ['_state', 'responses']
-            for unnecessary_key in list_of_unnecessary_keys:
-                del result[unnecessary_key]
-
-        return result
-
-    def flatten_all_response(self, task, result, ui):
-        all_keyses = []
-        for key, value in task.responses.items():
-            all_keyses += self.get_all_pathes(key, value)
-
-        for path in all_keyses:
-            value = self.follow_path(task.responses, path, ui)
-            if value:
-                result[path] = value
-        return result
+        return get_flatten_plan(self).flatten(self, task)
 
     def get_all_pathes(self, k, value):
         keys = []
@@ -108,57 +109,6 @@ class ResponseFlattener(BaseDatesModel, CampaignInterface):
     def __str__(self):
         return f"ID: {self.id}; TaskStage ID: {self.task_stage.id}"
 
-    def follow_path(self, responses, path, ui=None):
-        paths = path.split("__", 1)
-        current_key = paths[0]
-        next_key = paths[1] if len(paths) > 1 else None
-        current_ui = ui.get(current_key) if ui else None
-
-        if "(i)" in current_key or "(r)" in current_key:
-            if not path.startswith("("):
-                result = responses.get(path, None)
-                if isinstance(result, dict) or isinstance(result, list):
-                    return None
-                return result
-            elif path.startswith("("):
-                return self.find_partial_key(responses, path)
-        result = responses.get(current_key, None)
-        if isinstance(result, dict):
-            return self.follow_path(result, next_key, current_ui)
-        elif not isinstance(result, dict):
-            if current_ui and current_ui.get("ui:widget") == 'customfile':
-                try:
-                    file_path = json.loads(result)
-                    files = []
-                    for key, val in file_path.items():
-                        result = "https://storage.cloud.google.com/gigaturnip-b6b5b.appspot.com/" + val + '?authuser=1'
-                        files.append(result)
-                    result = ", \n".join(files)
-                except:
-                    result = "CAN'T_PARSE_JSON_ERROR"+result
-            return result
-        return None
-
-    def find_partial_key(self, responses, path):
-        for key, value in responses.items():
-            search_type = path[path.find("(") + 1: path.find(")")]
-            keys = path.split(")", 1)[1].split("__", 1)
-            key_to_find = keys[0]
-
-            condition = False
-            if search_type == 'i':
-                condition = key_to_find in key and key_to_find != key
-            elif search_type == 'r':
-                condition = re.findall(rf"{key_to_find}", key)
-
-            if condition:
-                if not isinstance(value, dict) and not isinstance(value, list):
-                    return value
-                else:
-                    return self.follow_path(value, keys[1])
-
-        return None
-
     def ordered_columns(self):
         ordered_columns = self.task_stage.make_columns_ordered()
 
@@ -175,5 +125,56 @@ class ResponseFlattener(BaseDatesModel, CampaignInterface):
             finally_columns.insert(position, col)
         return finally_columns
 
+    def response_columns(self):
+        """Returns names of the columns flattened responses of the stage
+        tasks have, found in SQL without loading the responses.
+        """
+        if self.flatten_all:
+            sql = ALL_PATHS_SQL
+        elif self.copy_first_level:
+            sql = FIRST_LEVEL_KEYS_SQL
+        else:
+            return list(self.columns)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [self.task_stage_id])
+            columns = sorted(i[0] for i in cursor.fetchall())
+        if not self.flatten_all:
+            columns = [i for i in columns if i not in self.exclude_list]
+        return columns + list(self.columns)
+
+    def csv_columns(self):
+        """Returns CSV columns and the columns of responses that are not
+        in the schema. Those are left out and listed in the description
+        column of the first row.
+        """
+        columns = get_flatten_plan(self).get_ordered_columns(self)
+        extra_columns = [i for i in self.response_columns()
+                         if i not in columns + self.columns]
+        if extra_columns:
+            columns += [ResponseFlattenerConstants.DESCRIPTION_COLUMN]
+        return columns, extra_columns
+
+    def csv_rows(self, chunk_size=ResponseFlattenerConstants.CHUNK_SIZE):
+        """Returns CSV columns and a generator flattening tasks of the
+        stage one chunk at a time.
+        """
+        columns, extra_columns = self.csv_columns()
+        return columns, self.flattened_rows(extra_columns, chunk_size)
+
+    def flattened_rows(self, extra_columns,
+                       chunk_size=ResponseFlattenerConstants.CHUNK_SIZE):
+        """Yields flattened tasks of the stage, listing the extra columns
+        in the description column of the first row.
+        """
+        plan = get_flatten_plan(self)
+        description = ResponseFlattenerConstants.DESCRIPTION_COLUMN
+        tasks = self.task_stage.tasks.order_by("id") \
+            .iterator(chunk_size=chunk_size)
+        for i, task in enumerate(tasks):
+            row = plan.flatten(self, task)
+            if extra_columns and i == 0:
+                row[description] = ", ".join(extra_columns)
+            yield row
+
     def get_campaign(self):
         return self.task_stage.get_campaign()
@@ -87,6 +87,16 @@ class Task(BaseDatesModel, CampaignInterface):
         UniqueConstraint(
             fields=['integrator_group', 'stage'],
             name='unique_integrator_group')
+        indexes = [
+            # Open pool: tasks still free to be selected by users.
+            models.Index(
+                fields=['stage', 'start_period', 'end_period'],
+                name='api_task_open_pool_idx',
+                condition=Q(complete=False, assignee__isnull=True)
+            ),
+            # Task change feed, ordered by (change_xid, id): the column,
+            # its indexes and triggers are created by migration 0138.
+        ]
 
     class ImpossibleToUncomplete(Exception):
         pass
@@ -116,18 +126,28 @@ class Task(BaseDatesModel, CampaignInterface):
                 task = Task.objects.select_for_update(nowait=True).get(pk=self.id)
             except OperationalError:
                 raise Task.CompletionInProgress
-            if task.complete and not self.stage.chain.is_individual:
-                raise Task.AlreadyCompleted
-
-            if responses:
-                task.responses = responses
-            if force:
-                task.force_complete = True
-            if complete:
-                task.complete = True
-            task.save()
+            task.stage = self.stage
+            task.save_completion(responses, force, complete)
             return task
 
+    def save_completion(self, responses=None, force=False, complete=True,
+                        replace_responses=False):
+        """
+        Saves responses and completion of the task, which row must be
+        locked by the caller. Empty responses are ignored unless
+        replace_responses is set.
+        """
+        if self.complete and not self.stage.chain.is_individual:
+            raise Task.AlreadyCompleted
+
+        if responses or (replace_responses and responses is not None):
+            self.responses = responses
+        if force:
+            self.force_complete = True
+        if complete:
+            self.complete = True
+        self.save()
+
     def set_not_complete(self):
         if self.complete:
             if self.stage.assign_user_by == "IN":
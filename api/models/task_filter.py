@@ -0,0 +1,130 @@
+from django.apps import apps
+from django.db import connection, models
+
+from api.models import BaseDatesModel, CampaignInterface
+
+BACKFILL_SQL = """
+INSERT INTO api_taskfiltervalue
+    (created_at, updated_at, task_id, case_id, field_id,
+     text_value, number_value)
+SELECT now(), now(), t.id, t.case_id, f.id,
+       CASE WHEN octet_length(v.value #>> '{}') <= 2000
+            THEN v.value #>> '{}' END,
+       CASE WHEN jsonb_typeof(v.value) = 'number'
+            THEN (v.value #>> '{}')::double precision END
+FROM api_taskfilterfield f
+JOIN api_task t ON t.stage_id = f.stage_id
+CROSS JOIN LATERAL (
+    SELECT t.responses #> string_to_array(f.field_name, '__') AS value
+) v
+WHERE f.id = ANY(%s)
+  AND jsonb_typeof(v.value) IN ('string', 'number', 'boolean')
+"""
+
+
+class TaskFilterField(BaseDatesModel, CampaignInterface):
+    """Response field of a stage used by filter_fields_schema of some
+    TaskStage. Values of the field are copied to TaskFilterValue by
+    database triggers on api_task, see migration 0134.
+    """
+    stage = models.ForeignKey(
+        "TaskStage",
+        on_delete=models.CASCADE,
+        related_name="filter_fields",
+        help_text="Stage whose task responses hold the field"
+    )
+    field_name = models.CharField(
+        max_length=255,
+        help_text="Name of the response field, nested keys are "
+                  "separated with __"
+    )
+
+    class Meta:
+        unique_together = ['stage', 'field_name']
+
+    @classmethod
+    def sync(cls, schema):
+        """Starts tracking fields of the filter_fields_schema and copies
+        values of the existing tasks of newly tracked fields.
+        """
+        wanted = {(int(i["stage_id"]), i["field_name"]) for i in schema or []
+                  if i.get("stage_id") and i.get("field_name")}
+        if not wanted:
+            return
+        stage_ids = set(apps.get_model("api.taskstage").objects.filter(
+            id__in={stage_id for stage_id, _ in wanted}
+        ).values_list("id", flat=True))
+        existing = set(cls.objects.filter(
+            stage_id__in=stage_ids
+        ).values_list("stage_id", "field_name"))
+        missing = {i for i in wanted - existing if i[0] in stage_ids}
+        if not missing:
+            return
+        cls.objects.bulk_create(
+            [cls(stage_id=stage_id, field_name=field_name)
+             for stage_id, field_name in missing],
+            ignore_conflicts=True
+        )
+        q = models.Q()
+        for stage_id, field_name in missing:
+            q |= models.Q(stage_id=stage_id, field_name=field_name)
+        field_ids = list(cls.objects.filter(q).values_list("id", flat=True))
+        TaskFilterValue.objects.filter(field_id__in=field_ids).delete()
+        with connection.cursor() as cursor:
+            cursor.execute(BACKFILL_SQL, [field_ids])
+
+    def get_campaign(self):
+        return self.stage.get_campaign()
+
+    def __str__(self):
+        return f"{self.field_name} of stage #{self.stage_id}"
+
+
+class TaskFilterValue(BaseDatesModel):
+    """Value of a TaskFilterField in responses of a task, typed and
+    indexed for the filters of user_selectable. Strings and booleans are
+    kept as text, numbers also as number_value. Texts longer than 2000
+    bytes are not kept, so they never match: btree indexes can't hold
+    values over a third of a page.
+    """
+    task = models.ForeignKey(
+        "Task",
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name="+",
+        help_text="Task whose responses hold the value"
+    )
+    case = models.ForeignKey(
+        "Case",
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        db_index=False,
+        blank=True,
+        null=True,
+        related_name="+",
+        help_text="Case of the task"
+    )
+    field = models.ForeignKey(
+        TaskFilterField,
+        on_delete=models.CASCADE,
+        related_name="values",
+        help_text="Field the value belongs to"
+    )
+    text_value = models.TextField(
+        null=True,
+        help_text="Value as text"
+    )
+    number_value = models.FloatField(
+        null=True,
+        help_text="Value as number if it is a number"
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["case", "field"],
+                         name="api_taskfilter_case_field_idx"),
+            models.Index(fields=["field", "number_value"],
+                         name="api_taskfilter_number_idx"),
+            models.Index(fields=["field", "text_value"],
+                         name="api_taskfilter_text_idx"),
+        ]
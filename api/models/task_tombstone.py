@@ -0,0 +1,42 @@
+from django.db import models
+
+from api.models import BaseDatesModel
+
+
+class TaskTombstone(BaseDatesModel):
+    """Record of a deleted task for the task change feed, written by a
+    database trigger on api_task, see migration 0138. created_at is the
+    time of deletion. Ids are kept as plain numbers, as the stage and
+    campaign may be deleted together with the task.
+    """
+    change_xid = models.BigIntegerField(
+        default=0,
+        help_text="Id of the transaction that deleted the task"
+    )
+    task_id = models.BigIntegerField(
+        help_text="Id of the deleted task"
+    )
+    stage_id = models.BigIntegerField(
+        help_text="Stage of the deleted task"
+    )
+    case_id = models.BigIntegerField(
+        blank=True,
+        null=True,
+        help_text="Case of the deleted task"
+    )
+    campaign_id = models.BigIntegerField(
+        blank=True,
+        null=True,
+        help_text="Campaign of the stage of the deleted task"
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["change_xid", "task_id"],
+                         name="api_tombstone_feed_idx"),
+            models.Index(fields=["campaign_id", "change_xid"],
+                         name="api_tombstone_campaign_idx"),
+        ]
+
+    def __str__(self):
+        return f"Deleted task #{self.task_id} of stage #{self.stage_id}"
@@ -1,12 +1,12 @@
 import traceback
 from json import JSONDecodeError
 
-import requests
 from django.db import models
 
 from api.constans import WebhookConstants, RequestMethodConstants
 from api.models import BaseDatesModel, TaskStage
 from api.utils.injector import inject
+from api.utils.webhook_transport import transport
 
 
 class Webhook(BaseDatesModel):
@@ -195,13 +195,17 @@ class Webhook(BaseDatesModel):
 
     def request(self, url, data):
         if self.request_method == RequestMethodConstants.PATCH:
-            return requests.patch(url, json=data, headers=self.headers)
+            return transport.patch(url, json=data, headers=self.headers,
+                                   error_source=self.task_stage)
         if self.request_method == RequestMethodConstants.PUT:
-            return requests.put(url, json=data, headers=self.headers)
-        return requests.post(url, json=data, headers=self.headers)
+            return transport.put(url, json=data, headers=self.headers,
+                                 error_source=self.task_stage)
+        return transport.post(url, json=data, headers=self.headers,
+                              error_source=self.task_stage)
 
     def post(self, data):
-        response = requests.post(self.url, json=data, headers=self.headers)
+        response = transport.post(self.url, json=data, headers=self.headers,
+                                  error_source=self.task_stage)
         return response
 
     def get_responses(self, task):
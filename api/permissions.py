@@ -4,16 +4,19 @@ from django.db import transaction, OperationalError
 from django.db.models import Q
 from rest_access_policy import AccessPolicy
 from api.models import (
-    TaskStage, Task, RankLimit, CampaignManagement,
+    TaskStage, Task, RankLimit,
     CustomUser, Campaign,
 )
+from api.constans import TaskStageConstants
 from api.utils import utils
+from api.utils.access_scope import get_access_scope, get_user_access_context
 
 def available_campaigns(user, queryset):
+    scope = get_access_scope(user)
     return queryset.filter(
-            Q(id__in=user.ranks.values("track__campaign"))
+            Q(id__in=scope.rank_campaign_ids)
             | Q(open=True)
-            | Q(id__in=user.managed_campaigns.all())
+            | Q(id__in=scope.managed_campaign_ids)
         )
 
 class CampaignAccessPolicy(AccessPolicy):
@@ -64,9 +67,7 @@ class CampaignAccessPolicy(AccessPolicy):
 
     def is_manager(self, request, view, action) -> bool:
         campaign = view.get_object()
-        managers = campaign.managers.all()
-
-        return request.user in managers
+        return get_user_access_context(request).is_manager(campaign.id)
 
     def is_accessible(self, request, view, action) -> bool:
         qs = Campaign.objects.filter(id=view.get_object().id)
@@ -130,11 +131,11 @@ class ManagersOnlyAccessPolicy(AccessPolicy):
         return utils.is_user_campaign_manager(user, value.id)
 
     def is_manager(self, request, view, action) -> bool:
-        managers = view.get_object().get_campaign().managers.all()
-        return request.user in managers
+        campaign = view.get_object().get_campaign()
+        return get_user_access_context(request).is_manager(campaign.id)
 
     def can_create(self, request, view, action) -> bool:
-        return bool(request.user.managed_campaigns.all())
+        return bool(get_user_access_context(request).managed_campaign_ids)
 
 
 class ChainAccessPolicy(ManagersOnlyAccessPolicy):
@@ -162,12 +163,11 @@ class ChainAccessPolicy(ManagersOnlyAccessPolicy):
             return queryset
         elif action == "textbooks":
             return queryset
-        
-        rank_limits = RankLimit.objects.filter(rank__in=request.user.ranks.all())
-        all_available_chains = rank_limits.values_list('stage__chain', flat=True).distinct()
+
+        scope = get_user_access_context(request).scope
         return queryset.filter(
-           Q(campaign__campaign_managements__user=request.user) |
-           Q(id__in=all_available_chains)
+           Q(campaign_id__in=scope.managed_campaign_ids) |
+           Q(id__in=scope.rank_chain_ids)
         ).distinct()
     
     # @classmethod
@@ -295,8 +295,8 @@ class TaskStageAccessPolicy(ManagersOnlyAccessPolicy):
         return view.get_object() in view.get_queryset()
 
     def is_manager(self, request, view, action) -> bool:
-        managers = view.get_object().get_campaign().managers.all()
-        return request.user in managers
+        campaign = view.get_object().get_campaign()
+        return get_user_access_context(request).is_manager(campaign.id)
 
     def is_stage_fast_track(self, request, view, action) -> bool:
         stage = view.get_object()
@@ -318,7 +318,7 @@ class TaskAccessPolicy(AccessPolicy):
             "effect": "allow"
         },
         {
-            "action": ["user_activity_csv"],
+            "action": ["user_activity_csv", "changes"],
             "principal": "authenticated",
             "effect": "allow",
             "condition": "is_campaign_manager"
@@ -330,13 +330,19 @@ class TaskAccessPolicy(AccessPolicy):
             "condition_expression": "is_assignee or is_stage_public "
                                     "or is_manager or can_user_request_assignment"
         },
+        {
+            "action": ["propagation_status"],
+            "principal": "authenticated",
+            "effect": "allow",
+            "condition_expression": "is_assignee or is_manager"
+        },
         {
             "action": ["create"],
             "principal": "group:auto_creator",
             "effect": "allow",
         },
         {
-            "action": ["user_selectable", "user_relevant"],
+            "action": ["user_selectable", "user_relevant", "bulk_complete"],
             "principal": "authenticated",
             "effect": "allow",
         },
@@ -383,13 +389,11 @@ class TaskAccessPolicy(AccessPolicy):
     @classmethod
     def scope_queryset(cls, request, queryset):
         user = request.user
-        user_campaigns = CampaignManagement.objects.filter(
-            user=user).values('campaign')
-        tasks = request.user.tasks.all()
-        tasks |= queryset.filter(stage__chain__campaign__in=user_campaigns)
-        tasks |= queryset.filter(
-            Q(id__in=user.ranks.values("ranklimits__stage__tasks"))
-            & (Q(assignee=user) | Q(assignee__isnull=True) )
+        scope = get_user_access_context(request).scope
+        tasks = queryset.filter(
+            Q(assignee=user)
+            | Q(stage_id__in=scope.managed_stage_ids)
+            | Q(stage_id__in=scope.rank_stage_ids, assignee__isnull=True)
         )
 
         return tasks.distinct()
@@ -417,14 +421,15 @@ class TaskAccessPolicy(AccessPolicy):
         return task.complete
 
     def can_user_request_assignment(self, request, view, action):
-        queryset = Task.objects.filter(id=view.get_object().id)
-        return bool(utils.filter_for_user_selectable_tasks(
-            queryset,
-            request.user))
+        task = view.get_object()
+        return not task.complete and task.assignee_id is None \
+            and task.stage.assign_user_by != TaskStageConstants.INTEGRATOR \
+            and task.stage_id in \
+            get_user_access_context(request).selectable_stage_ids
 
     def is_manager(self, request, view, action) -> bool:
-        managers = view.get_object().get_campaign().managers.all()
-        return request.user in managers
+        campaign = view.get_object().get_campaign()
+        return get_user_access_context(request).is_manager(campaign.id)
 
     def is_webhook(self, request, view, action):
         return bool(view.get_object().stage.get_webhook())
@@ -438,24 +443,17 @@ class TaskAccessPolicy(AccessPolicy):
             return False
 
     def is_campaign_manager(self, request, view, action):
-        managed_campaigns = request.user.managed_campaigns.all()
-        return bool(managed_campaigns)
+        return bool(get_user_access_context(request).managed_campaign_ids)
 
     def is_selection_open(self, request, view, action) -> bool:
-        rank_limits = RankLimit.objects.filter(
-            rank__in=request.user.ranks.all(),
-            is_selection_open=True,
-            stage=view.get_object().stage
-        )
-        return bool(rank_limits)
+        rank_limits = get_user_access_context(request).get_rank_limits(
+            view.get_object().stage_id)
+        return any(i.is_selection_open for i in rank_limits)
 
     def is_listing_allowed(self, request, view, action) -> bool:
-        rank_limits = RankLimit.objects.filter(
-            rank__in=request.user.ranks.all(),
-            is_listing_allowed=True,
-            stage=view.get_object().stage
-        )
-        return bool(rank_limits)
+        rank_limits = get_user_access_context(request).get_rank_limits(
+            view.get_object().stage_id)
+        return any(i.is_listing_allowed for i in rank_limits)
 
 
 class RankAccessPolicy(ManagersOnlyAccessPolicy):
@@ -567,15 +565,12 @@ class NotificationAccessPolicy(ManagersOnlyAccessPolicy):
 
     @classmethod
     def scope_queryset(cls, request, queryset):
-        user_campaigns = CampaignManagement.objects.filter(
-            user=request.user).values('campaign')
-        qs = queryset.filter(
-            Q(campaign__in=user_campaigns) |
-            Q(rank__id__in=request.user.ranks.values('id')) |
+        scope = get_user_access_context(request).scope
+        return queryset.filter(
+            Q(campaign_id__in=scope.managed_campaign_ids) |
+            Q(rank_id__in=scope.rank_ids) |
             Q(target_user=request.user)
-        ).distinct()
-
-        return qs
+        )
 
 
     @classmethod
@@ -583,14 +578,15 @@ class NotificationAccessPolicy(ManagersOnlyAccessPolicy):
         return utils.is_user_campaign_manager(user, value.id)
 
     def is_manager(self, request, view, action) -> bool:
-        managers = view.get_object().get_campaign().managers.all()
-        return request.user in managers
+        campaign = view.get_object().get_campaign()
+        return get_user_access_context(request).is_manager(campaign.id)
 
     def can_create(self, request, view, action) -> bool:
-        return bool(request.user.managed_campaigns.all())
+        return bool(get_user_access_context(request).managed_campaign_ids)
 
     def is_user_have_rank(self, request, view, action):
-        return view.get_object().rank in request.user.ranks.all()
+        return view.get_object().rank_id in \
+            get_user_access_context(request).rank_ids
 
     def is_user_target(self, request, view, action):
         return view.get_object().target_user == request.user
@@ -637,11 +633,11 @@ class ResponseFlattenerAccessPolicy(AccessPolicy):
             .distinct()
 
     def is_manager(self, request, view, action) -> bool:
-        managers = view.get_object().get_campaign().managers.all()
-        return request.user in managers
+        campaign = view.get_object().get_campaign()
+        return get_user_access_context(request).is_manager(campaign.id)
 
     def is_campaign_manager(self, request, view, action):
-        return bool(request.user.managed_campaigns.all())
+        return bool(get_user_access_context(request).managed_campaign_ids)
 
 
 class TaskAwardAccessPolicy(ManagersOnlyAccessPolicy):
@@ -704,7 +700,7 @@ class UserStatisticAccessPolicy(ManagersOnlyAccessPolicy):
         return result
 
     def is_user_campaign_manager(self, request, view, action):
-        return request.user.managed_campaigns.exists()
+        return bool(get_user_access_context(request).managed_campaign_ids)
 
 
 class CategoryAccessPolicy(ManagersOnlyAccessPolicy):
@@ -779,3 +775,37 @@ class VolumeAccessPolicy(AccessPolicy):
         if request.user.is_authenticated:
             return queryset.filter(track_fk__default_rank__in=request.user.ranks.all())
         return queryset.none()
+
+
+class PropagationStepStatAccessPolicy(ManagersOnlyAccessPolicy):
+    statements = [
+        {
+            "action": ["list", "metrics"],
+            "principal": "authenticated",
+            "effect": "allow",
+            "condition": "is_user_campaign_manager"
+        }
+    ]
+
+    @classmethod
+    def scope_queryset(cls, request, qs):
+        return qs.filter(
+            campaign_id__in=get_user_access_context(request).managed_campaign_ids)
+
+    def is_user_campaign_manager(self, request, view, action):
+        return bool(get_user_access_context(request).managed_campaign_ids)
+
+
+class ExportJobAccessPolicy(AccessPolicy):
+    statements = [
+        {
+            "action": ["list", "retrieve", "download"],
+            "principal": "authenticated",
+            "effect": "allow",
+        },
+    ]
+
+    @classmethod
+    def scope_queryset(cls, request, qs):
+        managed = get_user_access_context(request).managed_campaign_ids
+        return qs.filter(Q(user=request.user) | Q(campaign_id__in=managed))
@@ -4,7 +4,7 @@ from datetime import datetime
 
 from django.contrib.postgres.aggregates import ArrayAgg
 from django.core.exceptions import ObjectDoesNotExist
-from django.db.models import Q
+from django.db.models import Q, F, Manager
 from jsonschema import validate
 from okutool.models import Test
 from okutool.serializers import TestSerializer
@@ -16,18 +16,24 @@ from api.asyncstuff import process_updating_schema_answers
 from api.constans import (
     NotificationConstants, ConditionalStageConstants,
     JSONFilterConstants,
-    TaskStageSchemaSourceConstants, ChainConstants, TaskStageConstants,
+    TaskStageSchemaSourceConstants, TaskStageConstants,
 )
 from api.models import Campaign, Chain, TaskStage, \
     ConditionalStage, Case, \
     Task, Rank, RankLimit, Track, RankRecord, CampaignManagement, Notification, \
     NotificationStatus, ResponseFlattener, \
     TaskAward, DynamicJson, TestWebhook, Category, Language, Country, \
-    TranslateKey, CustomUser, Volume
+    TranslateKey, CustomUser, Volume, PropagationJob, PropagationStepStat, \
+    ExportJob, TaskTombstone
 from api.permissions import ManagersOnlyAccessPolicy
+from api.utils.chain_layout import get_chain_layout
+from api.utils.chain_progress import get_chain_progress
 
 
 base_model_fields = ['id', 'name', 'description']
+
+# Tasks of a user on a stage without any of the user's tasks.
+EMPTY_STAGE_TASKS = {"completed": [], "opened": [], "reopened": []}
 stage_fields = ['chain', 'in_stages', 'out_stages', 'x_pos', 'y_pos']
 schema_provider_fields = ['json_schema', 'ui_schema', 'card_json_schema', 'card_ui_schema', 'library', 'filter_fields_schema']
 
@@ -132,6 +138,28 @@ class TaskStageChainInfoSerializer(serializers.Serializer):
     opened = serializers.ListField(child=serializers.IntegerField())
     reopened = serializers.ListField(child=serializers.IntegerField())
 
+class ChainIndividualsListSerializer(serializers.ListSerializer):
+
+    def to_representation(self, data):
+        chains = list(data)
+        if chains and "data" not in chains[0]:
+            missing = [i["id"] for i in chains if "progress" not in i]
+            progress = get_chain_progress(self.context["request"].user,
+                                          missing) if missing else {}
+            for chain in chains:
+                chain_progress = chain.pop("progress", None) \
+                    or progress[chain["id"]]
+                tasks = {i["id"]: i for i in chain_progress.data}
+                stages = get_chain_layout(
+                    chain["id"], chain.pop("layout_version", None)
+                ).get_stages(chain["order_in_individuals"])
+                chain["data"] = [
+                    {**stage, **tasks.get(stage["id"], EMPTY_STAGE_TASKS)}
+                    for stage in stages
+                ]
+        return super().to_representation(chains)
+
+
 class ChainIndividualsSerializer(serializers.ModelSerializer):
     stages_data = TaskStageChainInfoSerializer(source="data", many=True)
     campaign = serializers.IntegerField()
@@ -139,69 +167,7 @@ class ChainIndividualsSerializer(serializers.ModelSerializer):
     class Meta:
         model = Chain
         fields = ["id", "name", "stages_data", "campaign", 'new_task_view_mode']
-
-
-    def find_order(self, node, visited, stack, nodes):
-        visited[node["id"]] = True
-        for neighbor in node["out_stages"]:
-            if neighbor is None:
-                continue
-            if not visited[neighbor]:
-                self.find_order(nodes[neighbor], visited, stack, nodes)
-
-            stack.append(neighbor)
-
-    def next_to_conditionals(self, stage_id, nodes):
-        result = []
-        for out_stage_id in nodes[stage_id]["out_stages"]:
-            if out_stage_id is None:
-                continue
-            if nodes[out_stage_id].get("type", None) != "COND":
-                result.append(out_stage_id)
-                continue
-            result.extend(self.next_to_conditionals(out_stage_id, nodes))
-        return result
-
-    def order_by_graph_flow(self, stages, conditionals):
-        nodes = {i["id"]: i for i in stages}
-        for node in conditionals:
-            nodes[node["id"]] = node
-            nodes[node["id"]]["type"] = "COND"
-
-        for key, value in nodes.items():
-            result_out_stages = []
-            for idx, out_stage_id in enumerate(value["out_stages"]):
-                if out_stage_id is None:
-                    continue
-                if nodes[out_stage_id].get("type", None) != "COND":
-                    result_out_stages.append(out_stage_id)
-                    continue
-
-                result_out_stages.extend(
-                    self.next_to_conditionals(out_stage_id, nodes))
-            nodes[key]["out_stages"] = result_out_stages
-
-        ts_nodes = {i["id"]: nodes[i["id"]] for i in stages}
-
-        first_stage = [i for i in nodes.values() if i["in_stages"] == [None]]
-        if not first_stage:
-            return stages
-        first_stage = first_stage[0]
-
-        # Initialize visited dictionary to keep track of visited nodes during DFS
-        visited = {node_id: False for node_id in ts_nodes.keys()}
-
-        # Initialize the stack to store the sorted nodes
-        stack = []
-
-        self.find_order(first_stage, visited, stack, ts_nodes)
-
-        stack.append(first_stage["id"])
-
-        return [nodes[i] for i in stack[::-1]]
-
-    def order_by_order(self, stages):
-        return sorted(stages, key=lambda x: x["order"])
+        list_serializer_class = ChainIndividualsListSerializer
 
     def filter_stages(self, stages):
         result = []
@@ -214,36 +180,10 @@ class ChainIndividualsSerializer(serializers.ModelSerializer):
             result.append(stage)
         return result
 
-    def calculate_in_stages(self, data, conditionals=None):
-        # Calculate in_stages for all stages in the chain
-        all_stages = data.copy()
-        
-        # Add conditionals to the stages list if provided
-        if conditionals:
-            all_stages.extend(conditionals)
-            
-        for stage in data:  # Only update regular stages, not conditionals
-            stage['in_stages'] = [
-                other_stage['id'] 
-                for other_stage in all_stages  # Check both regular and conditional stages
-                if (stage['id'] in other_stage.get('out_stages', []) and stage['id'] != other_stage['id'])
-            ]
-        return data
-
     def to_representation(self, instance):
-        stages_data = instance["data"]
-        stages_data = self.calculate_in_stages(stages_data, instance["conditionals"])
-        order_type = instance["order_in_individuals"]
-        # if order_type == ChainConstants.CHRONOLOGICALLY:
-        #     data = self.order_by_created_at(instance["data"])
-        if order_type == ChainConstants.GRAPH_FLOW:
-            stages_data = self.order_by_graph_flow(stages_data, instance["conditionals"])
-        elif order_type == ChainConstants.ORDER:
-            stages_data = self.order_by_order(stages_data)
-
-        stages_data = self.filter_stages(stages_data)
-
-        instance["data"] = stages_data
+        # Stages come ordered from the cached chain layout with the
+        # user's tasks merged in by ChainIndividualsListSerializer.
+        instance["data"] = self.filter_stages(instance["data"])
 
         return super(ChainIndividualsSerializer, self).to_representation(instance)
     
@@ -505,9 +445,48 @@ class TaskListSerializer(serializers.ModelSerializer):
         return obj['stage_data']
 
 
+def load_displayed_prev_tasks(tasks, max_depth):
+    """Sets displayed_prev_tasks on the tasks: their in tasks on stages
+    displayed by their stage, down to max_depth levels, with stage and
+    chain loaded. Each level is loaded with one query.
+    """
+    links = Task.in_tasks.through.objects
+    level = list(tasks)
+    for _ in range(max_depth):
+        by_id = {}
+        for task in level:
+            task.displayed_prev_tasks = []
+            by_id.setdefault(task.id, []).append(task)
+        if not by_id:
+            return
+        level = []
+        for link in links.filter(
+                from_task_id__in=by_id,
+                from_task__stage__displayed_prev_stages=F("to_task__stage_id")
+        ).select_related("to_task__stage__chain").order_by("to_task_id"):
+            for task in by_id[link.from_task_id]:
+                task.displayed_prev_tasks.append(link.to_task)
+            level.append(link.to_task)
+    for task in level:
+        task.displayed_prev_tasks = []
+
+
+class TaskUserSelectableListSerializer(serializers.ListSerializer):
+
+    def to_representation(self, data):
+        tasks = data.all() if isinstance(data, Manager) else data
+        tasks = list(tasks)
+        if tasks and not hasattr(tasks[0], "displayed_prev_tasks"):
+            load_displayed_prev_tasks(tasks, self.child.max_depth)
+        return super().to_representation(tasks)
+
+
 class TaskUserSelectableSerializer(serializers.ModelSerializer):
     stage = serializers.SerializerMethodField()
 
+    # Levels of displayed previous tasks rendered under a task.
+    max_depth = 3
+
     class Meta:
         model = Task
         fields = [
@@ -519,14 +498,18 @@ class TaskUserSelectableSerializer(serializers.ModelSerializer):
             'stage',
             'created_at'
         ]
+        list_serializer_class = TaskUserSelectableListSerializer
 
     def get_stage(self, obj):
-        displayed_prev_tasks = TaskUserSelectableSerializer(obj.in_tasks.filter(stage__in=obj.stage.displayed_prev_stages.all()), many=True)
+        if not hasattr(obj, "displayed_prev_tasks"):
+            load_displayed_prev_tasks([obj], self.max_depth)
+        displayed_prev_tasks = TaskUserSelectableSerializer(
+            obj.displayed_prev_tasks, many=True)
         result = {
             "id": obj.stage.id,
             "name": obj.stage.name,
-            "chain": obj.stage.chain.id,
-            "campaign": obj.stage.chain.campaign.id,
+            "chain": obj.stage.chain_id,
+            "campaign": obj.stage.chain.campaign_id,
             "card_json_schema": obj.stage.card_json_schema,
             "card_ui_schema": obj.stage.card_ui_schema,
             "displayed_prev_stages": displayed_prev_tasks.data,
@@ -566,6 +549,12 @@ class TaskEditSerializer(serializers.ModelSerializer):
         fields = ['complete', 'responses']
 
 
+class TaskBulkCompleteSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    responses = serializers.JSONField(required=False)
+    complete = serializers.BooleanField(default=False)
+
+
 class TaskDefaultSerializer(serializers.ModelSerializer):
     stage = TaskStageReadSerializer(read_only=True)
     test = serializers.SerializerMethodField()
@@ -600,6 +589,56 @@ class TaskDefaultSerializer(serializers.ModelSerializer):
         return super().to_representation(instance)
 
 
+class PropagationJobSerializer(serializers.ModelSerializer):
+    is_ready = serializers.BooleanField(read_only=True)
+
+    class Meta:
+        model = PropagationJob
+        fields = ['id', 'task', 'status', 'is_ready', 'next_direct_task',
+                  'error', 'created_at', 'updated_at']
+        read_only_fields = fields
+
+
+class ExportJobSerializer(serializers.ModelSerializer):
+    is_ready = serializers.BooleanField(read_only=True)
+
+    class Meta:
+        model = ExportJob
+        fields = ['id', 'kind', 'params', 'status', 'is_ready', 'rows_done',
+                  'rows_total', 'size', 'error', 'created_at', 'updated_at']
+        read_only_fields = fields
+
+
+class TaskChangeSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Task
+        fields = ['id', 'stage', 'case', 'assignee', 'complete',
+                  'force_complete', 'reopened', 'responses', 'created_at',
+                  'updated_at']
+        read_only_fields = fields
+
+
+class TaskTombstoneSerializer(serializers.ModelSerializer):
+    id = serializers.IntegerField(source='task_id', read_only=True)
+    stage = serializers.IntegerField(source='stage_id', read_only=True)
+    case = serializers.IntegerField(source='case_id', read_only=True)
+    deleted_at = serializers.DateTimeField(source='created_at',
+                                           read_only=True)
+
+    class Meta:
+        model = TaskTombstone
+        fields = ['id', 'stage', 'case', 'deleted_at']
+        read_only_fields = fields
+
+
+class PropagationStepStatSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = PropagationStepStat
+        fields = ['id', 'campaign', 'chain', 'stage', 'step', 'calls',
+                  'seconds', 'max_seconds', 'queries', 'tasks', 'updated_at']
+        read_only_fields = fields
+
+
 class TaskUserActivitySerializer(serializers.Serializer):
     stage = serializers.IntegerField()
     stage_name = serializers.CharField()
@@ -1,85 +1,254 @@
-from django.db.models.signals import pre_save, post_save
+from django.db.models.signals import pre_save, post_save, post_delete, \
+    m2m_changed, post_init
 from django.dispatch import receiver
 from rest_framework import serializers
 
-from api.models import Task, Log, TaskStage, Notification
+from api.models import Task, Log, TaskStage, Notification, Stage, \
+    ConditionalStage, Chain, Campaign, CopyField, CountTasksModifier, \
+    DatetimeSort, TaskAward, AutoNotification, ConditionalLimit, Webhook, \
+    Integration, TranslationAdapter, PreviousManual, TaskStageCounter, \
+    RankLimit, RankRecord, CustomUser, Rank, CampaignManagement, Track, \
+    TaskFilterField
+from api.utils import audit
+from api.utils.access_scope import invalidate_access_scopes
+from api.utils.chain_graph import invalidate_chain_graphs, \
+    invalidate_stage_graphs
+from api.utils.chain_progress import invalidate_chain_progress
+from api.utils.selectable_pool import invalidate_selectable_stages
+
+# Models the compiled chain graph is built from, mapped to the stage
+# field that places them in a chain.
+CHAIN_GRAPH_DEPENDENCIES = {
+    CopyField: "task_stage_id",
+    CountTasksModifier: "task_stage_id",
+    DatetimeSort: "stage_id",
+    TaskAward: "task_stage_verified_id",
+    AutoNotification: "trigger_stage_id",
+    ConditionalLimit: "conditional_stage_id",
+    Webhook: "task_stage_id",
+    Integration: "task_stage_id",
+    TranslationAdapter: "stage_id",
+    PreviousManual: "task_stage_to_assign_id",
+}
 
 
 class TaskDebugSerializer(serializers.ModelSerializer):
     class Meta:
         model = Task
-        fields = '__all__'
+        exclude = ['in_tasks']
 
 
-class TaskStageDebugSerializer(serializers.ModelSerializer):
-    class Meta:
-        model = TaskStage
-        fields = '__all__'
+TASK_STAGE_FIELDS = [field.attname for field in TaskStage._meta.concrete_fields]
+
+
+@receiver(post_init, sender=Task)
+@receiver(post_save, sender=Task)
+def track_task_responses(sender, instance, **kwargs):
+    instance._state.loaded_responses = audit.snapshot(
+        instance.__dict__.get("responses"))
 
 
 @receiver(pre_save, sender=Task)
 def log_empty_task_response(sender, instance, **kwargs):
-    # print(f"Signal received, INSTANCE RESPONSES: {instance.responses}")
-    if instance.id is None:
-        pass
-    else:
-        previous = Task.objects.get(id=instance.id)
-        data = {"previous": TaskDebugSerializer(previous).data,
-                "current": TaskDebugSerializer(instance).data}
-        # log = Log(
-        #     name="Task edited",
-        #     description="Overwritten responses are inside JSON field",
-        #     json=data,
-        #     task=instance,
-        #     campaign=instance.get_campaign(),
-        #     stage=instance.stage,
-        #     chain=instance.stage.chain,
-        #     user=instance.assignee,
-        # )
-        # log.save()
-        if previous.responses and not instance.responses:
-            reason = "wrong"
-            if instance.responses is None:
-                reason = "null"
-            elif not instance.responses:
-                reason = "empty"
-            name = f"Task responses seem {reason}."
-            # print(f"Signal received, EMPTY DETECTED")
-            log = Log(
-                name=name,
-                description="Overwritten responses are inside JSON field",
-                json=data,
-                task=instance,
-                campaign=instance.get_campaign(),
-                stage=instance.stage,
-                chain=instance.stage.chain,
-                user=instance.assignee,
-            )
-            log.save()
+    if instance.id is None or instance.responses:
+        return
+    previous_responses = audit.load_snapshot(
+        getattr(instance._state, "loaded_responses", None))
+    if not previous_responses:
+        return
+
+    reason = "wrong"
+    if instance.responses is None:
+        reason = "null"
+    elif not instance.responses:
+        reason = "empty"
+    data = {"previous": {"responses": previous_responses},
+            "current": TaskDebugSerializer(instance).data}
+    stage = instance.stage
+    audit.add_log(Log(
+        name=f"Task responses seem {reason}.",
+        description="Overwritten responses are inside JSON field",
+        json=audit.to_json(data),
+        task_id=instance.id,
+        campaign_id=stage.chain.campaign_id,
+        stage_id=stage.id,
+        chain_id=stage.chain_id,
+        user_id=instance.assignee_id,
+    ))
+
+
+@receiver(post_init, sender=TaskStage)
+@receiver(post_save, sender=TaskStage)
+def track_task_stage_fields(sender, instance, **kwargs):
+    audit.track_fields(instance, TASK_STAGE_FIELDS)
 
 
 @receiver(pre_save, sender=TaskStage)
 def log_task_stage_changing(sender, instance, **kwargs):
     if instance.id is None:
-        pass
+        return
+    changed = audit.get_changed_fields(instance)
+    if not changed:
+        return
+
+    data = {"previous": {key: value[0] for key, value in changed.items()},
+            "current": {key: value[1] for key, value in changed.items()}}
+    differences = [f"{key}: {previous} -> {current}"
+                   for key, (previous, current) in changed.items()]
+    audit.add_log(Log(
+        name="Task Stage was changed",
+        description="\n".join(differences),
+        json=audit.to_json(data),
+        campaign_id=instance.chain.campaign_id,
+        stage_id=instance.id,
+    ))
+
+
+@receiver(post_save, sender=Stage)
+@receiver(post_save, sender=TaskStage)
+@receiver(post_save, sender=ConditionalStage)
+@receiver(post_delete, sender=Stage)
+@receiver(post_delete, sender=TaskStage)
+@receiver(post_delete, sender=ConditionalStage)
+def invalidate_stage_chain_graph(sender, instance, **kwargs):
+    invalidate_chain_graphs([instance.chain_id])
+
+
+@receiver(m2m_changed, sender=Stage.in_stages.through)
+def invalidate_in_stages_chain_graph(sender, instance, action, pk_set,
+                                     **kwargs):
+    if action not in ["post_add", "post_remove", "post_clear"]:
+        return
+    invalidate_chain_graphs([instance.chain_id])
+    if pk_set:
+        invalidate_stage_graphs(pk_set)
+
+
+@receiver(post_save, sender=Chain)
+@receiver(post_delete, sender=Chain)
+def invalidate_chain_graph(sender, instance, **kwargs):
+    invalidate_chain_graphs([instance.id])
+
+
+@receiver(post_save, sender=Campaign)
+def invalidate_campaign_chain_graphs(sender, instance, **kwargs):
+    invalidate_chain_graphs(instance.chains.values_list("id", flat=True))
+
+
+def invalidate_dependency_chain_graph(sender, instance, **kwargs):
+    stage_id = getattr(instance, CHAIN_GRAPH_DEPENDENCIES[sender])
+    if stage_id is not None:
+        invalidate_stage_graphs([stage_id])
+
+
+for dependency in CHAIN_GRAPH_DEPENDENCIES:
+    post_save.connect(invalidate_dependency_chain_graph, sender=dependency)
+    post_delete.connect(invalidate_dependency_chain_graph, sender=dependency)
+
+
+@receiver(post_save, sender=CountTasksModifier)
+def track_counted_stage(sender, instance, created, **kwargs):
+    stage_id = instance.stage_to_count_tasks_from_id
+    if not TaskStageCounter.objects.filter(stage_id=stage_id).exists():
+        TaskStageCounter.reconcile(stage_id)
+
+
+@receiver(post_save, sender=RankLimit)
+@receiver(post_delete, sender=RankLimit)
+@receiver(post_save, sender=DatetimeSort)
+@receiver(post_delete, sender=DatetimeSort)
+@receiver(post_save, sender=TaskStage)
+@receiver(post_delete, sender=TaskStage)
+def invalidate_all_selectable_stages(sender, instance, **kwargs):
+    invalidate_selectable_stages()
+
+
+@receiver(m2m_changed, sender=Rank.stages.through)
+def invalidate_rank_stages_selectable_stages(sender, action, **kwargs):
+    if action in ["post_add", "post_remove", "post_clear"]:
+        invalidate_selectable_stages()
+
+
+@receiver(post_save, sender=RankRecord)
+@receiver(post_delete, sender=RankRecord)
+def invalidate_user_selectable_stages(sender, instance, **kwargs):
+    invalidate_selectable_stages([instance.user_id])
+
+
+@receiver(m2m_changed, sender=CustomUser.ranks.through)
+def invalidate_ranks_selectable_stages(sender, instance, action, pk_set,
+                                       **kwargs):
+    if action not in ["post_add", "post_remove", "post_clear"]:
+        return
+    if isinstance(instance, CustomUser):
+        invalidate_selectable_stages([instance.id])
     else:
-        previous = TaskStage.objects.get(id=instance.id)
-        data = {"previous": TaskStageDebugSerializer(previous).data,
-                "current": TaskStageDebugSerializer(instance).data, }
-        differences = []
-        for key, value in data['current'].items():
-            current_value = data.get('previous').get(key)
-            if value != current_value:
-                difference = f"{key}: {current_value} -> {value}"
-                differences.append(difference)
-        if differences:
-            name = "Task Stage was changed"
-            description = "\n".join(differences)
-            log = Log(
-                name=name,
-                description=description,
-                json=data,
-                campaign=previous.get_campaign(),
-                stage=previous,
-            )
-            log.save()
\ No newline at end of file
+        # Cleared users of a rank are unknown here, so all are dropped.
+        invalidate_selectable_stages(pk_set)
+
+
+@receiver(post_save, sender=CampaignManagement)
+@receiver(post_delete, sender=CampaignManagement)
+@receiver(post_save, sender=RankRecord)
+@receiver(post_delete, sender=RankRecord)
+def invalidate_user_access_scope(sender, instance, **kwargs):
+    invalidate_access_scopes([instance.user_id])
+
+
+@receiver(post_save, sender=RankLimit)
+@receiver(post_delete, sender=RankLimit)
+@receiver(post_save, sender=Rank)
+@receiver(post_save, sender=Track)
+@receiver(post_save, sender=TaskStage)
+@receiver(post_delete, sender=TaskStage)
+@receiver(post_save, sender=Chain)
+def invalidate_all_access_scopes(sender, instance, **kwargs):
+    invalidate_access_scopes()
+
+
+@receiver(m2m_changed, sender=CustomUser.ranks.through)
+@receiver(m2m_changed, sender=Campaign.managers.through)
+def invalidate_m2m_access_scopes(sender, instance, action, pk_set,
+                                 **kwargs):
+    if action not in ["post_add", "post_remove", "post_clear"]:
+        return
+    if isinstance(instance, CustomUser):
+        invalidate_access_scopes([instance.id])
+    elif action == "post_clear":
+        # Cleared users are unknown here, so all scopes are dropped.
+        invalidate_access_scopes()
+    else:
+        invalidate_access_scopes(pk_set)
+
+
+@receiver(post_save, sender=TaskStage)
+def track_filter_fields(sender, instance, **kwargs):
+    if isinstance(instance.filter_fields_schema, list):
+        TaskFilterField.sync(instance.filter_fields_schema)
+
+
+@receiver(post_save, sender=Stage)
+@receiver(post_save, sender=TaskStage)
+@receiver(post_save, sender=ConditionalStage)
+@receiver(post_delete, sender=Stage)
+@receiver(post_delete, sender=TaskStage)
+@receiver(post_delete, sender=ConditionalStage)
+def invalidate_stage_chain_progress(sender, instance, **kwargs):
+    invalidate_chain_progress([instance.chain_id])
+
+
+@receiver(m2m_changed, sender=Stage.in_stages.through)
+def invalidate_in_stages_chain_progress(sender, instance, action, pk_set,
+                                        **kwargs):
+    if action not in ["post_add", "post_remove", "post_clear"]:
+        return
+    chain_ids = {instance.chain_id}
+    if pk_set:
+        chain_ids.update(Stage.objects.filter(id__in=pk_set)
+                         .values_list("chain_id", flat=True))
+    invalidate_chain_progress(chain_ids)
+
+
+@receiver(post_save, sender=Chain)
+def invalidate_chain_progress_of_chain(sender, instance, **kwargs):
+    invalidate_chain_progress([instance.id])
@@ -0,0 +1,117 @@
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+
+from api.models import *
+from api.tests import GigaTurnipTestHelper
+from api.utils.access_scope import get_access_scope, \
+    get_user_access_context, USER_VERSION_KEY
+from api.utils.cache_versions import bump_versions
+from api.utils.selectable_pool import invalidate_selectable_stages
+
+
+class AccessScopeTest(GigaTurnipTestHelper):
+
+    def get_task_ids(self, client=None):
+        response = self.get_objects("task-list", client=client)
+        return [i["id"] for i in response.data["results"]]
+
+    def test_scope(self):
+        scope = get_access_scope(self.user)
+        self.assertEqual(scope.managed_campaign_ids, set())
+        self.assertIn(self.initial_stage.id, scope.rank_stage_ids)
+        self.assertIn(self.chain.id, scope.rank_chain_ids)
+        self.assertIn(self.campaign.id, scope.rank_campaign_ids)
+
+        CampaignManagement.objects.create(user=self.user,
+                                          campaign=self.campaign)
+        scope = get_access_scope(self.user)
+        self.assertEqual(scope.managed_campaign_ids, {self.campaign.id})
+        self.assertIn(self.initial_stage.id, scope.managed_stage_ids)
+
+    def test_task_list_scoped(self):
+        own = self.create_initial_task()
+        other = Task.objects.create(stage=self.initial_stage,
+                                    assignee=self.employee)
+        self.assertEqual(self.get_task_ids(), [own.id])
+
+        manager_client = self.create_client(self.employee)
+        self.assertEqual(self.get_task_ids(manager_client), [other.id])
+        self.campaign.managers.add(self.employee)
+        self.assertCountEqual(self.get_task_ids(manager_client),
+                              [own.id, other.id])
+
+        with CaptureQueriesContext(connection) as queries:
+            self.get_task_ids(manager_client)
+        for query in queries.captured_queries:
+            if 'FROM "api_task"' in query["sql"]:
+                self.assertNotIn("api_campaignmanagement", query["sql"])
+                self.assertNotIn("api_rankrecord", query["sql"])
+
+        self.campaign.managers.remove(self.employee)
+        self.assertEqual(self.get_task_ids(manager_client), [other.id])
+
+    def test_invalidated_on_rank_changes(self):
+        new_stage = self.initial_stage.add_stage(TaskStage())
+        task = Task.objects.create(stage=new_stage)
+        self.assertEqual(self.get_task_ids(), [])
+
+        rank = Rank.objects.create(name="New", track=self.default_track)
+        RankLimit.objects.create(rank=rank, stage=new_stage)
+        self.user.ranks.add(rank)
+        self.assertEqual(self.get_task_ids(), [task.id])
+
+        RankRecord.objects.filter(user=self.user, rank=rank).delete()
+        self.assertEqual(self.get_task_ids(), [])
+
+    def test_version_bumped_by_other_process(self):
+        get_access_scope(self.user)
+        CampaignManagement.objects.bulk_create(
+            [CampaignManagement(user=self.user, campaign=self.campaign)])
+        with self.assertNumQueries(1):
+            self.assertEqual(get_access_scope(self.user).managed_campaign_ids,
+                             set())
+
+        bump_versions([USER_VERSION_KEY.format(self.user.id)])
+        self.assertEqual(get_access_scope(self.user).managed_campaign_ids,
+                         {self.campaign.id})
+
+    def test_user_access_context(self):
+        request = RequestFactory().get("/")
+        request.user = self.user
+        context = get_user_access_context(request)
+        self.assertIs(get_user_access_context(request), context)
+
+        rank_limit = RankLimit.objects.get(stage=self.initial_stage)
+        context.scope
+        with self.assertNumQueries(1):
+            for _ in range(3):
+                self.assertEqual(
+                    context.get_rank_limits(self.initial_stage.id),
+                    [rank_limit])
+        self.assertEqual(
+            context.highest_rank_ids,
+            set(self.user.get_highest_ranks_by_track()
+                .values_list("max_rank_id", flat=True))
+        )
+
+    def test_request_assignment_checks(self):
+        second_stage = self.initial_stage.add_stage(TaskStage())
+        employee_client = self.prepare_client(second_stage, self.employee)
+        closed, opened = [self.complete_task(i).out_tasks.get()
+                          for i in self.create_initial_tasks(2)]
+
+        RankLimit.objects.filter(stage=second_stage) \
+            .update(is_selection_open=False)
+        invalidate_selectable_stages()
+        response = self.get_objects("task-request-assignment", pk=closed.id,
+                                    client=employee_client)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        RankLimit.objects.filter(stage=second_stage) \
+            .update(is_selection_open=True)
+        invalidate_selectable_stages()
+        self.request_assignment(opened, employee_client)
+        self.assertEqual(Task.objects.get(id=opened.id).assignee,
+                         self.employee)
@@ -0,0 +1,129 @@
+from unittest import mock
+
+from rest_framework import status
+
+from api.asyncstuff import run_propagation_job
+from api.constans import PropagationJobConstants, TaskStageConstants
+from api.models import *
+from api.tests import GigaTurnipTestHelper
+
+
+def run_sync(func, *args, **kwargs):
+    return func(*args)
+
+
+class AsyncPropagationTest(GigaTurnipTestHelper):
+
+    def setUp(self):
+        super().setUp()
+        self.chain.async_propagation = True
+        self.chain.save()
+        self.second_stage = self.initial_stage.add_stage(
+            TaskStage(
+                name="Second",
+                assign_user_by=TaskStageConstants.STAGE,
+                assign_user_from_stage=self.initial_stage
+            )
+        )
+
+    def test_submit_enqueues_propagation(self):
+        task = self.create_initial_task()
+
+        with mock.patch("api.asyncstuff.async_task") as async_task:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.complete_task(task, {"a": 1},
+                                              whole_response=True)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        job = PropagationJob.objects.get(task=task)
+        self.assertEqual(response.data["propagation_job_id"], job.id)
+        self.assertEqual(job.status, PropagationJobConstants.PENDING)
+        async_task.assert_called_once()
+        self.assertFalse(Task.objects.filter(stage=self.second_stage).exists())
+
+        response = self.get_objects("task-propagation-status", pk=task.id)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(response.data["is_ready"])
+
+    def test_propagation_status_ready(self):
+        task = self.create_initial_task()
+
+        with mock.patch("api.asyncstuff.async_task", side_effect=run_sync):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.complete_task(task, {"a": 1})
+
+        next_task = Task.objects.get(stage=self.second_stage)
+        self.assertEqual(next_task.assignee, self.user)
+
+        response = self.get_objects("task-propagation-status", pk=task.id)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.data["is_ready"])
+        self.assertEqual(response.data["status"], PropagationJobConstants.DONE)
+        self.assertEqual(response.data["next_direct_task"], next_task.id)
+
+    def test_propagation_job_is_idempotent(self):
+        task = self.create_initial_task()
+
+        with mock.patch("api.asyncstuff.async_task"):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.complete_task(task, {"a": 1})
+
+        job = PropagationJob.objects.get(task=task)
+        run_propagation_job(job.id)
+        run_propagation_job(job.id)
+
+        self.assertEqual(Task.objects.filter(stage=self.second_stage).count(), 1)
+
+    def test_propagation_status_without_job(self):
+        task = self.create_initial_task()
+
+        response = self.get_objects("task-propagation-status", pk=task.id)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_sync_chain_propagates_inline(self):
+        self.chain.async_propagation = False
+        self.chain.save()
+        task = self.create_initial_task()
+
+        response = self.complete_task(task, {"a": 1}, whole_response=True)
+
+        self.assertNotIn("propagation_job_id", response.data)
+        self.assertEqual(response.data["next_direct_id"],
+                         Task.objects.get(stage=self.second_stage).id)
+
+    def test_failed_propagation_rolled_back(self):
+        task = self.create_initial_task()
+        with mock.patch("api.asyncstuff.async_task"):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.complete_task(task, {"a": 1})
+        job = PropagationJob.objects.get(task=task)
+
+        def fail(completed_task):
+            Task.objects.create(stage=self.second_stage, case=task.case)
+            raise ValueError("Propagation failed")
+
+        with mock.patch("api.asyncstuff.process_completed_task", fail):
+            job = run_propagation_job(job.id)
+
+        self.assertEqual(job.status, PropagationJobConstants.FAILED)
+        self.assertEqual(job.error, "Propagation failed")
+        self.assertFalse(Task.objects.filter(stage=self.second_stage).exists())
+
+    def test_crashed_propagation_retried(self):
+        task = self.create_initial_task()
+        with mock.patch("api.asyncstuff.async_task"):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.complete_task(task, {"a": 1})
+        job = PropagationJob.objects.get(task=task)
+
+        with mock.patch("api.asyncstuff.process_completed_task",
+                        side_effect=SystemExit):
+            with self.assertRaises(SystemExit):
+                run_propagation_job(job.id)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, PropagationJobConstants.PENDING)
+
+        job = run_propagation_job(job.id)
+        self.assertEqual(job.status, PropagationJobConstants.DONE)
+        self.assertEqual(Task.objects.filter(stage=self.second_stage).count(), 1)
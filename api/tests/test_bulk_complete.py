@@ -0,0 +1,156 @@
+from unittest import mock
+
+from rest_framework import status
+from rest_framework.reverse import reverse
+
+import api.views
+from api.constans import BulkCompleteConstants, TaskStageConstants, \
+    ErrorConstants
+from api.models import *
+from api.tests import GigaTurnipTestHelper
+
+
+class BulkCompleteTest(GigaTurnipTestHelper):
+
+    def setUp(self):
+        super().setUp()
+        self.second_stage = self.initial_stage.add_stage(
+            TaskStage(
+                name="Second",
+                assign_user_by=TaskStageConstants.STAGE,
+                assign_user_from_stage=self.initial_stage
+            )
+        )
+        self.url = reverse("task-bulk-complete")
+
+    def bulk_complete(self, items, client=None):
+        client = client if client else self.client
+        return client.post(self.url, items, format="json")
+
+    def test_bulk_complete(self):
+        first, second, third = self.create_initial_tasks(3)
+        foreign = Task.objects.create(stage=self.initial_stage,
+                                      assignee=self.employee)
+
+        response = self.bulk_complete([
+            {"id": first.id, "responses": {"a": 1}, "complete": True},
+            {"id": second.id, "responses": {"a": 2}, "complete": True},
+            {"id": third.id, "responses": {"a": 3}},
+            {"id": foreign.id, "complete": True},
+            {"id": first.id, "complete": True},
+            {"id": 10 ** 9, "complete": True},
+        ])
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(i["id"], i["status"]) for i in response.data],
+            [(first.id, BulkCompleteConstants.COMPLETED),
+             (second.id, BulkCompleteConstants.COMPLETED),
+             (third.id, BulkCompleteConstants.SAVED),
+             (foreign.id, BulkCompleteConstants.FORBIDDEN),
+             (first.id, BulkCompleteConstants.DUPLICATE),
+             (10 ** 9, BulkCompleteConstants.NOT_FOUND)]
+        )
+        for task, responses in [(first, {"a": 1}), (second, {"a": 2})]:
+            task.refresh_from_db()
+            self.assertTrue(task.complete)
+            self.assertEqual(task.responses, responses)
+            next_task = Task.objects.get(stage=self.second_stage,
+                                         in_tasks=task)
+            self.assertEqual(next_task.assignee, self.user)
+        third.refresh_from_db()
+        self.assertFalse(third.complete)
+        self.assertEqual(third.responses, {"a": 3})
+        foreign.refresh_from_db()
+        self.assertFalse(foreign.complete)
+
+        response = self.bulk_complete([{"id": first.id, "complete": True}])
+        self.assertEqual(response.data[0]["status"],
+                         BulkCompleteConstants.FORBIDDEN)
+        self.assertEqual(response.data[0]["message"],
+                         ErrorConstants.TASK_ALREADY_COMPLETED)
+
+    def test_submission_closed(self):
+        task = self.create_initial_task()
+        RankLimit.objects.filter(stage=self.initial_stage) \
+            .update(is_submission_open=False)
+
+        response = self.bulk_complete([{"id": task.id, "complete": True}])
+
+        self.assertEqual(response.data[0]["status"],
+                         BulkCompleteConstants.FORBIDDEN)
+        task.refresh_from_db()
+        self.assertFalse(task.complete)
+
+    def test_async_chain_enqueued_once(self):
+        self.chain.async_propagation = True
+        self.chain.save()
+        tasks = self.create_initial_tasks(3)
+
+        with mock.patch("api.asyncstuff.async_task") as async_task:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.bulk_complete([
+                    {"id": task.id, "responses": {"a": 1}, "complete": True}
+                    for task in tasks
+                ])
+
+        async_task.assert_called_once()
+        jobs = PropagationJob.objects.filter(task__in=tasks)
+        self.assertEqual(jobs.count(), 3)
+        self.assertEqual(
+            {i["propagation_job_id"] for i in response.data},
+            set(jobs.values_list("id", flat=True))
+        )
+
+    def test_failed_item_rolled_back(self):
+        first, second = self.create_initial_tasks(2)
+        process_completed_task = api.views.process_completed_task
+
+        def fail_first(task):
+            if task.id == first.id:
+                raise ValueError("Propagation failed")
+            return process_completed_task(task)
+
+        with mock.patch("api.views.process_completed_task", fail_first):
+            response = self.bulk_complete([
+                {"id": first.id, "responses": {"a": 1}, "complete": True},
+                {"id": second.id, "responses": {"a": 2}, "complete": True},
+            ])
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [i["status"] for i in response.data],
+            [BulkCompleteConstants.ERROR, BulkCompleteConstants.COMPLETED]
+        )
+        self.assertEqual(response.data[0]["message"],
+                         ErrorConstants.BULK_COMPLETE_FAILED)
+        first.refresh_from_db()
+        self.assertFalse(first.complete)
+        self.assertEqual(first.responses, {})
+        self.assertEqual(
+            ErrorItem.objects.filter(campaign=self.campaign).count(), 1)
+        second.refresh_from_db()
+        self.assertTrue(second.complete)
+        self.assertTrue(Task.objects.filter(stage=self.second_stage,
+                                            in_tasks=second).exists())
+
+    def test_empty_responses_saved(self):
+        task = self.create_initial_task()
+        task.responses = {"a": 1}
+        task.save()
+
+        response = self.bulk_complete([{"id": task.id, "responses": {}}])
+
+        self.assertEqual(response.data[0]["status"],
+                         BulkCompleteConstants.SAVED)
+        task.refresh_from_db()
+        self.assertEqual(task.responses, {})
+
+        task = self.update_task_responses(task, {"a": 2})
+        task = self.update_task_responses(task, {})
+        self.assertEqual(task.responses, {"a": 2})
+
+    def test_too_many_items(self):
+        response = self.bulk_complete(
+            [{"id": i} for i in range(BulkCompleteConstants.MAX_ITEMS + 1)])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,103 @@
+from api.constans import TaskStageConstants
+from api.models import *
+from api.tests import GigaTurnipTestHelper
+from api.utils.cache_versions import bump_versions
+from api.utils.chain_graph import get_chain_graph, get_stage_node, \
+    VERSION_KEY
+
+
+class ChainGraphTest(GigaTurnipTestHelper):
+
+    def setUp(self):
+        super().setUp()
+        self.second_stage = self.initial_stage.add_stage(
+            TaskStage(
+                name="Second",
+                assign_user_by=TaskStageConstants.STAGE,
+                assign_user_from_stage=self.initial_stage
+            )
+        )
+        self.conditional_stage = self.initial_stage.add_stage(
+            ConditionalStage(
+                name="Conditional",
+                conditions=[{"field": "foo", "type": "string",
+                             "value": "boo", "condition": "=="}]
+            )
+        )
+        self.pingpong_stage = self.second_stage.add_stage(
+            ConditionalStage(
+                name="Ping-pong",
+                conditions=[{"field": "foo", "type": "string",
+                             "value": "boo", "condition": "=="}],
+                pingpong=True
+            )
+        )
+        self.pingpong_stage.out_stages.add(self.initial_stage)
+
+    def test_graph_structure(self):
+        CopyField.objects.create(
+            task_stage=self.second_stage,
+            copy_from_stage=self.initial_stage,
+            fields_to_copy="foo->foo"
+        )
+
+        node = get_stage_node(self.initial_stage)
+        self.assertEqual([i.id for i in node.out_task_stages],
+                         [self.second_stage.id])
+        self.assertEqual([i.id for i in node.out_conditional_stages],
+                         [self.conditional_stage.id])
+        self.assertEqual([i.id for i in node.in_pingpong_stages],
+                         [self.pingpong_stage.id])
+
+        node = get_stage_node(self.second_stage)
+        self.assertEqual(node.in_stage_ids, (self.initial_stage.id,))
+        self.assertEqual(len(node.copy_fields), 1)
+
+    def test_cached_node_checks_version_only(self):
+        get_chain_graph(self.chain.id)
+
+        with self.assertNumQueries(1):
+            node = get_stage_node(self.initial_stage)
+            self.assertTrue(node.stage.chain.campaign)
+
+    def test_node_is_shared_and_read_only(self):
+        node = get_stage_node(self.initial_stage)
+        self.assertIs(get_stage_node(self.initial_stage), node)
+        with self.assertRaises(AttributeError):
+            node.out_task_stages.append(self.initial_stage)
+
+    def test_rebuilt_on_version_bumped_by_other_process(self):
+        graph = get_chain_graph(self.chain.id)
+        self.assertIs(get_chain_graph(self.chain.id), graph)
+
+        bump_versions([VERSION_KEY.format(self.chain.id)])
+        self.assertIsNot(get_chain_graph(self.chain.id), graph)
+
+    def test_invalidated_on_stage_changes(self):
+        get_chain_graph(self.chain.id)
+
+        third_stage = self.second_stage.add_stage(TaskStage(name="Third"))
+        node = get_stage_node(self.second_stage)
+        self.assertEqual([i.id for i in node.out_task_stages],
+                         [third_stage.id])
+
+        third_stage.in_stages.remove(self.second_stage)
+        self.assertEqual(get_stage_node(self.second_stage).out_task_stages,
+                         ())
+
+        DatetimeSort.objects.create(stage=third_stage, how_much=2,
+                                    after_how_much=1)
+        self.assertIsNotNone(get_stage_node(third_stage).datetime_sort)
+
+    def test_propagation_uses_fresh_graph(self):
+        get_chain_graph(self.chain.id)
+        third_stage = self.initial_stage.add_stage(
+            TaskStage(name="Third",
+                      assign_user_by=TaskStageConstants.AUTO_COMPLETE)
+        )
+        task = self.create_initial_task()
+
+        self.complete_task(task, {"foo": "no"})
+
+        self.assertTrue(Task.objects.filter(stage=self.second_stage).exists())
+        self.assertTrue(Task.objects.get(stage=third_stage).complete)
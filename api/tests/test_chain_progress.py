@@ -0,0 +1,111 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+
+from api.models import *
+from api.tests import GigaTurnipTestHelper
+from api.utils.chain_layout import get_chain_layout, order_by_graph_flow
+
+
+class ChainProgressTest(GigaTurnipTestHelper):
+
+    def setUp(self):
+        super().setUp()
+        self.chain.is_individual = True
+        self.chain.save()
+        self.second_stage = self.initial_stage.add_stage(TaskStage(
+            name="Second stage"
+        ))
+
+    def get_individuals(self, etag=None, params=None):
+        headers = {"HTTP_IF_NONE_MATCH": etag} if etag else {}
+        return self.client.get(reverse("chain-individuals"), params,
+                               **headers)
+
+    def get_stages(self, response):
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        chain = response.data["results"][0]
+        return {i["id"]: i for i in chain["stages_data"]}
+
+    def test_snapshot_updated(self):
+        stages = self.get_stages(self.get_individuals())
+        self.assertEqual(stages[self.initial_stage.id]["opened"], [])
+        progress = ChainProgress.objects.get(user=self.user, chain=self.chain)
+        self.assertFalse(progress.stale)
+        version = progress.version
+
+        task = self.create_initial_task()
+        progress.refresh_from_db()
+        self.assertTrue(progress.stale)
+        stages = self.get_stages(self.get_individuals())
+        self.assertEqual(stages[self.initial_stage.id]["opened"], [task.id])
+
+        task = self.complete_task(task)
+        stages = self.get_stages(self.get_individuals())
+        self.assertEqual(stages[self.initial_stage.id]["opened"], [])
+        self.assertEqual(stages[self.initial_stage.id]["completed"], [task.id])
+        progress.refresh_from_db()
+        self.assertGreater(progress.version, version)
+
+        self.second_stage.name = "Renamed stage"
+        self.second_stage.save()
+        stages = self.get_stages(self.get_individuals())
+        self.assertEqual(stages[self.second_stage.id]["name"],
+                         "Renamed stage")
+
+    def test_etag(self):
+        response = self.get_individuals()
+        etag = response["ETag"]
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.get_individuals(etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        for query in queries.captured_queries:
+            self.assertNotIn('FROM "api_task"', query["sql"])
+            self.assertNotIn('FROM "api_taskstage"', query["sql"])
+
+        self.create_initial_task()
+        response = self.get_individuals(etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_completed_filter(self):
+        self.initial_stage.complete_individual_chain = True
+        self.initial_stage.save()
+
+        def get_chain_ids(completed):
+            response = self.get_individuals(params={"completed": completed})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            return [i["id"] for i in response.data["results"]]
+
+        self.assertEqual(get_chain_ids("false"), [self.chain.id])
+        self.assertEqual(get_chain_ids("true"), [])
+
+        self.complete_task(self.create_initial_task())
+        self.assertEqual(get_chain_ids("true"), [self.chain.id])
+        self.assertEqual(get_chain_ids("false"), [])
+
+    def test_layout_cached(self):
+        layout = get_chain_layout(self.chain.id)
+        with self.assertNumQueries(1):
+            self.assertIs(get_chain_layout(self.chain.id), layout)
+        stages = layout.get_stages(self.chain.order_in_individuals)
+        self.assertEqual([i["id"] for i in stages],
+                         [self.initial_stage.id, self.second_stage.id])
+        self.assertEqual(stages[1]["in_stages"], [self.initial_stage.id])
+
+        self.second_stage.name = "Renamed stage"
+        self.second_stage.save()
+        layout = get_chain_layout(self.chain.id)
+        self.assertEqual(layout.stages[1]["name"], "Renamed stage")
+
+    def test_graph_flow_long_chain(self):
+        count = 5000
+        stages = [{"id": i, "out_stages": [i + 1] if i < count else [],
+                   "in_stages": [i - 1] if i > 1 else [0]}
+                  for i in range(1, count + 1)]
+        conditionals = [{"id": 0, "out_stages": [1], "in_stages": [None]}]
+        ordered = order_by_graph_flow(stages, conditionals)
+        self.assertEqual([i["id"] for i in ordered],
+                         list(range(1, count + 1)))
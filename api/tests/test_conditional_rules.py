@@ -0,0 +1,88 @@
+from api.api_exceptions import CustomApiException
+from api.asyncstuff import evaluate_conditional_stage, \
+    evaluate_conditional_stage_batch
+from api.models import *
+from api.tests import GigaTurnipTestHelper
+from api.utils.conditional_rules import get_compiled_conditions
+
+
+class ConditionalRulesTest(GigaTurnipTestHelper):
+
+    def setUp(self):
+        super().setUp()
+        self.conditional_stage = self.initial_stage.add_stage(
+            ConditionalStage(
+                name="Conditional",
+                conditions=[
+                    {"field": "foo", "type": "string", "value": "boo",
+                     "condition": "=="},
+                    {"field": "age.value", "type": "integer", "value": "18",
+                     "condition": "<="},
+                ]
+            )
+        )
+
+    def test_compiled_once(self):
+        compiled = get_compiled_conditions(self.conditional_stage)
+
+        self.assertIs(get_compiled_conditions(self.conditional_stage),
+                      compiled)
+        self.assertEqual(compiled.rules[1].path, ("age", "value"))
+        self.assertEqual(compiled.rules[1].control_value, 18)
+
+    def test_recompiled_on_conditions_change(self):
+        compiled = get_compiled_conditions(self.conditional_stage)
+
+        self.conditional_stage.conditions[0]["value"] = "too"
+        recompiled = get_compiled_conditions(self.conditional_stage)
+
+        self.assertIsNot(recompiled, compiled)
+        self.assertEqual(recompiled.rules[0].control_value, "too")
+
+    def test_evaluate(self):
+        task = self.create_initial_task()
+        task.responses = {"foo": "boo", "age": {"value": 20}}
+        self.assertTrue(evaluate_conditional_stage(self.conditional_stage,
+                                                   task))
+
+        task.responses = {"foo": "boo", "age": {"value": 10}}
+        self.assertFalse(evaluate_conditional_stage(self.conditional_stage,
+                                                    task))
+
+    def test_invalid_rules_fail_on_compile(self):
+        self.conditional_stage.conditions = [
+            {"field": "foo", "type": "date", "value": "boo",
+             "condition": "=="}
+        ]
+
+        with self.assertRaises(CustomApiException):
+            get_compiled_conditions(self.conditional_stage)
+        self.assertEqual(ErrorItem.objects.count(), 1)
+
+        self.conditional_stage.conditions = [
+            {"field": "foo", "type": "integer", "value": "boo",
+             "condition": "=="}
+        ]
+        with self.assertRaises(CustomApiException):
+            get_compiled_conditions(self.conditional_stage)
+        self.assertEqual(ErrorItem.objects.count(), 2)
+
+    def test_batch_evaluation(self):
+        responses = [
+            {"foo": "boo", "age": {"value": 30}},
+            {"foo": "too", "age": {"value": 30}},
+            {"foo": "boo", "age": {"value": "unknown"}},
+            {"foo": "boo"},
+            None,
+        ]
+        tasks = [Task.objects.create(stage=self.initial_stage, responses=i)
+                 for i in responses]
+
+        with self.assertNumQueries(1):
+            results = evaluate_conditional_stage_batch(
+                self.conditional_stage,
+                Task.objects.filter(stage=self.initial_stage)
+            )
+
+        self.assertEqual([results[i.id] for i in tasks],
+                         [True, False, False, False, False])
@@ -0,0 +1,159 @@
+import tempfile
+from unittest import mock
+
+from django.db import IntegrityError
+from django.test import override_settings
+from django.utils import timezone
+from django.urls import reverse
+from rest_framework import status
+
+from api.constans import ExportJobConstants, ErrorConstants
+from api.models import *
+from api.tests import GigaTurnipTestHelper
+
+
+def run_sync(func, *args, **kwargs):
+    return func(*args)
+
+
+class ExportJobTest(GigaTurnipTestHelper):
+
+    def setUp(self):
+        super().setUp()
+        self.storage_dir = tempfile.TemporaryDirectory()
+        storage = override_settings(EXPORT_STORAGE={
+            "BACKEND": "django.core.files.storage.FileSystemStorage",
+            "OPTIONS": {"location": self.storage_dir.name},
+        })
+        storage.enable()
+        self.addCleanup(storage.disable)
+        self.addCleanup(self.storage_dir.cleanup)
+
+        self.employee.managed_campaigns.add(self.campaign)
+        self.manager_client = self.create_client(self.employee)
+        self.initial_stage.json_schema = '{"properties":{"column1":{},"column2":{}}}'
+        self.initial_stage.ui_schema = '{"ui:order": ["column1", "column2"]}'
+        self.initial_stage.save()
+        self.flattener = ResponseFlattener.objects.create(
+            task_stage=self.initial_stage)
+        for task in self.create_initial_tasks(3):
+            self.complete_task(task, {"column1": "a", "column2": "b"})
+
+    def start_export(self, params=None):
+        return self.manager_client.get(
+            reverse("responseflattener-csv", kwargs={"pk": self.flattener.id}),
+            data={"background": "true", **(params or {})}
+        )
+
+    def download(self, job_id, **headers):
+        return self.manager_client.get(
+            reverse("exportjob-download", kwargs={"pk": job_id}), **headers)
+
+    def test_identical_exports_shared(self):
+        with mock.patch("api.asyncstuff.async_task") as async_task:
+            with self.captureOnCommitCallbacks(execute=True):
+                first = self.start_export()
+            with self.captureOnCommitCallbacks(execute=True):
+                second = self.start_export()
+        self.assertEqual(first.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(first.data["id"], second.data["id"])
+        async_task.assert_called_once()
+
+        response = self.download(first.data["id"])
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+
+    @override_settings(EXPORT_JOB_LEASE=60)
+    def test_expired_job_replaced(self):
+        with mock.patch("api.asyncstuff.async_task") as async_task:
+            with self.captureOnCommitCallbacks(execute=True):
+                first = self.start_export()
+            ExportJob.objects.filter(id=first.data["id"]).update(
+                status=ExportJobConstants.RUNNING,
+                updated_at=timezone.now() - timezone.timedelta(seconds=61))
+            with self.captureOnCommitCallbacks(execute=True):
+                second = self.start_export()
+
+        self.assertNotEqual(first.data["id"], second.data["id"])
+        self.assertEqual(async_task.call_count, 2)
+        expired = ExportJob.objects.get(id=first.data["id"])
+        self.assertEqual(expired.status, ExportJobConstants.FAILED)
+        self.assertEqual(expired.error, ErrorConstants.EXPORT_JOB_EXPIRED)
+
+    def test_conflicting_job_finished(self):
+        create = ExportJob.objects.create
+        calls = []
+
+        def conflict_once(**kwargs):
+            calls.append(kwargs)
+            if len(calls) == 1:
+                raise IntegrityError
+            return create(**kwargs)
+
+        with mock.patch("api.asyncstuff.async_task"), \
+                mock.patch.object(ExportJob.objects, "create",
+                                  side_effect=conflict_once):
+            response = self.start_export()
+
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(ExportJob.objects.get().id, response.data["id"])
+
+    def test_export_download(self):
+        expected = self.manager_client.get(
+            reverse("responseflattener-csv", kwargs={"pk": self.flattener.id})
+        ).content
+
+        with mock.patch("api.asyncstuff.async_task", side_effect=run_sync):
+            with self.captureOnCommitCallbacks(execute=True):
+                job_id = self.start_export().data["id"]
+
+        response = self.get_objects("exportjob-detail", pk=job_id,
+                                    client=self.manager_client)
+        self.assertEqual(response.data["status"], ExportJobConstants.DONE)
+        self.assertEqual(response.data["rows_done"], 3)
+        self.assertEqual(response.data["size"], len(expected))
+
+        response = self.download(job_id)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(b"".join(response.streaming_content), expected)
+
+        response = self.download(job_id, HTTP_RANGE="bytes=5-14")
+        self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(response["Content-Range"],
+                         f"bytes 5-14/{len(expected)}")
+        self.assertEqual(b"".join(response.streaming_content), expected[5:15])
+
+        response = self.download(job_id, HTTP_RANGE="bytes=-4")
+        self.assertEqual(b"".join(response.streaming_content), expected[-4:])
+
+        response = self.download(job_id,
+                                 HTTP_RANGE=f"bytes={len(expected)}-")
+        self.assertEqual(response.status_code,
+                         status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+
+        response = self.get_objects("exportjob-detail", pk=job_id)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_user_activity_export(self):
+        with mock.patch("api.asyncstuff.async_task", side_effect=run_sync):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.manager_client.get(
+                    reverse("task-user-activity-csv"),
+                    data={"background": "true",
+                          "stage": self.initial_stage.id}
+                )
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        job = ExportJob.objects.get(id=response.data["id"])
+        self.assertEqual(job.params, {"stage": str(self.initial_stage.id)})
+        self.assertEqual(job.status, ExportJobConstants.DONE)
+
+        content = b"".join(self.download(job.id).streaming_content).decode()
+        header, row = content.split("\r\n")[:2]
+        self.assertEqual(header.split(","),
+                         ExportJobConstants.USER_ACTIVITY_COLUMNS)
+        self.assertTrue(row.startswith(f"{self.initial_stage.id},"))
+
+        response = self.manager_client.get(
+            reverse("task-user-activity-csv"),
+            data={"csv": "true", "stage": self.initial_stage.id})
+        self.assertEqual(content, response.content.decode())
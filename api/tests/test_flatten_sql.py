@@ -0,0 +1,86 @@
+from api.models import *
+from api.tests import GigaTurnipTestHelper
+from api.utils.flatten_sql import CopyPlan, get_csv_chunks
+from api.utils.utils import csv_chunks
+
+
+class FlattenSqlTest(GigaTurnipTestHelper):
+
+    def setUp(self):
+        super().setUp()
+        self.initial_stage.json_schema = \
+            '{"properties":{"text":{"type":"string"},' \
+            '"number":{"type":"number"},"flag":{"type":"boolean"}}}'
+        self.initial_stage.ui_schema = \
+            '{"ui:order": ["text", "number", "flag"]}'
+        self.initial_stage.save()
+        responses = [
+            {"text": "a, \"quoted\"\nline", "number": 2.5, "flag": True,
+             "oik": {"uik": 10, "name": ""}, "extra": None},
+            {"text": "", "number": 0, "flag": False, "oik": "not object",
+             "id": "own id", "float": 100000.0},
+            {"number": -3, "oik": {"uik": {"deeper": 1}}},
+            {"float": 999999999999999.9},
+        ]
+        for task, response in zip(self.create_initial_tasks(4), responses):
+            self.complete_task(task, response)
+
+    def python_csv(self, flattener, chunk_size=2):
+        columns, rows = flattener.csv_rows(chunk_size)
+        return "".join(text for count, text in
+                       csv_chunks(columns, rows, chunk_size))
+
+    def copy_csv(self, flattener, chunk_size=2):
+        columns, extra_columns = flattener.csv_columns()
+        plan = CopyPlan.compile(flattener, columns, extra_columns)
+        self.assertIsNotNone(plan)
+        self.assertFalse(plan.needs_python())
+        chunks = list(plan.chunks(chunk_size))
+        self.assertEqual(sum(count for count, text in chunks), 4)
+        return "".join(text for count, text in chunks)
+
+    def test_copy_matches_python(self):
+        flattener = ResponseFlattener.objects.create(
+            task_stage=self.initial_stage,
+            columns=["oik__uik", "oik__name", "oik__uik__deeper", "float"],
+            exclude_list=["extra"])
+        self.assertEqual(self.copy_csv(flattener), self.python_csv(flattener))
+
+        flattener.copy_first_level = False
+        flattener.copy_system_fields = True
+        flattener.save()
+        self.assertEqual(self.copy_csv(flattener), self.python_csv(flattener))
+
+    def test_python_fallback(self):
+        flattener = ResponseFlattener.objects.create(
+            task_stage=self.initial_stage, columns=["oik__(i)ui"])
+        columns, extra_columns = flattener.csv_columns()
+        self.assertIsNone(CopyPlan.compile(flattener, columns, extra_columns))
+
+        task = self.create_initial_task()
+        self.complete_task(task, {"oik": {"uik": [1, 2]}})
+        flattener.columns = ["oik__uik"]
+        flattener.save()
+        plan = CopyPlan.compile(flattener, *flattener.csv_columns())
+        self.assertTrue(plan.needs_python())
+        content = "".join(text for count, text in get_csv_chunks(flattener))
+        self.assertEqual(content, self.python_csv(flattener))
+
+    def test_exponent_float_fallback(self):
+        flattener = ResponseFlattener.objects.create(
+            task_stage=self.initial_stage, columns=["oik__uik", "float"])
+        plan = CopyPlan.compile(flattener, *flattener.csv_columns())
+        self.assertFalse(plan.needs_python())
+
+        for response, expected in [
+            ({"float": 1500000000000000.5}, "1500000000000000.5"),
+            ({"oik": {"uik": -1000000000000000.0}}, "-1000000000000000.0"),
+        ]:
+            task = self.create_initial_task()
+            self.complete_task(task, response)
+            self.assertTrue(plan.needs_python())
+            content = "".join(
+                text for count, text in get_csv_chunks(flattener))
+            self.assertEqual(content, self.python_csv(flattener))
+            self.assertIn(expected, content)
+            task.delete()
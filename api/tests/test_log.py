@@ -1,5 +1,8 @@
 import json
 
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from rest_framework import status
 from rest_framework.reverse import reverse
 
@@ -9,6 +12,7 @@ from api.models import *
 from api.tests import GigaTurnipTestHelper, to_json
 
 
+@override_settings(AUDIT_LOG_ASYNC=False)
 class LogTest(GigaTurnipTestHelper):
     def test_logs_for_task_stages(self):
         old_count = Log.objects.count()
@@ -16,7 +20,60 @@ class LogTest(GigaTurnipTestHelper):
 
         update_js = {"name": "Rename stage"}
         url = reverse("taskstage-detail", kwargs={"pk": self.initial_stage.id})
-        response = self.client.patch(url, update_js)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(url, update_js)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(old_count, 0)
         self.assertEqual(Log.objects.count(), 1)
+        log = Log.objects.get()
+        self.assertEqual(log.stage_id, self.initial_stage.id)
+        self.assertEqual(log.json["current"], {"name": "Rename stage"})
+
+    def test_logs_for_emptied_responses(self):
+        task = self.create_initial_task()
+        task.responses = {"answer": 1}
+        task.save()
+        self.assertEqual(Log.objects.count(), 0)
+
+        task = Task.objects.get(id=task.id)
+        task.responses = {}
+        with self.captureOnCommitCallbacks(execute=True):
+            with CaptureQueriesContext(connection) as queries:
+                task.save()
+        selects = [q for q in queries.captured_queries
+                   if q["sql"].startswith("SELECT")
+                   and '"api_task"' in q["sql"].split("WHERE")[0]]
+        self.assertEqual(selects, [])
+
+        log = Log.objects.get()
+        self.assertEqual(log.name, "Task responses seem empty.")
+        self.assertEqual(log.task_id, task.id)
+        self.assertEqual(log.json["previous"], {"responses": {"answer": 1}})
+
+    def test_logs_for_responses_emptied_in_place(self):
+        task = self.create_initial_task()
+        task.responses = {"answer": 1}
+        task.save()
+
+        task = Task.objects.get(id=task.id)
+        task.responses.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            task.save()
+
+        log = Log.objects.get()
+        self.assertEqual(log.json["previous"], {"responses": {"answer": 1}})
+
+    def test_logs_for_task_stage_json_changed_in_place(self):
+        self.initial_stage.json_schema = '{}'
+        self.initial_stage.filter_fields_schema = [{"field": "a"}]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.initial_stage.save()
+
+        stage = TaskStage.objects.get(id=self.initial_stage.id)
+        stage.filter_fields_schema.append({"field": "b"})
+        with self.captureOnCommitCallbacks(execute=True):
+            stage.save()
+
+        log = Log.objects.filter(stage_id=stage.id).latest("id")
+        self.assertEqual(log.json["previous"],
+                         {"filter_fields_schema": [{"field": "a"}]})
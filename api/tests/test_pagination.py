@@ -0,0 +1,127 @@
+from django.test import override_settings
+from rest_framework import status
+from rest_framework.reverse import reverse
+
+from api.models import *
+from api.tests import GigaTurnipTestHelper
+
+
+class KeysetPaginationTest(GigaTurnipTestHelper):
+
+    def get_page(self, url, params=None):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_cursor_pages(self):
+        tasks = self.create_initial_tasks(5)
+        url = reverse("task-user-relevant")
+
+        page = self.get_page(url, {"pagination": "cursor", "limit": 2})
+        self.assertNotIn("count", page)
+        self.assertEqual([i["id"] for i in page["results"]],
+                         [tasks[4].id, tasks[3].id])
+
+        new_task = self.create_initial_task()
+        ids = [i["id"] for i in page["results"]]
+        while page["next"]:
+            page = self.get_page(page["next"])
+            ids += [i["id"] for i in page["results"]]
+        self.assertEqual(ids, [i.id for i in reversed(tasks)])
+        self.assertNotIn(new_task.id, ids)
+
+    def test_cursor_ordering_and_count(self):
+        tasks = self.create_initial_tasks(3)
+        tasks[0].save()
+        url = reverse("task-list")
+
+        page = self.get_page(url, {"pagination": "cursor", "limit": 2,
+                                   "cursor_ordering": "-updated_at",
+                                   "with_count": "true"})
+        self.assertEqual(page["count"], 3)
+        self.assertEqual([i["id"] for i in page["results"]],
+                         [tasks[0].id, tasks[2].id])
+        self.assertNotIn("with_count", page["next"])
+
+        page = self.get_page(page["next"])
+        self.assertEqual([i["id"] for i in page["results"]], [tasks[1].id])
+        self.assertIsNone(page["next"])
+
+    def test_invalid_cursor(self):
+        url = reverse("task-user-relevant")
+
+        response = self.client.get(url, {"cursor": "broken"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.get(url, {"pagination": "cursor",
+                                         "cursor_ordering": "name"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_default_pagination_kept(self):
+        self.create_initial_tasks(3)
+
+        page = self.get_page(reverse("task-user-relevant"), {"limit": 2})
+
+        self.assertEqual(page["count"], 3)
+        self.assertEqual(len(page["results"]), 2)
+
+
+class CountStrategyTest(GigaTurnipTestHelper):
+
+    def get_page(self, params=None):
+        response = self.client.get(reverse("task-user-relevant"), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_exact_count(self):
+        self.create_initial_tasks(2)
+
+        page = self.get_page({"count_strategy": "exact"})
+
+        self.assertEqual((page["count"], page["count_strategy"]),
+                         (2, "exact"))
+
+    def test_estimate_count(self):
+        self.create_initial_tasks(2)
+
+        page = self.get_page()
+        self.assertEqual((page["count"], page["count_strategy"]),
+                         (2, "exact"))
+
+        with override_settings(PAGINATION_COUNT={
+                "strategy": "exact", "estimate_threshold": 0,
+                "cache_timeout": 30}):
+            page = self.get_page()
+            self.assertEqual(page["count_strategy"], "estimate")
+            self.assertEqual(len(page["results"]), 2)
+
+            page = self.get_page({"complete": "false"})
+            self.assertEqual((page["count"], page["count_strategy"]),
+                             (2, "exact"))
+
+            page = self.get_page({"complete": "false",
+                                  "count_strategy": "estimate"})
+            self.assertEqual(page["count_strategy"], "estimate")
+
+    def test_cached_count(self):
+        self.create_initial_tasks(2)
+        params = {"count_strategy": "cached", "complete": "false"}
+
+        page = self.get_page(params)
+        self.assertEqual((page["count"], page["count_strategy"]),
+                         (2, "exact"))
+
+        self.create_initial_task()
+        page = self.get_page(dict(params, offset=1))
+        self.assertEqual((page["count"], page["count_strategy"]),
+                         (2, "cached"))
+        self.assertEqual(len(page["results"]), 2)
+
+        page = self.get_page({"count_strategy": "cached"})
+        self.assertEqual((page["count"], page["count_strategy"]),
+                         (3, "exact"))
+
+    def test_unknown_strategy(self):
+        response = self.client.get(reverse("task-user-relevant"),
+                                   {"count_strategy": "guess"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,60 @@
+import json
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from api.models import *
+from api.tests import GigaTurnipTestHelper
+
+
+class PingpongBenchmarkTest(GigaTurnipTestHelper):
+    """Bounces one case between the initial and verification stages and
+    checks that every bounce costs the same number of queries, however
+    many times the case was bounced before.
+    """
+    bounces = 5
+    # Queries of one bounce: two submits with their propagation.
+    max_queries_per_bounce = 70
+
+    def setUp(self):
+        super().setUp()
+        self.initial_stage.json_schema = json.dumps({
+            "type": "object",
+            "properties": {"answer": {"type": "string"}}
+        })
+        self.initial_stage.save()
+        self.verification_stage = self.initial_stage.add_stage(
+            ConditionalStage(
+                conditions=[{"field": "verified", "type": "string",
+                             "value": "no", "condition": "=="}],
+                pingpong=True
+            )
+        ).add_stage(TaskStage(name="Verification"))
+        self.verification_stage.add_stage(TaskStage(name="Final"))
+        self.verification_client = self.prepare_client(
+            self.verification_stage)
+
+    def bounce(self, initial_task, verification_task):
+        with CaptureQueriesContext(connection) as queries:
+            self.complete_task(verification_task, {"verified": "no"},
+                               client=self.verification_client)
+            self.complete_task(initial_task, {"answer": "again"})
+        return len(queries)
+
+    def test_flat_cost_per_bounce(self):
+        initial_task = self.complete_task(self.create_initial_task(),
+                                          {"answer": "first"})
+        verification_task = initial_task.out_tasks.get()
+        self.request_assignment(verification_task, self.verification_client)
+
+        costs = [self.bounce(initial_task, verification_task)
+                 for _ in range(self.bounces)]
+
+        self.assertEqual(len(set(costs[1:])), 1, costs)
+        self.assertLessEqual(costs[-1], costs[0], costs)
+        self.assertLessEqual(max(costs), self.max_queries_per_bounce, costs)
+        verification_task.refresh_from_db()
+        self.assertTrue(verification_task.reopened)
+        self.assertFalse(verification_task.complete)
+        self.assertEqual(Task.objects.filter(case=initial_task.case).count(),
+                         2)
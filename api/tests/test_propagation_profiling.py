@@ -0,0 +1,87 @@
+from django.test import override_settings
+from rest_framework import status
+from rest_framework.reverse import reverse
+
+from api.constans import PropagationStepConstants
+from api.models import *
+from api.tests import GigaTurnipTestHelper
+
+
+class PropagationProfilingTest(GigaTurnipTestHelper):
+
+    def setUp(self):
+        super().setUp()
+        self.second_stage = self.initial_stage.add_stage(
+            TaskStage(name="Second")
+        )
+
+    def get_stat(self, stage, step):
+        return PropagationStepStat.objects.get(stage=stage, step=step)
+
+    @override_settings(PROPAGATION_PROFILING={"sample_rate": 1})
+    def test_steps_recorded(self):
+        task = self.create_initial_task()
+        self.complete_task(task, {"a": 1})
+
+        total = self.get_stat(self.initial_stage,
+                              PropagationStepConstants.TOTAL)
+        self.assertEqual(total.calls, 1)
+        self.assertEqual(total.campaign, self.campaign)
+        self.assertEqual(total.chain, self.chain)
+        self.assertGreater(total.queries, 0)
+        self.assertGreater(total.seconds, 0)
+        for step in [PropagationStepConstants.QUIZ,
+                     PropagationStepConstants.OUT_STAGES,
+                     PropagationStepConstants.AUTO_NOTIFICATIONS,
+                     PropagationStepConstants.TASK_AWARDS,
+                     PropagationStepConstants.CAMPAIGN_LINKERS,
+                     PropagationStepConstants.DEMO_NEXT]:
+            stat = self.get_stat(self.initial_stage, step)
+            self.assertEqual(stat.calls, 1)
+            self.assertLessEqual(stat.queries, total.queries)
+        created = self.get_stat(self.second_stage,
+                                PropagationStepConstants.CREATE_TASK)
+        self.assertEqual(created.tasks, 1)
+
+        task = self.create_initial_task()
+        self.complete_task(task, {"a": 2})
+        self.assertEqual(self.get_stat(self.initial_stage,
+                                       PropagationStepConstants.TOTAL).calls,
+                         2)
+
+    def test_not_sampled(self):
+        task = self.create_initial_task()
+        self.complete_task(task, {"a": 1})
+
+        self.assertFalse(PropagationStepStat.objects.exists())
+
+    @override_settings(PROPAGATION_PROFILING={"sample_rate": 1})
+    def test_stats_endpoints_for_managers_only(self):
+        task = self.create_initial_task()
+        self.complete_task(task, {"a": 1})
+        list_url = reverse("propagationstat-list")
+        metrics_url = reverse("propagationstat-metrics")
+
+        self.assertEqual(self.get_objects("propagationstat-list").status_code,
+                         status.HTTP_403_FORBIDDEN)
+        self.assertEqual(self.client.get(metrics_url).status_code,
+                         status.HTTP_403_FORBIDDEN)
+
+        self.user.managed_campaigns.add(self.campaign)
+        response = self.client.get(
+            list_url, {"step": PropagationStepConstants.TOTAL})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["count"], 1)
+        self.assertEqual(response.data["results"][0]["stage"],
+                         self.initial_stage.id)
+
+        response = self.client.get(metrics_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response["Content-Type"].startswith("text/plain"))
+        body = response.content.decode()
+        self.assertIn("# TYPE gigaturnip_propagation_step_seconds_total "
+                      "counter", body)
+        self.assertIn(
+            f'gigaturnip_propagation_step_calls_total{{campaign='
+            f'"{self.campaign.id}",chain="{self.chain.id}",stage='
+            f'"{self.initial_stage.id}",step="total"}} 1', body)
@@ -7,6 +7,7 @@ from api.constans import AutoNotificationConstants, TaskStageConstants, \
     CopyFieldConstants
 from api.models import *
 from api.tests import GigaTurnipTestHelper, to_json
+from api.utils.flatten_plan import get_flatten_plan
 
 
 class ResponseFlattenerTest(GigaTurnipTestHelper):
@@ -343,3 +344,64 @@ class ResponseFlattenerTest(GigaTurnipTestHelper):
         response = self.get_objects("responseflattener-csv", pk=response_flattener.id + 111)
 
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_response_flattener_csv_stream(self):
+        tasks = self.create_initial_tasks(3)
+        self.employee.managed_campaigns.add(self.campaign)
+        new_client = self.create_client(self.employee)
+
+        self.initial_stage.json_schema = '{"properties":{"column1":{"column1":{}},"oik":{"properties":{"uik1":{}}}}}'
+        self.initial_stage.ui_schema = '{"ui:order": ["column1", "oik"]}'
+        self.initial_stage.save()
+        response_flattener = ResponseFlattener.objects.create(task_stage=self.initial_stage, flatten_all=True)
+
+        responses = {"column1": "First", "oik": {"uik1": "Second", "extra": 5, "empty": ""}}
+        for t in tasks:
+            self.complete_task(t, responses, self.client)
+
+        self.assertEqual(response_flattener.response_columns(), ["column1", "oik__extra", "oik__uik1"])
+
+        response = self.get_objects("responseflattener-csv", params={"stream": "true"},
+                                    client=new_client, pk=response_flattener.id)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        content = b"".join(response.streaming_content).decode()
+        self.assertEqual(content.split("\r\n"), [
+            "id,column1,oik__uik1,description",
+            f"{tasks[0].id},First,Second,oik__extra",
+            f"{tasks[1].id},First,Second,",
+            f"{tasks[2].id},First,Second,",
+            "",
+        ])
+
+        response = self.get_objects("responseflattener-csv", client=new_client, pk=response_flattener.id)
+        self.assertEqual(response.content.decode(), content)
+
+        response = self.get_objects("responseflattener-csv", params={"stream": "false"},
+                                    client=new_client, pk=response_flattener.id)
+        self.assertFalse(response.streaming)
+        self.assertEqual(response.content.decode(), content)
+
+    def test_response_flattener_plan_cached(self):
+        task = self.create_initial_task()
+        task.responses = {"oik": {"question12": "Yes", "uik1": "First"}, "AAA": '{"i":"img.jpg"}'}
+        task.save()
+        response_flattener = ResponseFlattener.objects.create(
+            task_stage=self.initial_stage, copy_first_level=False,
+            columns=["oik__(r)question[\\d]{1,2}", "oik__(i)uik", "AAA"])
+
+        plan = get_flatten_plan(response_flattener)
+        self.assertIs(get_flatten_plan(response_flattener), plan)
+        self.assertEqual(response_flattener.flatten_response(task), {
+            "id": task.id,
+            "oik__(r)question[\\d]{1,2}": "Yes",
+            "oik__(i)uik": "First",
+            "AAA": '{"i":"img.jpg"}',
+        })
+
+        self.initial_stage.ui_schema = '{"AAA":{"ui:widget":"customfile"}}'
+        self.initial_stage.save()
+        self.assertIsNot(get_flatten_plan(response_flattener), plan)
+        self.assertEqual(
+            response_flattener.flatten_response(task)["AAA"],
+            "https://storage.cloud.google.com/gigaturnip-b6b5b.appspot.com/img.jpg?authuser=1"
+        )
@@ -0,0 +1,107 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from api.models import *
+from api.tests import GigaTurnipTestHelper
+from api.utils.cache_versions import bump_versions
+from api.utils.selectable_pool import get_selectable_stage_ids, \
+    USER_VERSION_KEY
+
+
+class SelectablePoolTest(GigaTurnipTestHelper):
+
+    def setUp(self):
+        super().setUp()
+        self.second_stage = self.initial_stage.add_stage(TaskStage())
+        self.selecting_client = self.prepare_client(self.second_stage,
+                                                    self.employee)
+
+    def get_selectable_ids(self):
+        response = self.get_objects("task-user-selectable",
+                                    client=self.selecting_client)
+        return [i["id"] for i in response.data["results"]]
+
+    def test_open_pool(self):
+        tasks = [self.complete_task(i).out_tasks.get()
+                 for i in self.create_initial_tasks(3)]
+        self.assertCountEqual(self.get_selectable_ids(),
+                              [i.id for i in tasks])
+
+        self.request_assignment(tasks[0], self.selecting_client)
+        Task.objects.filter(id=tasks[1].id).update(complete=True)
+        self.assertEqual(self.get_selectable_ids(), [tasks[2].id])
+
+        Task.objects.filter(id=tasks[0].id).update(assignee=None)
+        self.assertCountEqual(self.get_selectable_ids(),
+                              [tasks[0].id, tasks[2].id])
+
+    def test_listing_uses_cached_stages(self):
+        task = self.complete_task(self.create_initial_task()).out_tasks.get()
+        self.assertEqual(self.get_selectable_ids(), [task.id])
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.get_selectable_ids(), [task.id])
+        task_queries = [q["sql"] for q in queries.captured_queries
+                        if q["sql"].startswith("SELECT COUNT(*)")
+                        and 'FROM "api_task"' in q["sql"]]
+        self.assertTrue(task_queries)
+        for sql in task_queries:
+            self.assertNotIn("api_ranklimit", sql)
+            self.assertNotIn("api_rankrecord", sql)
+            self.assertNotIn("DISTINCT", sql)
+
+    def test_invalidated_on_rank_changes(self):
+        task = self.complete_task(self.create_initial_task()).out_tasks.get()
+        self.assertEqual(self.get_selectable_ids(), [task.id])
+
+        rank_limit = RankLimit.objects.get(stage=self.second_stage)
+        rank_limit.is_listing_allowed = False
+        rank_limit.save()
+        self.assertEqual(self.get_selectable_ids(), [])
+
+        rank_limit.is_listing_allowed = True
+        rank_limit.save()
+        self.assertEqual(self.get_selectable_ids(), [task.id])
+
+        self.employee.ranks.remove(rank_limit.rank)
+        self.assertEqual(self.get_selectable_ids(), [])
+
+    def test_version_bumped_by_other_process(self):
+        self.assertEqual(get_selectable_stage_ids(self.employee),
+                         [self.second_stage.id])
+        RankLimit.objects.filter(stage=self.second_stage) \
+            .update(is_selection_open=False)
+        with self.assertNumQueries(1):
+            self.assertEqual(get_selectable_stage_ids(self.employee),
+                             [self.second_stage.id])
+
+        bump_versions([USER_VERSION_KEY.format(self.employee.id)])
+        self.assertEqual(get_selectable_stage_ids(self.employee), [])
+
+    def test_displayed_previous_tasks_batched(self):
+        self.second_stage.displayed_prev_stages.add(self.initial_stage)
+
+        def count_queries():
+            with CaptureQueriesContext(connection) as queries:
+                response = self.get_objects("task-user-selectable",
+                                            client=self.selecting_client)
+            return response, len(queries.captured_queries)
+
+        initial = self.create_initial_tasks(2)
+        tasks = [self.complete_task(i).out_tasks.get() for i in initial]
+        self.get_selectable_ids()
+        response, queries = count_queries()
+        results = {i["id"]: i for i in response.data["results"]}
+        for in_task, task in zip(initial, tasks):
+            stage = results[task.id]["stage"]
+            self.assertEqual(stage["campaign"], self.campaign.id)
+            self.assertEqual(
+                [i["id"] for i in stage["displayed_prev_stages"]],
+                [in_task.id])
+
+        for task in self.create_initial_tasks(3):
+            self.complete_task(task)
+        self.get_selectable_ids()
+        response, more_queries = count_queries()
+        self.assertEqual(response.data["count"], 5)
+        self.assertEqual(more_queries, queries)
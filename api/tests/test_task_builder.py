@@ -0,0 +1,78 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from api.asyncstuff import create_new_task, process_out_stages
+from api.constans import TaskStageConstants
+from api.models import *
+from api.tests import GigaTurnipTestHelper
+
+
+def count_task_writes(queries):
+    inserts = [i for i in queries
+               if i["sql"].startswith('INSERT INTO "api_task"')]
+    updates = [i for i in queries
+               if i["sql"].startswith('UPDATE "api_task"')]
+    return len(inserts), len(updates)
+
+
+class TaskBuilderTest(GigaTurnipTestHelper):
+
+    def test_single_write(self):
+        second_stage = self.initial_stage.add_stage(
+            TaskStage(
+                name="Second",
+                assign_user_by=TaskStageConstants.STAGE,
+                assign_user_from_stage=self.initial_stage,
+                copy_input=True
+            )
+        )
+        CopyField.objects.create(
+            task_stage=second_stage,
+            copy_from_stage=self.initial_stage,
+            fields_to_copy="foo->copied"
+        )
+        CountTasksModifier.objects.create(
+            task_stage=second_stage,
+            stage_to_count_tasks_from=self.initial_stage,
+            field_to_write_count_to="count",
+            field_to_write_count_complete="count_complete"
+        )
+        DatetimeSort.objects.create(stage=second_stage, how_much=2,
+                                    after_how_much=1)
+        task = self.create_initial_task()
+        task.responses = {"foo": "boo"}
+        task.complete = True
+        task.save()
+
+        with CaptureQueriesContext(connection) as context:
+            create_new_task(second_stage, task)
+
+        self.assertEqual(count_task_writes(context.captured_queries), (1, 0))
+        new_task = Task.objects.get(stage=second_stage)
+        self.assertEqual(new_task.assignee, self.user)
+        self.assertEqual(list(new_task.in_tasks.all()), [task])
+        self.assertEqual(new_task.responses["foo"], "boo")
+        self.assertEqual(new_task.responses["copied"], "boo")
+        self.assertEqual(new_task.responses["count"], 1)
+        self.assertEqual(new_task.responses["count_complete"], 1)
+        self.assertIsNotNone(new_task.start_period)
+
+    def test_fan_out_bulk_created(self):
+        out_stages = [
+            self.initial_stage.add_stage(TaskStage(name=f"Out {i}"))
+            for i in range(3)
+        ]
+        auto_stage = self.initial_stage.add_stage(
+            TaskStage(name="Auto",
+                      assign_user_by=TaskStageConstants.AUTO_COMPLETE)
+        )
+        task = self.create_initial_task()
+
+        with CaptureQueriesContext(connection) as context:
+            process_out_stages(self.initial_stage, task)
+
+        self.assertEqual(count_task_writes(context.captured_queries), (1, 0))
+        for stage in out_stages:
+            self.assertEqual(
+                list(Task.objects.get(stage=stage).in_tasks.all()), [task])
+        self.assertTrue(Task.objects.get(stage=auto_stage).complete)
@@ -0,0 +1,122 @@
+import threading
+
+from django.db import connection, transaction
+
+from api.models import *
+from api.tests import GigaTurnipTestHelper
+
+
+class TaskChangeFeedTest(GigaTurnipTestHelper):
+    """The feed only returns changes of finished transactions, so these
+    tests commit their changes instead of running in one transaction.
+    """
+
+    @classmethod
+    def _databases_support_transactions(cls):
+        return False
+
+    def setUp(self):
+        super().setUp()
+        self.employee.managed_campaigns.add(self.campaign)
+        self.manager_client = self.create_client(self.employee)
+
+    def get_changes(self, **params):
+        response = self.get_objects("task-changes", params=params,
+                                    client=self.manager_client)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_changes_after_cursor(self):
+        tasks = self.create_initial_tasks(3)
+
+        first = self.get_changes(limit=2)
+        self.assertEqual([i["id"] for i in first["results"]],
+                         [tasks[0].id, tasks[1].id])
+        self.assertTrue(first["has_more"])
+
+        second = self.get_changes(since=first["cursor"], limit=2)
+        self.assertEqual([i["id"] for i in second["results"]], [tasks[2].id])
+        self.assertFalse(second["has_more"])
+
+        empty = self.get_changes(since=second["cursor"])
+        self.assertEqual(empty["results"], [])
+        self.assertEqual(empty["cursor"], second["cursor"])
+
+        self.complete_task(tasks[0], {"answer": "a"})
+        changed = self.get_changes(since=second["cursor"])
+        self.assertEqual([i["id"] for i in changed["results"]], [tasks[0].id])
+        self.assertTrue(changed["results"][0]["complete"])
+
+    def test_queryset_update_in_feed(self):
+        task = self.create_initial_task()
+        updated_at = Task.objects.get(id=task.id).updated_at
+        cursor = self.get_changes()["cursor"]
+
+        Task.objects.filter(id=task.id).update(reopened=True)
+        changed = self.get_changes(since=cursor)
+        self.assertEqual([i["id"] for i in changed["results"]], [task.id])
+        self.assertEqual(Task.objects.get(id=task.id).updated_at, updated_at)
+
+        Task.objects.filter(id=task.id).update(reopened=True)
+        cursor = changed["cursor"]
+        self.assertEqual(self.get_changes(since=cursor)["results"], [])
+
+    def test_deleted_tasks(self):
+        task = self.create_initial_task()
+        task_id = task.id
+        cursor = self.get_changes()["cursor"]
+
+        task.delete()
+        changes = self.get_changes(since=cursor)
+        self.assertEqual(changes["results"], [])
+        self.assertEqual([i["id"] for i in changes["deleted"]], [task_id])
+        self.assertEqual(changes["deleted"][0]["stage"], self.initial_stage.id)
+
+        other_changes = self.get_objects(
+            "task-changes", params={"since": cursor}, client=self.client)
+        self.assertEqual(other_changes.status_code, 403)
+
+    def test_flattened_changes(self):
+        flattener = ResponseFlattener.objects.create(
+            task_stage=self.initial_stage, columns=["answer"])
+        task = self.create_initial_task()
+        self.complete_task(task, {"answer": "a"})
+
+        changes = self.get_changes(response_flattener=flattener.id)
+        self.assertEqual(changes["results"], [{"id": task.id, "answer": "a"}])
+
+    def test_invalid_params(self):
+        for params in [{"since": "x"}, {"stage": "x"}]:
+            response = self.get_objects("task-changes", params=params,
+                                        client=self.manager_client)
+            self.assertEqual(response.status_code, 400)
+
+    def test_open_transaction_not_skipped(self):
+        first, second = self.create_initial_tasks(2)
+        cursor = self.get_changes()["cursor"]
+        written, release = threading.Event(), threading.Event()
+
+        def hold_transaction():
+            try:
+                with transaction.atomic():
+                    Task.objects.filter(id=first.id).update(reopened=True)
+                    written.set()
+                    release.wait(10)
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=hold_transaction)
+        thread.start()
+        try:
+            self.assertTrue(written.wait(10))
+            Task.objects.filter(id=second.id).update(reopened=True)
+            held = self.get_changes(since=cursor)
+            self.assertEqual(held["results"], [])
+            self.assertEqual(held["cursor"], cursor)
+        finally:
+            release.set()
+            thread.join()
+
+        changes = self.get_changes(since=cursor)
+        self.assertEqual([i["id"] for i in changes["results"]],
+                         [first.id, second.id])
@@ -0,0 +1,111 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+
+from api.models import *
+from api.tests import GigaTurnipTestHelper
+
+
+class TaskFilterTest(GigaTurnipTestHelper):
+
+    def setUp(self):
+        super().setUp()
+        self.second_stage = self.initial_stage.add_stage(TaskStage())
+        self.second_stage.filter_fields_schema = [
+            {
+                "type": "integer",
+                "field_name": "year",
+                "condition": ">=",
+                "stage_id": self.initial_stage.id,
+            },
+            {
+                "type": "string",
+                "field_name": "city",
+                "condition": "==",
+                "stage_id": self.initial_stage.id,
+            },
+        ]
+        self.second_stage.save()
+        self.selecting_client = self.prepare_client(self.second_stage,
+                                                    self.employee)
+
+    def create_case(self, responses):
+        task = self.create_initial_task()
+        return self.complete_task(task, responses).out_tasks.get()
+
+    def get_selectable_ids(self, data):
+        response = self.selecting_client.post(
+            reverse("task-user-selectable"), data=data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return sorted(i["id"] for i in response.data["results"])
+
+    def test_values_maintained(self):
+        task = self.create_initial_task()
+        year = TaskFilterField.objects.get(stage=self.initial_stage,
+                                           field_name="year")
+        self.assertFalse(TaskFilterValue.objects.filter(task_id=task.id))
+
+        task.responses = {"year": 2012, "city": "Osh", "name": "Anton"}
+        task.save()
+        self.assertEqual(
+            sorted(TaskFilterValue.objects.filter(task_id=task.id)
+                   .values_list("field__field_name", "text_value",
+                                "number_value")),
+            [("city", "Osh", None), ("year", "2012", 2012.0)]
+        )
+
+        Task.objects.filter(id=task.id).update(responses={"year": 2013})
+        self.assertEqual(
+            list(TaskFilterValue.objects.filter(task_id=task.id)
+                 .values_list("field_id", "number_value")),
+            [(year.id, 2013.0)]
+        )
+
+        # 1000 characters of 4 bytes are over the btree limit of the text
+        # index, they are not kept instead of failing the save.
+        for city, kept in [("\U0001F600" * 1000, None),
+                           ("\u6C34" * 600, "\u6C34" * 600)]:
+            task.responses = {"city": city}
+            task.save()
+            self.assertEqual(
+                list(TaskFilterValue.objects.filter(task_id=task.id)
+                     .values_list("text_value", flat=True)),
+                [kept]
+            )
+
+        Task.objects.filter(id=task.id).delete()
+        self.assertFalse(TaskFilterValue.objects.filter(task_id=task.id))
+
+    def test_filter_selectable(self):
+        first = self.create_case({"year": 2012, "city": "Osh"})
+        second = self.create_case({"year": 2014, "city": "Osh"})
+        third = self.create_case({"year": 2014, "city": "Bishkek"})
+
+        self.assertEqual(self.get_selectable_ids({"year": 2013}),
+                         [second.id, third.id])
+        self.assertEqual(self.get_selectable_ids({"city": "Osh"}),
+                         [first.id, second.id])
+
+        with CaptureQueriesContext(connection) as queries:
+            ids = self.get_selectable_ids({"year": "2013", "city": "Osh"})
+        self.assertEqual(ids, [second.id])
+        for query in queries.captured_queries:
+            if 'FROM "api_task"' in query["sql"]:
+                self.assertNotIn('"api_task"."responses" ->', query["sql"])
+
+    def test_backfill_new_field(self):
+        task = self.create_case({"year": 2012, "grade": 5})
+        self.assertEqual(self.get_selectable_ids({"grade": 4}), [task.id])
+
+        self.second_stage.filter_fields_schema.append({
+            "type": "integer",
+            "field_name": "grade",
+            "condition": "==",
+            "stage_id": self.initial_stage.id,
+        })
+        self.second_stage.save()
+        self.assertTrue(TaskFilterValue.objects.filter(
+            field__field_name="grade", number_value=5).exists())
+        self.assertEqual(self.get_selectable_ids({"grade": 4}), [])
+        self.assertEqual(self.get_selectable_ids({"grade": 5}), [task.id])
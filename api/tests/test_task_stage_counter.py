@@ -0,0 +1,86 @@
+from io import StringIO
+
+from django.core.management import call_command
+
+from api.models import *
+from api.tests import GigaTurnipTestHelper
+
+
+class TaskStageCounterTest(GigaTurnipTestHelper):
+
+    def setUp(self):
+        super().setUp()
+        self.second_stage = self.initial_stage.add_stage(
+            TaskStage(name="Second")
+        )
+        CountTasksModifier.objects.create(
+            task_stage=self.second_stage,
+            stage_to_count_tasks_from=self.initial_stage
+        )
+
+    def assert_counts(self, tasks, complete_tasks, assignees,
+                      complete_assignees):
+        counter = TaskStageCounter.objects.get(stage=self.initial_stage)
+        self.assertEqual(
+            (counter.tasks, counter.complete_tasks, counter.assignees,
+             counter.complete_assignees),
+            (tasks, complete_tasks, assignees, complete_assignees)
+        )
+
+    def test_counts_maintained(self):
+        self.assert_counts(0, 0, 0, 0)
+
+        first = Task.objects.create(stage=self.initial_stage,
+                                    assignee=self.user)
+        second = Task.objects.create(stage=self.initial_stage,
+                                     assignee=self.user)
+        third = Task.objects.create(stage=self.initial_stage)
+        self.assert_counts(3, 0, 2, 0)
+
+        first.complete = True
+        first.save()
+        self.assert_counts(3, 1, 2, 1)
+
+        third.assignee = self.employee
+        third.save()
+        self.assert_counts(3, 1, 2, 1)
+
+        Task.objects.filter(id=second.id).update(assignee=self.employee,
+                                                 complete=True)
+        self.assert_counts(3, 2, 2, 2)
+
+        first.delete()
+        self.assert_counts(2, 1, 1, 1)
+
+        Task.objects.bulk_create([Task(stage=self.initial_stage)
+                                  for _ in range(2)])
+        self.assert_counts(4, 1, 2, 1)
+
+        expected = TaskStageCounter.objects.get(stage=self.initial_stage)
+        counter = TaskStageCounter.reconcile(self.initial_stage.id)
+        self.assertEqual(
+            (counter.tasks, counter.complete_tasks, counter.assignees,
+             counter.complete_assignees),
+            (expected.tasks, expected.complete_tasks, expected.assignees,
+             expected.complete_assignees)
+        )
+
+    def test_untracked_stage_not_counted(self):
+        Task.objects.create(stage=self.second_stage)
+
+        self.assertFalse(
+            TaskStageCounter.objects.filter(stage=self.second_stage).exists())
+        self.assertFalse(TaskStageAssigneeCounter.objects
+                         .filter(stage=self.second_stage).exists())
+
+    def test_reconcile_command(self):
+        Task.objects.create(stage=self.initial_stage, assignee=self.user,
+                            complete=True)
+        TaskStageCounter.objects.filter(stage=self.initial_stage) \
+            .update(tasks=10, assignees=0)
+
+        out = StringIO()
+        call_command("reconcile_task_counters", stdout=out)
+
+        self.assertIn(f"Stage {self.initial_stage.id}: fixed", out.getvalue())
+        self.assert_counts(1, 1, 1, 1)
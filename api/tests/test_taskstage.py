@@ -1,5 +1,8 @@
 import json
 
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
 from rest_framework import status
 
 from rest_framework.test import APITestCase, APIClient
@@ -84,7 +87,7 @@ class TaskStageTest(GigaTurnipTestHelper):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(
             set(json.loads(response.content).keys()),
-            {"count", "next", "previous", "results"}
+            {"count", "count_strategy", "next", "previous", "results"}
         )
 
     def test_stages_by_highest_ranks(self):
@@ -353,3 +356,33 @@ class TaskStageTest(GigaTurnipTestHelper):
         self.assertEqual(response.data["count"], 1)
         stage = response.data["results"][0]
         self.assertEqual(stage["rank_limit"], {"open_limit": 0, "total_limit": 5})
+
+    def test_stage_user_relevant_limits_in_one_query(self):
+        rank_limit = RankLimit.objects.get(stage=self.initial_stage)
+        rank_limit.open_limit = 1
+        rank_limit.total_limit = 2
+        rank_limit.save()
+        stages = [self.initial_stage.add_stage(TaskStage(is_creatable=True))
+                  for _ in range(5)]
+        for stage in stages:
+            RankLimit.objects.create(stage=stage, rank=rank_limit.rank,
+                                     is_creation_open=True)
+
+        def get_stage_ids():
+            response = self.get_objects("taskstage-user-relevant")
+            return {i["id"] for i in response.data["results"]}
+
+        self.assertEqual(get_stage_ids(),
+                         {self.initial_stage.id} | {i.id for i in stages})
+        with CaptureQueriesContext(connection) as queries:
+            get_stage_ids()
+        self.assertFalse([q for q in queries.captured_queries
+                          if 'FROM "api_ranklimit"' in q["sql"]
+                          and q["sql"].startswith("SELECT \"api_ranklimit\"")])
+
+        task = self.create_initial_task()
+        self.assertNotIn(self.initial_stage.id, get_stage_ids())
+        self.complete_task(task)
+        self.assertIn(self.initial_stage.id, get_stage_ids())
+        self.create_initial_task()
+        self.assertNotIn(self.initial_stage.id, get_stage_ids())
@@ -0,0 +1,134 @@
+import json
+from unittest import mock
+
+import requests
+from rest_framework.reverse import reverse
+from urllib3.exceptions import MaxRetryError, NewConnectionError
+
+from api.constans import TaskStageConstants
+from api.models import *
+from api.tests import GigaTurnipTestHelper
+from api.utils.webhook_transport import WebhookTransport, CircuitOpenError, \
+    DEFAULT_CONFIG
+
+
+def make_response(status_code=200, data=None):
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = json.dumps(data if data else {}).encode()
+    return response
+
+
+class WebhookTransportTest(GigaTurnipTestHelper):
+
+    def setUp(self):
+        super().setUp()
+        config = dict(DEFAULT_CONFIG)
+        config.update({"retries": 2, "breaker_threshold": 2})
+        self.transport = WebhookTransport(config)
+        self.transport.backoff = mock.Mock()
+
+    def test_timeout_and_retries(self):
+        with mock.patch.object(self.transport.session, "request",
+                               side_effect=[requests.ConnectionError(),
+                                            make_response(503),
+                                            make_response(data={"a": 1})]
+                               ) as request:
+            response = self.transport.get("http://hook.test/a")
+
+        self.assertEqual(response.json(), {"a": 1})
+        self.assertEqual(request.call_count, 3)
+        self.assertEqual(request.call_args.kwargs["timeout"],
+                         (DEFAULT_CONFIG["connect_timeout"],
+                          DEFAULT_CONFIG["read_timeout"]))
+        metrics = self.transport.get_metrics()["hook.test"]
+        self.assertEqual(metrics["requests"], 3)
+        self.assertEqual(metrics["retries"], 2)
+        self.assertEqual(metrics["failures"], 0)
+
+    def test_post_not_retried_on_server_error(self):
+        with mock.patch.object(self.transport.session, "request",
+                               return_value=make_response(503)) as request:
+            response = self.transport.post("http://hook.test/a", json={})
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(request.call_count, 1)
+
+    def test_post_retried_only_if_not_sent(self):
+        not_sent = requests.ConnectionError(
+            MaxRetryError(None, "/a", NewConnectionError(None, "refused")))
+        with mock.patch.object(self.transport.session, "request",
+                               side_effect=[not_sent,
+                                            requests.ConnectTimeout(),
+                                            requests.ConnectionError(),
+                                            make_response()]) as request:
+            with self.assertRaises(requests.ConnectionError):
+                self.transport.post("http://hook.test/a", json={})
+
+        self.assertEqual(request.call_count, 3)
+
+    def test_metrics_endpoint(self):
+        self.initial_stage.add_stage(
+            TaskStage(name="Webhook", webhook_address="http://hook.test/",
+                      assign_user_by=TaskStageConstants.AUTO_COMPLETE))
+        self.transport.count("hook.test", "requests", 3)
+        self.transport.count("other.test", "requests")
+        self.user.managed_campaigns.add(self.campaign)
+
+        with mock.patch("api.views.transport", self.transport):
+            response = self.client.get(reverse("propagationstat-metrics"))
+
+        body = response.content.decode()
+        self.assertIn('gigaturnip_webhook_requests_total{host="hook.test"} 3',
+                      body)
+        self.assertIn('gigaturnip_webhook_circuit_open{host="hook.test"} 0',
+                      body)
+        self.assertNotIn("other.test", body)
+
+    def test_circuit_breaker(self):
+        with mock.patch.object(self.transport.session, "request",
+                               return_value=make_response(500)) as request:
+            self.transport.post("http://hook.test/a",
+                                error_source=self.initial_stage)
+            self.assertEqual(ErrorItem.objects.count(), 0)
+            self.transport.post("http://hook.test/a",
+                                error_source=self.initial_stage)
+            self.assertEqual(ErrorItem.objects.count(), 1)
+
+            with self.assertRaises(CircuitOpenError):
+                self.transport.post("http://hook.test/b",
+                                    error_source=self.initial_stage)
+            self.assertEqual(request.call_count, 2)
+
+        self.assertEqual(ErrorItem.objects.count(), 1)
+        metrics = self.transport.get_metrics()["hook.test"]
+        self.assertTrue(metrics["circuit_open"])
+        self.assertEqual(metrics["short_circuits"], 1)
+
+    def test_webhook_stages_requested_concurrently(self):
+        stages = [
+            self.initial_stage.add_stage(
+                TaskStage(name=f"Webhook {i}",
+                          webhook_address=f"http://hook{i}.test/",
+                          assign_user_by=TaskStageConstants.AUTO_COMPLETE)
+            )
+            for i in range(2)
+        ]
+        task = self.create_initial_task()
+
+        with mock.patch("api.asyncstuff.transport", self.transport):
+            with mock.patch.object(
+                    self.transport.session, "request",
+                    side_effect=lambda method, url, **kwargs: make_response(
+                        data={"url": url})) as request:
+                with mock.patch.object(self.transport, "map",
+                                       wraps=self.transport.map) as map_:
+                    self.complete_task(task, {"a": 1})
+
+        map_.assert_called_once()
+        self.assertEqual(request.call_count, 2)
+        for stage in stages:
+            new_task = Task.objects.get(stage=stage)
+            self.assertEqual(new_task.responses["url"],
+                             stage.webhook_address)
+            self.assertTrue(new_task.complete)
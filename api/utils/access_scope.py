@@ -0,0 +1,161 @@
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.functional import cached_property
+
+from api.models import CampaignManagement, RankRecord, RankLimit, TaskStage, \
+    Rank
+from api.utils.cache_versions import get_versions, bump_versions
+from api.utils.selectable_pool import get_selectable_stage_windows
+
+VERSION_KEY = "access_scope"
+USER_VERSION_KEY = "access_scope:{}"
+SCOPE_KEY = "access_scope:{}:{}:{}"
+
+AccessScope = namedtuple("AccessScope", [
+    "managed_campaign_ids",
+    "managed_stage_ids",
+    "rank_ids",
+    "rank_campaign_ids",
+    "rank_stage_ids",
+    "rank_chain_ids",
+])
+
+EMPTY_SCOPE = AccessScope(*[frozenset()] * len(AccessScope._fields))
+
+
+def build_access_scope(user_id):
+    managed_campaign_ids = frozenset(
+        CampaignManagement.objects.filter(user_id=user_id)
+        .values_list("campaign_id", flat=True)
+    )
+    managed_stage_ids = frozenset(
+        TaskStage.objects.filter(chain__campaign_id__in=managed_campaign_ids)
+        .values_list("id", flat=True)
+    ) if managed_campaign_ids else frozenset()
+    ranks = list(
+        RankRecord.objects.filter(user_id=user_id)
+        .values_list("rank_id", "rank__track__campaign_id")
+    )
+    rank_ids = frozenset(rank_id for rank_id, _ in ranks)
+    rank_stages = list(
+        RankLimit.objects.filter(rank_id__in=rank_ids)
+        .values_list("stage_id", "stage__chain_id")
+        .distinct()
+    ) if rank_ids else []
+    return AccessScope(
+        managed_campaign_ids=managed_campaign_ids,
+        managed_stage_ids=managed_stage_ids,
+        rank_ids=rank_ids,
+        rank_campaign_ids=frozenset(
+            campaign_id for _, campaign_id in ranks if campaign_id),
+        rank_stage_ids=frozenset(stage_id for stage_id, _ in rank_stages),
+        rank_chain_ids=frozenset(chain_id for _, chain_id in rank_stages),
+    )
+
+
+def get_access_scope(user):
+    """Returns ids the access policies scope querysets of the user by:
+    managed campaigns and their task stages, ranks of the user, campaigns
+    of these ranks and stages and chains their rank limits open. Cached
+    per user and versions of the scope, which are checked in the database
+    on every call, so management, ranks, rank limits or stages changed
+    by any process, django_q workers included, apply at once. If the
+    versions can't be read, the error is raised and access is denied.
+    """
+    if not user.is_authenticated:
+        return EMPTY_SCOPE
+    key = SCOPE_KEY.format(user.id, *get_versions(
+        [VERSION_KEY, USER_VERSION_KEY.format(user.id)]))
+    scope = cache.get(key)
+    if scope is None:
+        scope = build_access_scope(user.id)
+        cache.set(key, scope, settings.ACCESS_SCOPE_MAX_AGE)
+    return scope
+
+
+def invalidate_access_scopes(user_ids=None):
+    """Drops cached access scopes of the users, of all users if no ids
+    are given. Versions are bumped in the current transaction, so other
+    processes see them with the change.
+    """
+    if user_ids is None:
+        bump_versions([VERSION_KEY])
+        return
+    bump_versions([USER_VERSION_KEY.format(user_id) for user_id in user_ids])
+
+
+class UserAccessContext:
+    """Access data of the user of one request, loaded on first use and
+    shared by the policies, utils and views handling the request, so
+    ranks, rank limits and managed campaigns are queried at most once.
+    """
+
+    def __init__(self, user):
+        self.user = user
+
+    @cached_property
+    def scope(self):
+        return get_access_scope(self.user)
+
+    @property
+    def rank_ids(self):
+        return self.scope.rank_ids
+
+    @property
+    def managed_campaign_ids(self):
+        return self.scope.managed_campaign_ids
+
+    def is_manager(self, campaign_id):
+        return campaign_id in self.managed_campaign_ids
+
+    @cached_property
+    def rank_limits_by_stage(self):
+        rank_limits = {}
+        if not self.rank_ids:
+            return rank_limits
+        for rank_limit in RankLimit.objects.filter(rank_id__in=self.rank_ids):
+            rank_limits.setdefault(rank_limit.stage_id, []).append(rank_limit)
+        return rank_limits
+
+    def get_rank_limits(self, stage_id):
+        """Returns rank limits of the stage for ranks of the user."""
+        return self.rank_limits_by_stage.get(stage_id, [])
+
+    @cached_property
+    def highest_rank_ids(self):
+        """Ids of the highest priority ranks of tracks the user has a rank
+        in, as CustomUser.get_highest_ranks_by_track.
+        """
+        if not self.rank_ids:
+            return frozenset()
+        return frozenset(
+            Rank.objects
+            .filter(track__ranks__id__in=self.rank_ids)
+            .order_by("track_id", "-priority")
+            .distinct("track_id")
+            .values_list("id", flat=True)
+        )
+
+    @cached_property
+    def selectable_stage_ids(self):
+        """Stages where the user may select tasks, whatever their
+        DatetimeSort windows.
+        """
+        if not self.user.is_authenticated:
+            return frozenset()
+        return frozenset(stage_id for stage_id, _, _
+                         in get_selectable_stage_windows(self.user))
+
+
+def get_user_access_context(request):
+    """Returns UserAccessContext of the request user, built on first
+    call during the request.
+    """
+    http_request = getattr(request, "_request", request)
+    context = getattr(http_request, "user_access_context", None)
+    if context is None or context.user is not request.user:
+        context = UserAccessContext(request.user)
+        http_request.user_access_context = context
+    return context
@@ -0,0 +1,121 @@
+import json
+import threading
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django_q.tasks import async_task
+
+from api.models import Log
+
+_local = threading.local()
+
+
+class LogBatch:
+    """Logs added during one transaction, written together after it
+    commits. Logs of a rolled back transaction are dropped with it.
+    """
+
+    def __init__(self):
+        self.logs = []
+
+    def flush(self):
+        if getattr(_local, "batch", None) is self:
+            _local.batch = None
+        if not self.logs:
+            return
+        if getattr(settings, "AUDIT_LOG_ASYNC", False):
+            async_task(write_logs, self.logs, task_name="write_logs",
+                       group="audit")
+        else:
+            write_logs(self.logs)
+
+
+def is_pending(batch):
+    connection = transaction.get_connection()
+    return connection.in_atomic_block and any(
+        item[1] == batch.flush for item in connection.run_on_commit
+    )
+
+
+def add_log(log):
+    """Schedules log to be written when current transaction commits.
+    Log should reference related objects by ids only, so the batch
+    stays cheap to send to the django_q cluster.
+    """
+    batch = getattr(_local, "batch", None)
+    if batch is not None and is_pending(batch):
+        batch.logs.append(log)
+        return
+    batch = LogBatch()
+    batch.logs.append(log)
+    _local.batch = batch
+    transaction.on_commit(batch.flush)
+
+
+def write_logs(logs):
+    Log.objects.bulk_create(logs)
+
+
+def to_json(data):
+    return json.loads(json.dumps(data, cls=DjangoJSONEncoder))
+
+
+class JsonSnapshot:
+    """Dict or list as it was loaded, kept as JSON text. Dumping is much
+    cheaper than a deep copy and in-place changes of the value don't
+    reach the snapshot.
+    """
+    __slots__ = ["text"]
+
+    def __init__(self, value):
+        self.text = self.dump(value)
+
+    @staticmethod
+    def dump(value):
+        return json.dumps(value, cls=DjangoJSONEncoder, sort_keys=True)
+
+    def load(self):
+        return json.loads(self.text)
+
+    def matches(self, value):
+        return isinstance(value, (dict, list)) and self.dump(value) == self.text
+
+
+def snapshot(value):
+    """Returns value to remember as loaded. Dicts and lists are
+    snapshotted, other values are immutable and kept as they are.
+    """
+    if isinstance(value, (dict, list)):
+        return JsonSnapshot(value)
+    return value
+
+
+def load_snapshot(value):
+    return value.load() if isinstance(value, JsonSnapshot) else value
+
+
+def is_changed(loaded, value):
+    if isinstance(loaded, JsonSnapshot):
+        return not loaded.matches(value)
+    return loaded != value
+
+
+def track_fields(instance, fields):
+    """Remembers values of the fields as loaded, so changes can be found
+    on save without fetching the row again. Values are kept in the
+    model state so they don't show up among the instance attributes.
+    """
+    instance._state.loaded_fields = {
+        field: snapshot(instance.__dict__[field])
+        for field in fields if field in instance.__dict__
+    }
+
+
+def get_changed_fields(instance):
+    loaded = getattr(instance._state, "loaded_fields", {})
+    return {
+        field: (load_snapshot(value), instance.__dict__.get(field))
+        for field, value in loaded.items()
+        if is_changed(value, instance.__dict__.get(field))
+    }
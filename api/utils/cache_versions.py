@@ -0,0 +1,33 @@
+from django.db import connection
+
+from api.models import CacheVersion
+
+BUMP_VERSIONS_SQL = """
+INSERT INTO api_cacheversion (key, version)
+SELECT unnest(%s::varchar[]), 1
+ON CONFLICT (key) DO UPDATE SET version = api_cacheversion.version + 1
+"""
+
+
+def get_versions(keys):
+    """Returns versions of the keys with one indexed lookup. Keys never
+    bumped have version 0.
+    """
+    versions = dict(CacheVersion.objects.filter(key__in=keys)
+                    .values_list("key", "version"))
+    return [versions.get(key, 0) for key in keys]
+
+
+def get_version(key):
+    return get_versions([key])[0]
+
+
+def bump_versions(keys):
+    """Increments versions of the keys. Keys are locked in the same order
+    by every transaction, so concurrent bumps don't deadlock.
+    """
+    keys = sorted(set(keys))
+    if not keys:
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(BUMP_VERSIONS_SQL, [keys])
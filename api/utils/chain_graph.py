@@ -0,0 +1,197 @@
+from django.db.models import Q
+
+from api.models import (
+    Stage, TaskStage, ConditionalStage, CopyField, CountTasksModifier,
+    DatetimeSort, TaskAward, AutoNotification
+)
+from api.utils.cache_versions import bump_versions, get_versions as \
+    get_key_versions
+
+VERSION_KEY = "chain_graph:{}"
+
+# Compiled graphs of this process: chain id -> ChainGraph.
+_graphs = {}
+
+
+class StageNode:
+    """Structure of the chain around a single stage that the propagation
+    engine needs on task completion.
+    """
+
+    def __init__(self, stage):
+        self.stage = stage
+        self.in_stage_ids = []
+        self.out_task_stages = []
+        self.out_conditional_stages = []
+        self.out_conditional_limit_stages = []
+        self.in_pingpong_stages = []
+        self.copy_fields = []
+        self.count_tasks_modifiers = []
+        self.datetime_sort = None
+        self.task_awards = []
+        self.auto_notifications = []
+
+    def get_auto_notifications(self, go):
+        return [i for i in self.auto_notifications if i.go == go]
+
+    def freeze(self):
+        """Turns lists of the node into tuples once the graph is built,
+        since nodes are shared by every caller of get_stage_node.
+        """
+        for name, value in vars(self).items():
+            if isinstance(value, list):
+                setattr(self, name, tuple(value))
+
+
+class ChainGraph:
+    """Compiled structure of a chain, built from a fixed number of queries.
+    Stages of other chains connected to this chain are included as
+    neighbours, but only stages of this chain get their own nodes.
+    """
+
+    def __init__(self, chain_id, version):
+        self.chain_id = chain_id
+        self.version = version
+        self.nodes = {}
+
+    @classmethod
+    def build(cls, chain_id, version):
+        graph = cls(chain_id, version)
+
+        edges = list(
+            Stage.in_stages.through.objects
+            .filter(Q(from_stage__chain_id=chain_id)
+                    | Q(to_stage__chain_id=chain_id))
+            .values_list("to_stage_id", "from_stage_id")
+        )
+        neighbours = {i for edge in edges for i in edge}
+        in_graph = Q(chain_id=chain_id) | Q(id__in=neighbours)
+
+        stages = {}
+        task_stages = TaskStage.objects.filter(in_graph).select_related(
+            "chain__campaign", "webhook", "integration",
+            "translation_adapter", "previous_manual_to_assign"
+        ).order_by("id")
+        for stage in task_stages:
+            stages[stage.id] = stage
+        conditional_stages = ConditionalStage.objects.filter(in_graph) \
+            .select_related("chain__campaign", "conditional_limit") \
+            .order_by("id")
+        for stage in conditional_stages:
+            stages[stage.id] = stage
+
+        for stage in stages.values():
+            if stage.chain_id == chain_id:
+                graph.nodes[stage.id] = StageNode(stage)
+
+        for in_id, out_id in sorted(edges, key=lambda edge: edge[1]):
+            out_stage = stages.get(out_id)
+            if out_id in graph.nodes:
+                graph.nodes[out_id].in_stage_ids.append(in_id)
+                in_stage = stages.get(in_id)
+                if isinstance(in_stage, ConditionalStage) \
+                        and in_stage.pingpong:
+                    graph.nodes[out_id].in_pingpong_stages.append(in_stage)
+            if in_id not in graph.nodes or out_stage is None:
+                continue
+            node = graph.nodes[in_id]
+            if isinstance(out_stage, TaskStage):
+                node.out_task_stages.append(out_stage)
+            elif hasattr(out_stage, "conditional_limit"):
+                node.out_conditional_limit_stages.append(out_stage)
+            else:
+                node.out_conditional_stages.append(out_stage)
+
+        for node in graph.nodes.values():
+            node.out_conditional_limit_stages.sort(
+                key=lambda s: (s.conditional_limit.order,
+                               s.conditional_limit.created_at)
+            )
+
+        copy_fields = CopyField.objects \
+            .filter(task_stage__chain_id=chain_id) \
+            .select_related("task_stage__chain__campaign",
+                            "copy_from_stage__chain__campaign") \
+            .order_by("id")
+        for copy_field in copy_fields:
+            graph.nodes[copy_field.task_stage_id].copy_fields \
+                .append(copy_field)
+
+        modifiers = CountTasksModifier.objects \
+            .filter(task_stage__chain_id=chain_id).order_by("id")
+        for modifier in modifiers:
+            graph.nodes[modifier.task_stage_id].count_tasks_modifiers \
+                .append(modifier)
+
+        for datetime_sort in DatetimeSort.objects.filter(
+                stage__chain_id=chain_id):
+            if datetime_sort.stage_id in graph.nodes:
+                graph.nodes[datetime_sort.stage_id].datetime_sort = \
+                    datetime_sort
+
+        task_awards = TaskAward.objects \
+            .filter(task_stage_verified__chain_id=chain_id).order_by("id")
+        for task_award in task_awards:
+            graph.nodes[task_award.task_stage_verified_id].task_awards \
+                .append(task_award)
+
+        auto_notifications = AutoNotification.objects \
+            .filter(trigger_stage__chain_id=chain_id) \
+            .select_related("recipient_stage").order_by("id")
+        for auto_notification in auto_notifications:
+            graph.nodes[auto_notification.trigger_stage_id] \
+                .auto_notifications.append(auto_notification)
+
+        for node in graph.nodes.values():
+            node.freeze()
+        return graph
+
+
+def get_versions(chain_ids):
+    """Returns graph versions of the chains by chain id, read with one
+    query.
+    """
+    return dict(zip(chain_ids, get_key_versions(
+        [VERSION_KEY.format(chain_id) for chain_id in chain_ids])))
+
+
+def get_version(chain_id):
+    return get_versions([chain_id])[chain_id]
+
+
+def get_chain_graph(chain_id):
+    """Returns compiled graph of the chain, building it again once the
+    version of the chain changes. Versions are kept in the database, see
+    api.utils.cache_versions, so edits made by any process are seen by
+    the next propagation of every other process.
+    """
+    version = get_version(chain_id)
+    graph = _graphs.get(chain_id)
+    if graph is None or graph.version != version:
+        graph = ChainGraph.build(chain_id, version)
+        _graphs[chain_id] = graph
+    return graph
+
+
+def get_stage_node(stage):
+    """Returns node of the stage. Nodes and the instances in them are
+    shared by all callers, read them without changing.
+    """
+    node = get_chain_graph(stage.chain_id).nodes.get(stage.id)
+    if node is None:
+        invalidate_chain_graphs([stage.chain_id])
+        node = get_chain_graph(stage.chain_id).nodes[stage.id]
+    return node
+
+
+def invalidate_chain_graphs(chain_ids):
+    chain_ids = set(chain_ids)
+    bump_versions([VERSION_KEY.format(chain_id) for chain_id in chain_ids])
+    for chain_id in chain_ids:
+        _graphs.pop(chain_id, None)
+
+
+def invalidate_stage_graphs(stage_ids):
+    chain_ids = Stage.objects.filter(id__in=stage_ids) \
+        .values_list("chain_id", flat=True).distinct()
+    invalidate_chain_graphs(chain_ids)
@@ -0,0 +1,177 @@
+from django.contrib.postgres.aggregates import ArrayAgg
+from django.db.models import OuterRef
+
+from api.constans import ChainConstants
+from api.models import Stage, TaskStage, ConditionalStage
+from api.utils.chain_graph import get_version
+from api.utils.django_expressions import ArraySubquery
+
+# Layouts of this process: chain id -> ChainLayout.
+_layouts = {}
+
+
+def calculate_in_stages(stages, conditionals):
+    """Sets in_stages of the stages to the stages and conditionals
+    pointing to them, in the order of stages followed by conditionals.
+    """
+    in_stages = {stage["id"]: [] for stage in stages}
+    for other in stages + conditionals:
+        for out_id in dict.fromkeys(other["out_stages"]):
+            if out_id in in_stages and out_id != other["id"]:
+                in_stages[out_id].append(other["id"])
+    for stage in stages:
+        stage["in_stages"] = in_stages[stage["id"]]
+    return stages
+
+
+def next_to_conditionals(stage_id, nodes):
+    """Returns out stages of the node with conditionals replaced by
+    their own out stages. Conditionals looping back into themselves are
+    not expanded again.
+    """
+    result = []
+    frames = [iter(nodes[stage_id]["out_stages"])]
+    path = [stage_id]
+    while frames:
+        for out_stage_id in frames[-1]:
+            if out_stage_id is None:
+                continue
+            if nodes[out_stage_id].get("type", None) != "COND":
+                result.append(out_stage_id)
+                continue
+            if out_stage_id not in path:
+                frames.append(iter(nodes[out_stage_id]["out_stages"]))
+                path.append(out_stage_id)
+                break
+        else:
+            frames.pop()
+            path.pop()
+    return result
+
+
+def find_order(node, visited, stack, nodes):
+    """Depth first walk from the node pushing every stage after the
+    stages following it.
+    """
+    visited[node["id"]] = True
+    frames = [(node, iter(node["out_stages"]))]
+    while frames:
+        current, neighbors = frames[-1]
+        for neighbor in neighbors:
+            if neighbor is None:
+                continue
+            if not visited[neighbor]:
+                visited[neighbor] = True
+                frames.append((nodes[neighbor],
+                               iter(nodes[neighbor]["out_stages"])))
+                break
+            stack.append(neighbor)
+        else:
+            frames.pop()
+            if frames:
+                stack.append(current["id"])
+
+
+def order_by_graph_flow(stages, conditionals):
+    nodes = {i["id"]: i for i in stages}
+    for node in conditionals:
+        nodes[node["id"]] = node
+        nodes[node["id"]]["type"] = "COND"
+
+    out_stages = {key: next_to_conditionals(key, nodes) for key in nodes}
+    for key, value in out_stages.items():
+        nodes[key]["out_stages"] = value
+
+    ts_nodes = {i["id"]: nodes[i["id"]] for i in stages}
+
+    first_stage = [i for i in nodes.values() if i["in_stages"] == [None]]
+    if not first_stage:
+        return stages
+    first_stage = first_stage[0]
+
+    visited = {node_id: False for node_id in ts_nodes.keys()}
+    stack = []
+    find_order(first_stage, visited, stack, ts_nodes)
+    stack.append(first_stage["id"])
+
+    return [nodes[i] for i in stack[::-1] if i in ts_nodes]
+
+
+def order_by_order(stages):
+    return sorted(stages, key=lambda x: x["order"])
+
+
+class ChainLayout:
+    """Stages of an individual chain with their in and out stages, in the
+    order they are listed in ChainViewSet.individuals. Layouts are built
+    from the stage structure only and are shared by all users.
+    """
+
+    def __init__(self, chain_id, version, stages, conditionals):
+        self.chain_id = chain_id
+        self.version = version
+        self.stages = stages
+        self.conditionals = conditionals
+        self.orderings = {}
+
+    @classmethod
+    def build(cls, chain_id, version):
+        stages = TaskStage.objects.filter(chain_id=chain_id).annotate(
+            all_out_stages=ArraySubquery(
+                Stage.objects.filter(in_stages=OuterRef("id"))
+                .values_list("id", flat=True)
+            )
+        ).order_by("id").values(
+            "id", "name", "order", "skip_empty_individual_tasks",
+            "assign_user_by", "all_out_stages"
+        )
+        conditionals = ConditionalStage.objects.filter(
+            chain_id=chain_id
+        ).annotate(
+            all_out_stages=ArrayAgg("out_stages", distinct=True),
+            all_in_stages=ArrayAgg("in_stages", distinct=True),
+        ).order_by("id").values("id", "all_out_stages", "all_in_stages")
+        return cls(
+            chain_id, version,
+            [{"id": i["id"],
+              "name": i["name"],
+              "order": i["order"],
+              "skip_empty_individual_tasks":
+                  i["skip_empty_individual_tasks"],
+              "assign_type": i["assign_user_by"],
+              "out_stages": i["all_out_stages"]} for i in stages],
+            [{"id": i["id"],
+              "out_stages": i["all_out_stages"],
+              "in_stages": i["all_in_stages"]} for i in conditionals],
+        )
+
+    def get_stages(self, order_type):
+        """Returns stages ordered for order_in_individuals of the chain.
+        Returned dicts are shared, copy them before changing.
+        """
+        if order_type not in self.orderings:
+            stages = calculate_in_stages(
+                [dict(i) for i in self.stages],
+                [dict(i) for i in self.conditionals]
+            )
+            if order_type == ChainConstants.GRAPH_FLOW:
+                stages = order_by_graph_flow(
+                    stages, [dict(i) for i in self.conditionals])
+            elif order_type == ChainConstants.ORDER:
+                stages = order_by_order(stages)
+            self.orderings[order_type] = stages
+        return self.orderings[order_type]
+
+
+def get_chain_layout(chain_id, version=None):
+    """Returns layout of the chain, rebuilding it once the chain graph
+    version of the chain changes, see api.utils.chain_graph. The version
+    is read from the database unless the caller already has it.
+    """
+    if version is None:
+        version = get_version(chain_id)
+    layout = _layouts.get(chain_id)
+    if layout is None or layout.version != version:
+        layout = ChainLayout.build(chain_id, version)
+        _layouts[chain_id] = layout
+    return layout
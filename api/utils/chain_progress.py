@@ -0,0 +1,118 @@
+from django.db import transaction
+from django.db.models import OuterRef, Exists
+from django.db.models.functions import JSONObject
+
+from api.models import Chain, ChainProgress, TaskStage, Task
+from api.utils.chain_graph import get_versions
+from api.utils.django_expressions import ArraySubquery
+
+
+def build_chain_progress(user_id, chain_ids):
+    """Returns ids of the user's tasks on the stages of the chains and
+    whether the user completed the chain, by chain id. The stages
+    themselves are laid out by api.utils.chain_layout.
+    """
+    user_tasks = Task.objects.filter(assignee_id=user_id,
+                                     stage_id=OuterRef("id"))
+    task_stages = TaskStage.objects.filter(
+        Exists(user_tasks), chain=OuterRef("id")
+    ).annotate(
+        completed=ArraySubquery(
+            user_tasks.filter(complete=True).values_list("id", flat=True)),
+        opened=ArraySubquery(
+            user_tasks.filter(complete=False).values_list("id", flat=True)),
+        reopened=ArraySubquery(
+            user_tasks.filter(complete=False, reopened=True)
+            .values_list("id", flat=True)),
+    )
+    incomplete_required_stages = TaskStage.objects.filter(
+        chain=OuterRef("id"),
+        complete_individual_chain=True
+    ).exclude(
+        id__in=Task.objects.filter(assignee_id=user_id, complete=True)
+        .values("stage_id")
+    )
+    chains = Chain.objects.filter(id__in=chain_ids).values("id").annotate(
+        data=ArraySubquery(
+            task_stages.values(
+                info=JSONObject(
+                    id="id",
+                    completed="completed",
+                    opened="opened",
+                    reopened="reopened",
+                )
+            )
+        ),
+        complete=~Exists(incomplete_required_stages),
+    )
+    return {i.pop("id"): i for i in chains}
+
+
+def get_chain_progress(user, chain_ids):
+    """Returns ChainProgress of the user on the chains by chain id.
+    Missing and stale snapshots are rebuilt with one query, the others
+    are read as they are.
+    """
+    progress = {
+        i.chain_id: i for i in
+        ChainProgress.objects.filter(user=user, chain_id__in=chain_ids)
+    }
+    outdated = [i for i in chain_ids
+                if i not in progress or progress[i].stale]
+    if not outdated:
+        return progress
+
+    with transaction.atomic():
+        ChainProgress.objects.bulk_create(
+            [ChainProgress(user=user, chain_id=i) for i in outdated
+             if i not in progress],
+            ignore_conflicts=True
+        )
+        # Locked rows can only be marked stale again after the rebuilt
+        # snapshots are committed, so no task change is missed.
+        rows = list(ChainProgress.objects.select_for_update()
+                    .filter(user=user, chain_id__in=outdated))
+        snapshots = build_chain_progress(user.id, [i.chain_id for i in rows])
+        for row in rows:
+            snapshot = snapshots.get(row.chain_id)
+            if snapshot is None:
+                continue
+            changed = [field for field, value in snapshot.items()
+                       if getattr(row, field) != value]
+            if changed:
+                for field in changed:
+                    setattr(row, field, snapshot[field])
+                row.version += 1
+            row.stale = False
+            progress[row.chain_id] = row
+        ChainProgress.objects.bulk_update(
+            rows, ["data", "complete", "stale", "version", "updated_at"]
+        )
+    return progress
+
+
+def attach_chain_progress(request, chains):
+    """Adds ChainProgress of the request user and chain layout version
+    to the chain rows of a page of ChainViewSet.individuals, so they are
+    served by ChainIndividualsListSerializer without querying them again.
+    Returns the versions the page is rendered from, its ETag is computed
+    from them before the page is serialized.
+    """
+    chain_ids = [chain["id"] for chain in chains]
+    progress = get_chain_progress(request.user, chain_ids) \
+        if chain_ids else {}
+    layout_versions = get_versions(chain_ids) if chain_ids else {}
+    versions = []
+    for chain in chains:
+        versions.append((sorted(chain.items()),
+                         progress[chain["id"]].version,
+                         layout_versions[chain["id"]]))
+        chain["progress"] = progress[chain["id"]]
+        chain["layout_version"] = layout_versions[chain["id"]]
+    return versions
+
+
+def invalidate_chain_progress(chain_ids):
+    """Marks snapshots of all users on the chains stale."""
+    ChainProgress.objects.filter(chain_id__in=chain_ids, stale=False) \
+        .update(stale=True)
@@ -0,0 +1,106 @@
+import base64
+import binascii
+import json
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from rest_framework import status
+
+from api.api_exceptions import CustomApiException
+from api.constans import ErrorConstants, TaskChangeFeedConstants
+from api.models import TaskTombstone
+
+# Id of the oldest transaction still running when the page is read.
+# Transactions with lower ids are finished, so no change of theirs can
+# appear behind the cursor any more.
+HORIZON_SQL = "SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint"
+
+# Transaction id column of api_task, created by migration 0138. It is not
+# a field of Task, so it is read as an annotation.
+TASK_CHANGE_XID = RawSQL('"api_task"."change_xid"', [])
+
+
+def encode_cursor(xid, pk):
+    data = json.dumps([xid, pk])
+    return base64.urlsafe_b64encode(data.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Returns transaction id and id the cursor points after."""
+    try:
+        xid, pk = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if not isinstance(xid, int) or not isinstance(pk, int):
+            raise ValueError
+    except (binascii.Error, TypeError, ValueError):
+        raise CustomApiException(status.HTTP_400_BAD_REQUEST,
+                                 ErrorConstants.INVALID_CURSOR)
+    return xid, pk
+
+
+def get_horizon():
+    with connection.cursor() as cursor:
+        cursor.execute(HORIZON_SQL)
+        return cursor.fetchone()[0]
+
+
+def parse_limit(value):
+    try:
+        limit = int(value) if value else TaskChangeFeedConstants.DEFAULT_LIMIT
+    except ValueError:
+        raise CustomApiException(
+            status.HTTP_400_BAD_REQUEST,
+            ErrorConstants.UNSUPPORTED_TYPE % value
+        )
+    return min(max(limit, 1), TaskChangeFeedConstants.MAX_LIMIT)
+
+
+def after(queryset, id_field, since, horizon):
+    """Returns first rows of the queryset written by transactions after
+    the cursor and before the horizon, ordered by transaction id and id.
+    """
+    queryset = queryset.filter(change_xid__lt=horizon)
+    if since is not None:
+        xid, pk = since
+        queryset = queryset.filter(
+            Q(change_xid__gt=xid) | Q(change_xid=xid, **{f"{id_field}__gt": pk})
+        )
+    return queryset.order_by("change_xid", id_field)
+
+
+def get_changes(tasks, tombstones, cursor=None, limit=None):
+    """Returns tasks changed and tombstones of tasks deleted after the
+    cursor, at most limit of them together in the order of the ids of
+    the transactions that wrote them, the cursor of the next page and
+    whether more changes are ready.
+
+    Changes of transactions still running and of all transactions
+    started after the oldest of them are left for later pages, so a long
+    transaction can't commit changes behind the cursor. Ids of
+    transactions don't depend on clocks.
+    """
+    since = decode_cursor(cursor) if cursor else None
+    limit = parse_limit(limit)
+    horizon = get_horizon()
+
+    tasks = tasks.annotate(change_xid=TASK_CHANGE_XID)
+    changes = [
+        ((task.__dict__.pop("change_xid"), task.id), task)
+        for task in after(tasks, "id", since, horizon)[:limit + 1]
+    ]
+    changes += [
+        ((tombstone.change_xid, tombstone.task_id), tombstone)
+        for tombstone in after(tombstones, "task_id", since,
+                               horizon)[:limit + 1]
+    ]
+    changes.sort(key=lambda change: change[0])
+
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+    if changes:
+        cursor = encode_cursor(*changes[-1][0])
+
+    changed = [obj for key, obj in changes
+               if not isinstance(obj, TaskTombstone)]
+    deleted = [obj for key, obj in changes if isinstance(obj, TaskTombstone)]
+    return changed, deleted, cursor, has_more
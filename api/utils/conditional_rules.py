@@ -0,0 +1,131 @@
+import copy
+import json
+import sys
+import traceback
+
+from rest_framework import status
+
+from api.api_exceptions import CustomApiException
+from api.constans import ConditionalStageConstants, ErrorConstants
+
+# Compiled conditions of this process: stage id -> CompiledConditions.
+_compiled = {}
+
+
+def raise_invalid_conditions(stage, type_, data):
+    exc_type, value, tb = sys.exc_info()
+    stage.generate_error(
+        exc_type=exc_type,
+        details=f"Invalid conditions in conditional stage {stage.id}",
+        tb=tb, tb_info=traceback.format_exc(),
+        data=json.dumps(data)
+    )
+    raise CustomApiException(status.HTTP_400_BAD_REQUEST,
+                             f'{ErrorConstants.UNSUPPORTED_TYPE % type_} {ErrorConstants.SEND_TO_MODERATORS}')
+
+
+class CompiledRule:
+    """Single condition of a ConditionalStage with its type, operator and
+    control value resolved once.
+    """
+
+    def __init__(self, rule, operator, control_value, path):
+        self.rule = rule
+        self.type = rule.get("type") if rule.get("type") else "string"
+        self.operator = operator
+        self.control_value = control_value
+        self.path = path
+
+    def get_value(self, responses):
+        result = responses
+        for field in self.path:
+            try:
+                result = result[field]
+            except KeyError:
+                return None
+        return result
+
+    def check(self, actual_value):
+        return self.operator(self.control_value, actual_value)
+
+
+class CompiledConditions:
+    """Conditions of a ConditionalStage compiled into predicates. Rules
+    are validated while compiling, so evaluation only reads responses.
+    """
+
+    def __init__(self, stage, rules):
+        self.stage_id = stage.id
+        self.conditions = copy.deepcopy(stage.conditions)
+        self.rules = rules
+
+    @classmethod
+    def compile(cls, stage):
+        conditions = stage.conditions if stage.conditions else []
+        rules = []
+        for rule in conditions:
+            type_ = rule.get("type") if rule.get("type") else "string"
+            cast = ConditionalStageConstants.SUPPORTED_TYPES.get(type_)
+            if not cast:
+                stage.generate_error(
+                    exc_type=ValueError,
+                    details=f"Invalid type {type_} provided on conditional stage {stage.id}",
+                    tb=None, tb_info="".join(traceback.format_stack()),
+                    data=f"{conditions}\n{rule}"
+                )
+                raise CustomApiException(status.HTTP_400_BAD_REQUEST,
+                                         f'{ErrorConstants.UNSUPPORTED_TYPE % type_} {ErrorConstants.SEND_TO_MODERATORS}')
+            try:
+                operator = ConditionalStageConstants.OPERATORS[
+                    rule.get("condition")]
+                control_value = cast(rule.get("value"))
+                path = tuple(rule.get("field", "").split("."))
+            except Exception:
+                raise_invalid_conditions(stage, type_,
+                                         {"conditions": conditions})
+            rules.append(CompiledRule(rule, operator, control_value, path))
+        return cls(stage, rules)
+
+    def is_compiled_from(self, stage):
+        return self.conditions == stage.conditions
+
+    def evaluate(self, stage, responses, actual_value=None):
+        """Returns True if responses fit all the rules. If actual_value is
+        passed, it is compared instead of the values from responses.
+        """
+        for rule in self.rules:
+            value = actual_value if actual_value is not None \
+                else rule.get_value(responses)
+            try:
+                if not rule.check(value):
+                    return False
+            except Exception:
+                raise_invalid_conditions(
+                    stage, rule.type,
+                    {"responses": responses, "conditions": self.conditions}
+                )
+        return True
+
+    def evaluate_many(self, responses_list):
+        """Evaluates rules against each of responses in one pass. Responses
+        that are absent or can't be compared with the rules don't fit.
+        """
+        results = []
+        for responses in responses_list:
+            if responses is None:
+                results.append(False)
+                continue
+            try:
+                results.append(all(rule.check(rule.get_value(responses))
+                                   for rule in self.rules))
+            except Exception:
+                results.append(False)
+        return results
+
+
+def get_compiled_conditions(stage):
+    compiled = _compiled.get(stage.id)
+    if compiled is None or not compiled.is_compiled_from(stage):
+        compiled = CompiledConditions.compile(stage)
+        _compiled[stage.id] = compiled
+    return compiled
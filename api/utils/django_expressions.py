@@ -1,6 +1,6 @@
 from django.contrib.postgres.fields import ArrayField
 from django.core.exceptions import FieldError
-from django.db.models import Subquery
+from django.db.models import Subquery, IntegerField
 
 
 class ArraySubquery(Subquery):
@@ -14,3 +14,8 @@ class ArraySubquery(Subquery):
             raise FieldError('More than one column detected')
 
         return ArrayField(base_field=output_fields[0])
+
+
+class SubqueryCount(Subquery):
+    template = '(SELECT COUNT(*) FROM (%(subquery)s) _count)'
+    output_field = IntegerField()
@@ -0,0 +1,159 @@
+import hashlib
+import io
+import json
+import re
+import tempfile
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import get_storage_class
+from django.http import HttpRequest, HttpResponse, QueryDict, \
+    StreamingHttpResponse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.request import Request
+
+from api.constans import ExportJobConstants
+from api.models import ExportJob, ResponseFlattener
+from api.utils.flatten_sql import get_csv_chunks
+from api.utils.pagination import estimate_count
+from api.utils.utils import csv_chunks
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def get_export_storage():
+    backend = settings.EXPORT_STORAGE.get("BACKEND")
+    options = settings.EXPORT_STORAGE.get("OPTIONS", {})
+    return get_storage_class(backend)(**options)
+
+
+def get_fingerprint(kind, params, user_id=None):
+    normalized = json.dumps([kind, user_id, params], sort_keys=True,
+                            default=str)
+    return hashlib.sha256(normalized.encode()).hexdigest()
+
+
+def load_user_activity(job):
+    """Returns rows of the user activity export, filtered by the view
+    with the params and user of the job as they were for the request.
+    """
+    # Imported here, as views use this module.
+    from api.views import TaskViewSet
+
+    http_request = HttpRequest()
+    http_request.method = "GET"
+    http_request.GET = QueryDict(mutable=True)
+    http_request.GET.update(job.params)
+    request = Request(http_request)
+    request.user = job.user
+    view = TaskViewSet(request=request, action="user_activity_csv",
+                       format_kwarg=None, args=(), kwargs={})
+    return view.get_user_activity_groups()
+
+
+def get_export_chunks(job):
+    """Returns a generator of CSV text chunks of the export with count of
+    rows in every chunk, and estimated count of rows of the export.
+    """
+    if job.kind == ExportJobConstants.RESPONSE_FLATTENER:
+        flattener = ResponseFlattener.objects.select_related("task_stage") \
+            .get(id=job.params["response_flattener"])
+        chunks = get_csv_chunks(flattener, ExportJobConstants.CHUNK_SIZE)
+        return chunks, estimate_count(flattener.task_stage.tasks.all())
+
+    queryset = load_user_activity(job)
+    rows = queryset.iterator(chunk_size=ExportJobConstants.CHUNK_SIZE)
+    chunks = csv_chunks(ExportJobConstants.USER_ACTIVITY_COLUMNS, rows,
+                        ExportJobConstants.CHUNK_SIZE)
+    return chunks, estimate_count(queryset)
+
+
+def write_export(job):
+    """Writes chunks of the export to a temporary file, saving progress
+    after every chunk, then moves the file to the export storage.
+    Returns name and size of the stored file.
+    """
+    chunks, total = get_export_chunks(job)
+    ExportJob.objects.filter(id=job.id).update(rows_total=total,
+                                               updated_at=timezone.now())
+
+    with tempfile.TemporaryFile() as tmp:
+        buffer = io.TextIOWrapper(tmp, encoding="utf-8", newline="")
+        rows_done = 0
+        for rows, text in chunks:
+            buffer.write(text)
+            if rows:
+                buffer.flush()
+                rows_done += rows
+                # Progress updates renew the lease of the job, see
+                # api.asyncstuff.expire_export_jobs.
+                ExportJob.objects.filter(id=job.id) \
+                    .update(rows_done=rows_done, updated_at=timezone.now())
+        buffer.flush()
+
+        size = tmp.tell()
+        tmp.seek(0)
+        name = get_export_storage().save(f"{job.id}/results.csv", File(tmp))
+        buffer.detach()
+    return name, size
+
+
+def parse_range(header, size):
+    """Returns first and last byte of a single bytes range, None if the
+    header is absent or not supported, or False if it can't be satisfied.
+    """
+    match = RANGE_RE.match(header or "")
+    if not match:
+        return None
+    start, end = match.groups()
+    if not start and not end:
+        return None
+    if not start:
+        start, end = max(size - int(end), 0), size - 1
+    else:
+        start = int(start)
+        end = min(int(end), size - 1) if end else size - 1
+    if start > end or start >= size:
+        return False
+    return start, end
+
+
+def read_chunks(file, length):
+    with file:
+        while length > 0:
+            chunk = file.read(min(ExportJobConstants.DOWNLOAD_CHUNK_SIZE,
+                                  length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def download_response(job, range_header=None):
+    """Returns file of the export, or the requested part of it if range
+    header asks for a single bytes range.
+    """
+    size = job.size
+    requested = parse_range(range_header, size)
+    if requested is False:
+        response = HttpResponse(
+            status=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+        response["Content-Range"] = f"bytes */{size}"
+        return response
+
+    start, end = requested or (0, size - 1)
+    file = get_export_storage().open(job.file, "rb")
+    file.seek(start)
+    response = StreamingHttpResponse(
+        read_chunks(file, end - start + 1),
+        status=status.HTTP_206_PARTIAL_CONTENT if requested
+        else status.HTTP_200_OK,
+        content_type="text/csv",
+    )
+    response["Content-Disposition"] = 'attachment; filename="results.csv"'
+    response["Content-Length"] = end - start + 1
+    response["Accept-Ranges"] = "bytes"
+    if requested:
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+    return response
@@ -0,0 +1,174 @@
+import json
+import re
+
+# Compiled plans of this process: flattener id -> FlattenPlan.
+_plans = {}
+
+FILE_URL = "https://storage.cloud.google.com/gigaturnip-b6b5b.appspot.com/"
+
+
+def customfile_value(result):
+    try:
+        file_path = json.loads(result)
+        files = []
+        for key, val in file_path.items():
+            result = FILE_URL + val + '?authuser=1'
+            files.append(result)
+        result = ", \n".join(files)
+    except:
+        result = "CAN'T_PARSE_JSON_ERROR" + result
+    return result
+
+
+def is_container(value):
+    return isinstance(value, dict) or isinstance(value, list)
+
+
+class PathAccessor:
+    """Column path of ResponseFlattener resolved into steps. The ui
+    schema of every level, the customfile widgets and the (i) and (r)
+    key searches are looked up once, so reading a value only walks the
+    responses.
+    """
+
+    def __init__(self, path, ui=None):
+        self.whole_key = None
+        self.search = None
+        self.search_rest = None
+        self.keys = []
+        self.customfile = []
+
+        steps_ui = ui
+        rest = path
+        while rest is not None:
+            paths = rest.split("__", 1)
+            current_key = paths[0]
+            next_key = paths[1] if len(paths) > 1 else None
+            current_ui = steps_ui.get(current_key) \
+                if isinstance(steps_ui, dict) and steps_ui else None
+            if "(i)" in current_key or "(r)" in current_key:
+                if not rest.startswith("("):
+                    self.whole_key = rest
+                else:
+                    self.compile_search(rest)
+                return
+            self.keys.append(current_key)
+            self.customfile.append(
+                isinstance(current_ui, dict)
+                and current_ui.get("ui:widget") == 'customfile'
+            )
+            steps_ui = current_ui
+            rest = next_key
+
+    def compile_search(self, path):
+        search_type = path[path.find("(") + 1: path.find(")")]
+        keys = path.split(")", 1)[1].split("__", 1)
+        key_to_find = keys[0]
+        if search_type == 'i':
+            self.search = lambda key: key_to_find in key and \
+                key_to_find != key
+        elif search_type == 'r':
+            pattern = re.compile(rf"{key_to_find}")
+            self.search = lambda key: pattern.search(key) is not None
+        else:
+            self.search = lambda key: False
+        self.search_rest = PathAccessor(keys[1]) if len(keys) > 1 else None
+
+    def get(self, responses):
+        for i, key in enumerate(self.keys):
+            result = responses.get(key, None)
+            if isinstance(result, dict):
+                responses = result
+                continue
+            if self.customfile[i]:
+                result = customfile_value(result)
+            return result
+
+        if self.whole_key is not None:
+            result = responses.get(self.whole_key, None)
+            return None if is_container(result) else result
+        if self.search is not None:
+            for key, value in responses.items():
+                if not self.search(key):
+                    continue
+                if not is_container(value):
+                    return value
+                if self.search_rest is None or isinstance(value, list):
+                    return None
+                return self.search_rest.get(value)
+        return None
+
+
+class FlattenPlan:
+    """ResponseFlattener compiled once for its settings and the schemas
+    of its stage. Flattening a task with the plan only reads values.
+    """
+
+    def __init__(self, flattener, key):
+        self.key = key
+        self.ui = json.loads(flattener.task_stage.get_ui_schema())
+        self.copy_first_level = flattener.copy_first_level
+        self.flatten_all = flattener.flatten_all
+        self.copy_system_fields = flattener.copy_system_fields
+        self.exclude = {i for i in flattener.exclude_list
+                        if isinstance(i, str)}
+        self.columns = [(path, PathAccessor(path, self.ui))
+                        for path in flattener.columns]
+        self.ordered_columns = None
+        self.accessors = {}
+
+    @staticmethod
+    def get_key(flattener):
+        stage = flattener.task_stage
+        return flattener.updated_at, \
+            hash((stage.json_schema, stage.ui_schema))
+
+    def get_ordered_columns(self, flattener):
+        if self.ordered_columns is None:
+            self.ordered_columns = flattener.ordered_columns()
+        return list(self.ordered_columns)
+
+    def get_accessor(self, path):
+        accessor = self.accessors.get(path)
+        if accessor is None:
+            accessor = PathAccessor(path, self.ui)
+            self.accessors[path] = accessor
+        return accessor
+
+    def flatten(self, flattener, task):
+        result = {"id": task.id}
+        responses = task.responses
+        if responses and not self.flatten_all:
+            if self.copy_first_level:
+                for key, value in responses.items():
+                    if key not in self.exclude and not is_container(value):
+                        result[key] = value
+            for path, accessor in self.columns:
+                value = accessor.get(responses)
+                if value:
+                    result[path] = value
+        elif self.flatten_all and responses:
+            for key, value in responses.items():
+                for path in flattener.get_all_pathes(key, value):
+                    path_value = self.get_accessor(path).get(responses)
+                    if path_value:
+                        result[path] = path_value
+        if self.copy_system_fields:
+            result.update(task.__dict__)
+            for unnecessary_key in ['_state', 'responses']:
+                del result[unnecessary_key]
+        return result
+
+
+def get_flatten_plan(flattener):
+    """Returns compiled plan of the flattener, compiling it again once
+    the flattener is saved or the schemas of its stage change.
+    """
+    key = FlattenPlan.get_key(flattener)
+    if flattener.id is None:
+        return FlattenPlan(flattener, key)
+    plan = _plans.get(flattener.id)
+    if plan is None or plan.key != key:
+        plan = FlattenPlan(flattener, key)
+        _plans[flattener.id] = plan
+    return plan
@@ -0,0 +1,282 @@
+import csv
+import io
+
+from django.db import connection
+
+from api.constans import ResponseFlattenerConstants
+from api.models import Task
+from api.utils.flatten_plan import get_flatten_plan
+from api.utils.utils import csv_chunks
+
+# Text the csv module writes for a jsonb scalar loaded by psycopg2:
+# empty strings and nulls are empty, booleans are True and False, and
+# numbers with a fraction are python floats, so 2.50 is written as 2.5
+# and 2.0 as 2.0. Floats from 1e15 to 1e16 are the exception, Postgres
+# writes them in the exponent notation, so they are flattened in Python,
+# see JSON_EXPONENT_FLOAT_SQL.
+JSON_TEXT_SQL = """CASE jsonb_typeof({0})
+    WHEN 'string' THEN NULLIF({0} #>> '{{}}', '')
+    WHEN 'boolean' THEN CASE WHEN {0} = 'true' THEN 'True' ELSE 'False' END
+    WHEN 'number' THEN CASE
+        WHEN {0} #>> '{{}}' ~ '^-?[0-9]+$' THEN {0} #>> '{{}}'
+        ELSE regexp_replace(({0} #>> '{{}}')::float8::text,
+                            '^(-?[0-9]+)$', '\\1.0')
+    END
+END"""
+
+# Numbers with a fraction from 1e15 to 1e16, which Postgres writes in the
+# exponent notation and Python doesn't.
+JSON_EXPONENT_FLOAT_SQL = """CASE WHEN jsonb_typeof({0}) = 'number'
+        AND {0} #>> '{{}}' !~ '^-?[0-9]+$'
+    THEN abs(({0} #>> '{{}}')::float8) >= 1e15
+        AND abs(({0} #>> '{{}}')::float8) < 1e16
+    ELSE false
+END"""
+
+# Values flatten_response copies for columns: non empty strings, non
+# zero numbers and true. Arrays are flattened in Python.
+JSON_TRUTHY_SQL = """CASE jsonb_typeof({0})
+    WHEN 'string' THEN {0} <> '""'
+    WHEN 'number' THEN ({0} #>> '{{}}')::numeric <> 0
+    WHEN 'boolean' THEN {0} = 'true'
+    ELSE false
+END"""
+
+DATETIME_TEXT_SQL = """to_char({0} AT TIME ZONE 'UTC', 'YYYY-MM-DD HH24:MI:SS')
+    || CASE WHEN to_char({0}, 'US') <> '000000'
+            THEN to_char({0}, '.US') ELSE '' END
+    || '+00:00'"""
+
+INTEGER_FIELDS = ["AutoField", "BigAutoField", "ForeignKey", "IntegerField",
+                  "BigIntegerField", "PositiveIntegerField",
+                  "SmallIntegerField"]
+
+# Last task id of every chunk of the stage.
+CHUNK_BOUNDS_SQL = """
+SELECT id
+FROM (
+    SELECT id, row_number() OVER (ORDER BY id) AS n
+    FROM api_task
+    WHERE stage_id = %s
+) tasks
+WHERE n %% %s = 0
+ORDER BY id
+"""
+
+
+def crlf_records(data):
+    """Ends records copied by Postgres with \\r\\n as the csv module does.
+    Line breaks inside quoted fields are left as they are.
+    """
+    lines = data.split("\n")
+    quoted = False
+    result = []
+    for line in lines[:-1]:
+        quoted ^= line.count('"') % 2 == 1
+        result.append(line + ("\n" if quoted else "\r\n"))
+    return "".join(result) + lines[-1]
+
+
+def system_field_sql(field):
+    """Returns SQL of the text the csv module writes for the field of the
+    task, None if the type of the field is not supported.
+    """
+    column = f't."{field.column}"'
+    field_type = field.get_internal_type()
+    if field_type in INTEGER_FIELDS:
+        return f"{column}::text"
+    if field_type == "BooleanField":
+        return f"CASE WHEN {column} THEN 'True' " \
+               f"WHEN NOT {column} THEN 'False' END"
+    if field_type == "DateTimeField":
+        return DATETIME_TEXT_SQL.format(column)
+    if field_type in ["CharField", "TextField"]:
+        return f"NULLIF({column}, '')"
+    if field_type == "JSONField":
+        # Only null values are copied, see CopyPlan.needs_python.
+        return "NULL"
+    return None
+
+
+def path_sql(keys):
+    """Returns SQL and params of the value PathAccessor.get finds at the
+    keys: the first value on the path that is not an object.
+    """
+    cases = []
+    params = []
+    for i in range(1, len(keys) + 1):
+        cases.append("WHEN jsonb_typeof(t.responses #> %s) "
+                     "IS DISTINCT FROM 'object' THEN t.responses #> %s")
+        params += [keys[:i], keys[:i]]
+    return "CASE " + " ".join(cases) + " END", params
+
+
+class CopyPlan:
+    """ResponseFlattener translated into a query of the CSV fields, so
+    Postgres writes the rows with COPY instead of tasks being flattened
+    in Python. Fields have the text the csv module writes for the values
+    flatten_response returns.
+    """
+
+    def __init__(self, flattener, columns, extra_columns, paths,
+                 system_fields):
+        self.stage_id = flattener.task_stage_id
+        self.columns = columns
+        self.description = ", ".join(extra_columns)
+        # Values read from responses once per task, selected by the
+        # lateral subquery as p.v0, p.v1...
+        self.values = []
+        self.python_checks = []
+        for field, sql in system_fields.values():
+            if field.get_internal_type() == "JSONField":
+                self.python_checks.append(
+                    (f't."{field.column}" IS NOT NULL AND '
+                     f'jsonb_typeof(t."{field.column}") <> \'null\'', []))
+
+        path_values = {}
+        for path, keys in paths.items():
+            sql, params = path_sql(keys)
+            path_values[path] = self.add_value(sql, params)
+            self.python_checks.append(
+                (f"jsonb_typeof({sql}) = 'array'", params))
+            self.add_exponent_float_check(sql, params)
+
+        exclude = {i for i in flattener.exclude_list if isinstance(i, str)}
+        self.select = []
+        for column in columns:
+            if column == ResponseFlattenerConstants.DESCRIPTION_COLUMN \
+                    and extra_columns:
+                self.select.append("CASE WHEN t.id = d.first_id "
+                                   "THEN d.description END")
+                continue
+            sql = "t.id::text" if column == "id" else "NULL"
+            if flattener.copy_first_level and column not in exclude:
+                value = self.add_value("t.responses -> %s", [column])
+                self.add_exponent_float_check("t.responses -> %s", [column])
+                sql = f"CASE WHEN jsonb_typeof({value}) IN " \
+                      f"('string', 'number', 'boolean', 'null') " \
+                      f"THEN {JSON_TEXT_SQL.format(value)} ELSE {sql} END"
+            if column in path_values:
+                value = path_values[column]
+                sql = f"CASE WHEN {JSON_TRUTHY_SQL.format(value)} " \
+                      f"THEN {JSON_TEXT_SQL.format(value)} ELSE {sql} END"
+            if column in system_fields:
+                sql = system_fields[column][1]
+            self.select.append(sql)
+
+    def add_value(self, sql, params):
+        self.values.append((sql, params))
+        return f"p.v{len(self.values) - 1}"
+
+    def add_exponent_float_check(self, sql, params):
+        check = JSON_EXPONENT_FLOAT_SQL.format(sql)
+        count = JSON_EXPONENT_FLOAT_SQL.count("{0}")
+        self.python_checks.append((check, params * count))
+
+    @classmethod
+    def compile(cls, flattener, columns, extra_columns):
+        """Returns plan of the flattener or None if it is flattened in
+        Python. flatten_all, (i) and (r) columns and paths through
+        customfile widgets are not translated.
+        """
+        if flattener.flatten_all:
+            return None
+        paths = {}
+        for path, accessor in get_flatten_plan(flattener).columns:
+            if accessor.whole_key is not None or accessor.search is not None \
+                    or any(accessor.customfile):
+                return None
+            paths[path] = accessor.keys
+
+        system_fields = {}
+        if flattener.copy_system_fields:
+            for field in Task._meta.concrete_fields:
+                if field.attname == "responses":
+                    continue
+                sql = system_field_sql(field)
+                if sql is None:
+                    return None
+                system_fields[field.attname] = (field, sql)
+        return cls(flattener, columns, extra_columns, paths, system_fields)
+
+    def needs_python(self):
+        """Returns whether some task of the stage has values the plan
+        doesn't copy: arrays in columns, floats Postgres writes in the
+        exponent notation or not null json system fields.
+        """
+        if not self.python_checks:
+            return False
+        conditions = " OR ".join(f"({sql})" for sql, _ in self.python_checks)
+        params = [self.stage_id]
+        for _, check_params in self.python_checks:
+            params += check_params
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT EXISTS (SELECT 1 FROM api_task t "
+                f"WHERE t.stage_id = %s AND ({conditions}))",
+                params
+            )
+            return cursor.fetchone()[0]
+
+    def get_query(self, after_id, last_id):
+        """Returns SQL and params of the fields of the tasks with ids
+        after after_id up to last_id.
+        """
+        sql = f"SELECT {', '.join(self.select)} FROM api_task t"
+        params = []
+        if self.values:
+            sql += " CROSS JOIN LATERAL (SELECT " + ", ".join(
+                f"{value} AS v{i}" for i, (value, _) in enumerate(self.values)
+            ) + ") p"
+            for _, value_params in self.values:
+                params += value_params
+        if self.description:
+            sql += " CROSS JOIN (SELECT min(id) AS first_id, " \
+                   "%s::text AS description " \
+                   "FROM api_task WHERE stage_id = %s) d"
+            params += [self.description, self.stage_id]
+        sql += " WHERE t.stage_id = %s AND t.id > %s"
+        params += [self.stage_id, after_id]
+        if last_id is not None:
+            sql += " AND t.id <= %s"
+            params.append(last_id)
+        return sql + " ORDER BY t.id", params
+
+    def chunks(self, chunk_size=ResponseFlattenerConstants.CHUNK_SIZE):
+        """Yields CSV text of tasks of the stage copied by Postgres, one
+        chunk at a time, with count of rows in every chunk. The first
+        chunk is the header.
+        """
+        header = io.StringIO()
+        csv.writer(header).writerow(self.columns)
+        yield 0, header.getvalue()
+
+        with connection.cursor() as cursor:
+            cursor.execute(CHUNK_BOUNDS_SQL, [self.stage_id, chunk_size])
+            bounds = [i[0] for i in cursor.fetchall()] + [None]
+
+        after_id = 0
+        for last_id in bounds:
+            buffer = io.StringIO()
+            with connection.cursor() as cursor:
+                query = cursor.mogrify(*self.get_query(after_id, last_id))
+                cursor.copy_expert(
+                    f"COPY ({query.decode()}) TO STDOUT WITH CSV", buffer)
+                rows = cursor.rowcount
+            yield rows, crlf_records(buffer.getvalue())
+            after_id = last_id
+
+
+def get_csv_chunks(flattener,
+                   chunk_size=ResponseFlattenerConstants.CHUNK_SIZE):
+    """Returns a generator of CSV text of tasks of the stage of the
+    flattener with count of rows in every chunk. Tasks are copied by
+    Postgres if the flattener translates to SQL and flattened in Python
+    otherwise.
+    """
+    columns, extra_columns = flattener.csv_columns()
+    plan = CopyPlan.compile(flattener, columns, extra_columns)
+    if plan is not None and not plan.needs_python():
+        return plan.chunks(chunk_size)
+    rows = flattener.flattened_rows(extra_columns, chunk_size)
+    return csv_chunks(columns, rows, chunk_size)
@@ -0,0 +1,277 @@
+import base64
+import hashlib
+import json
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+from django.db import connections
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework import status
+from rest_framework.pagination import BasePagination, LimitOffsetPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param, \
+    remove_query_param
+
+from api.api_exceptions import CustomApiException
+
+
+class CountStrategy:
+    EXACT = "exact"
+    ESTIMATE = "estimate"
+    CACHED = "cached"
+    ALL = [EXACT, ESTIMATE, CACHED]
+
+
+class CountingMixin:
+    """Counts rows of a page with the strategy asked by ?count_strategy=
+    or set as count_strategy on the view, PAGINATION_COUNT["strategy"] by
+    default. Requests without filters use unfiltered_count_strategy of
+    the view if it is set, estimates of filtered queries are unreliable.
+
+    exact: COUNT(*) of the queryset.
+    estimate: row estimate of the query planner. Estimates under
+        PAGINATION_COUNT["estimate_threshold"] are replaced by exact
+        counts, so only large scopes are approximated.
+    cached: exact count cached for PAGINATION_COUNT["cache_timeout"]
+        seconds per user, path and filters of the request.
+
+    Strategy actually used is returned as count_strategy.
+    """
+    count_strategy_query_param = "count_strategy"
+    ignored_query_params = ["limit", "offset", "cursor", "count_strategy",
+                            "with_count", "pagination", "ordering"]
+
+    def is_filtered(self, request):
+        return any(key not in self.ignored_query_params
+                   for key in request.query_params)
+
+    def get_count_strategy(self, request, view):
+        strategy = request.query_params.get(self.count_strategy_query_param)
+        if strategy is None:
+            strategy = getattr(view, "count_strategy",
+                               settings.PAGINATION_COUNT["strategy"])
+            if not self.is_filtered(request):
+                strategy = getattr(view, "unfiltered_count_strategy",
+                                   strategy)
+        if strategy not in CountStrategy.ALL:
+            raise CustomApiException(
+                status.HTTP_400_BAD_REQUEST,
+                f"{self.count_strategy_query_param} must be one of "
+                f"{', '.join(CountStrategy.ALL)}."
+            )
+        return strategy
+
+    def count_rows(self, queryset, request, view):
+        strategy = self.get_count_strategy(request, view)
+        if not hasattr(queryset, "query"):
+            strategy = CountStrategy.EXACT
+        if strategy == CountStrategy.ESTIMATE:
+            count = estimate_count(queryset)
+            if count >= settings.PAGINATION_COUNT["estimate_threshold"]:
+                return count, strategy
+            strategy = CountStrategy.EXACT
+        if strategy == CountStrategy.CACHED:
+            key = get_count_cache_key(request, self.ignored_query_params)
+            count = cache.get(key)
+            if count is not None:
+                return count, strategy
+            count = queryset.count()
+            cache.set(key, count, settings.PAGINATION_COUNT["cache_timeout"])
+            return count, CountStrategy.EXACT
+        if isinstance(queryset, list):
+            return len(queryset), CountStrategy.EXACT
+        return queryset.count(), CountStrategy.EXACT
+
+
+def estimate_count(queryset):
+    """Returns planner estimate of rows of the queryset."""
+    try:
+        sql, params = queryset.query.sql_with_params()
+    except EmptyResultSet:
+        return 0
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+def get_count_cache_key(request, ignored_query_params):
+    params = sorted(
+        (key, sorted(values))
+        for key, values in request.query_params.lists()
+        if key not in ignored_query_params
+    )
+    data = request.data if request.method == "POST" else None
+    normalized = json.dumps(
+        [request.user.id, request.path, params, data],
+        sort_keys=True, default=str
+    )
+    return "page_count:" + hashlib.md5(normalized.encode()).hexdigest()
+
+
+class CountingLimitOffsetPagination(CountingMixin, LimitOffsetPagination):
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.count, self.count_strategy = self.count_rows(queryset, request,
+                                                          view)
+        self.limit = self.get_limit(request)
+        if self.limit is None:
+            return None
+        self.offset = self.get_offset(request)
+        if self.count > self.limit and self.template is not None:
+            self.display_page_controls = True
+        if self.count == 0 or self.offset > self.count:
+            return []
+        return list(queryset[self.offset:self.offset + self.limit])
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ("count", self.count),
+            ("count_strategy", self.count_strategy),
+            ("next", self.get_next_link()),
+            ("previous", self.get_previous_link()),
+            ("results", data)
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        response = super().get_paginated_response_schema(schema)
+        response["properties"]["count_strategy"] = {
+            "type": "string",
+            "enum": CountStrategy.ALL,
+        }
+        return response
+
+
+class KeysetPagination(CountingMixin, BasePagination):
+    """Cursor pagination on (created_at, id) or (updated_at, id). Pages
+    are found by comparing with the last row of the previous page, so
+    deep pages cost the same as the first one and rows inserted while
+    paging don't shift pages. Rows whose updated_at changes while paging
+    by updated_at may move between pages.
+
+    Enabled by ?pagination=cursor, next pages are requested with the
+    cursor from the "next" link. Total count is only computed with
+    ?with_count=true, using the count strategy of CountingMixin.
+    """
+    mode_query_param = "pagination"
+    mode = "cursor"
+    cursor_query_param = "cursor"
+    ordering_query_param = "cursor_ordering"
+    orderings = ["-created_at", "created_at", "-updated_at", "updated_at"]
+    limit_query_param = "limit"
+    max_limit = 100
+    count_query_param = "with_count"
+
+    @classmethod
+    def is_requested(cls, request, queryset):
+        """Cursor mode needs plain ordering of the rows, so querysets with
+        DISTINCT ON are paginated the default way.
+        """
+        params = request.query_params
+        return (params.get(cls.mode_query_param) == cls.mode
+                or cls.cursor_query_param in params) \
+            and not queryset.query.distinct_fields
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.limit = self.get_limit(request)
+        self.ordering = self.get_ordering(request)
+        field = self.ordering.lstrip("-")
+        descending = self.ordering.startswith("-")
+
+        self.count = None
+        if request.query_params.get(self.count_query_param) == "true":
+            self.count, self.count_strategy = self.count_rows(queryset,
+                                                              request, view)
+
+        fields = queryset._fields
+        if fields and (field not in fields or "id" not in fields):
+            # Rows of values() querysets need the keys for the cursor,
+            # serializers skip the extra ones.
+            queryset = queryset.values(*fields, field, "id")
+        if descending:
+            queryset = queryset.order_by(f"-{field}", "-id")
+        else:
+            queryset = queryset.order_by(field, "id")
+        position = self.decode_cursor(request)
+        if position is not None:
+            value, last_id = position
+            lookup = "lt" if descending else "gt"
+            queryset = queryset.filter(
+                Q(**{f"{field}__{lookup}": value})
+                | Q(**{field: value, f"id__{lookup}": last_id})
+            )
+
+        rows = list(queryset[:self.limit + 1])
+        self.has_next = len(rows) > self.limit
+        rows = rows[:self.limit]
+        self.next_position = None
+        if self.has_next:
+            last = rows[-1]
+            if isinstance(last, dict):
+                self.next_position = (last[field], last["id"])
+            else:
+                self.next_position = (getattr(last, field), last.id)
+        return rows
+
+    def get_limit(self, request):
+        try:
+            limit = int(request.query_params[self.limit_query_param])
+        except (KeyError, ValueError):
+            return api_settings.PAGE_SIZE
+        return max(1, min(limit, self.max_limit))
+
+    def get_ordering(self, request):
+        ordering = request.query_params.get(self.ordering_query_param,
+                                            self.orderings[0])
+        if ordering not in self.orderings:
+            raise CustomApiException(
+                status.HTTP_400_BAD_REQUEST,
+                f"{self.ordering_query_param} must be one of "
+                f"{', '.join(self.orderings)}."
+            )
+        return ordering
+
+    def encode_cursor(self, value, last_id):
+        data = json.dumps({"o": self.ordering, "v": value.isoformat(),
+                           "id": last_id})
+        return base64.urlsafe_b64encode(data.encode()).decode()
+
+    def decode_cursor(self, request):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None
+        try:
+            data = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            value = parse_datetime(data["v"])
+            last_id = int(data["id"])
+        except (TypeError, ValueError, KeyError):
+            value = None
+        if value is None or data.get("o") != self.ordering:
+            raise CustomApiException(status.HTTP_400_BAD_REQUEST,
+                                     "Invalid cursor.")
+        return value, last_id
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.mode_query_param, self.mode)
+        url = remove_query_param(url, self.count_query_param)
+        return replace_query_param(url, self.cursor_query_param,
+                                   self.encode_cursor(*self.next_position))
+
+    def get_paginated_response(self, data):
+        response = OrderedDict([("next", self.get_next_link())])
+        if self.count is not None:
+            response["count"] = self.count
+            response["count_strategy"] = self.count_strategy
+        response["results"] = data
+        return Response(response)
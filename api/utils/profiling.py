@@ -0,0 +1,175 @@
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection, IntegrityError, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+
+from api.models import Chain, PropagationStepStat
+
+_local = threading.local()
+
+
+class Trace:
+    """Cost of the steps of one sampled chain propagation, including the
+    propagation of tasks completed automatically on the way.
+    """
+
+    def __init__(self):
+        self.queries = 0
+        self.stats = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries += 1
+        return execute(sql, params, many, context)
+
+    def add(self, stage, step, seconds, queries, tasks=0):
+        stat = self.stats.setdefault((stage.id, step), {
+            "chain_id": stage.chain_id, "calls": 0, "seconds": 0,
+            "max_seconds": 0, "queries": 0, "tasks": 0,
+        })
+        stat["calls"] += 1
+        stat["seconds"] += seconds
+        stat["max_seconds"] = max(stat["max_seconds"], seconds)
+        stat["queries"] += queries
+        stat["tasks"] += tasks
+
+    def save(self):
+        campaigns = dict(Chain.objects.filter(
+            id__in={i["chain_id"] for i in self.stats.values()}
+        ).values_list("id", "campaign_id"))
+        for (stage_id, step), stat in self.stats.items():
+            save_stat(campaigns[stat["chain_id"]], stage_id, step, stat)
+
+
+def save_stat(campaign_id, stage_id, step, stat):
+    updated = PropagationStepStat.objects \
+        .filter(stage_id=stage_id, step=step) \
+        .update(calls=F("calls") + stat["calls"],
+                seconds=F("seconds") + stat["seconds"],
+                max_seconds=Greatest("max_seconds", stat["max_seconds"]),
+                queries=F("queries") + stat["queries"],
+                tasks=F("tasks") + stat["tasks"])
+    if updated:
+        return
+    try:
+        with transaction.atomic():
+            PropagationStepStat.objects.create(
+                campaign_id=campaign_id, stage_id=stage_id, step=step, **stat)
+    except IntegrityError:
+        save_stat(campaign_id, stage_id, step, stat)
+
+
+def is_sampled():
+    rate = settings.PROPAGATION_PROFILING.get("sample_rate", 0)
+    return rate > 0 and random.random() < rate
+
+
+def get_trace():
+    return getattr(_local, "trace", None)
+
+
+@contextmanager
+def trace():
+    """Starts profiling of a chain propagation if it is sampled. Nested
+    propagations are profiled as part of the running trace. Stats are
+    saved only if the propagation succeeds.
+    """
+    if get_trace() is not None or not is_sampled():
+        yield None
+        return
+    current = Trace()
+    _local.trace = current
+    try:
+        with connection.execute_wrapper(current):
+            yield current
+    finally:
+        _local.trace = None
+    current.save()
+
+
+@contextmanager
+def step(name, stage, tasks=0):
+    """Records wall time and query count of the block as the step of the
+    stage if the running propagation is sampled.
+    """
+    current = get_trace()
+    if current is None:
+        yield
+        return
+    started = time.perf_counter()
+    queries = current.queries
+    try:
+        yield
+    finally:
+        current.add(stage, name, time.perf_counter() - started,
+                    current.queries - queries, tasks)
+
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"') \
+        .replace("\n", "\\n")
+
+
+METRICS = [
+    ("calls", "counter", "Sampled runs of the propagation step."),
+    ("seconds", "counter", "Wall time of the sampled runs in seconds."),
+    ("max_seconds", "gauge", "Longest sampled run in seconds."),
+    ("queries", "counter", "Database queries of the sampled runs."),
+    ("tasks", "counter", "Tasks created by the sampled runs."),
+]
+
+
+def export_prometheus(stats):
+    """Renders PropagationStepStat rows in the Prometheus text format."""
+    stats = list(stats)
+    lines = []
+    for field, kind, help_text in METRICS:
+        name = f"gigaturnip_propagation_step_{field}"
+        if kind == "counter":
+            name += "_total"
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for stat in stats:
+            labels = ",".join(
+                f'{label}="{escape_label(value)}"' for label, value in [
+                    ("campaign", stat.campaign_id),
+                    ("chain", stat.chain_id),
+                    ("stage", stat.stage_id),
+                    ("step", stat.step),
+                ]
+            )
+            lines.append(f"{name}{{{labels}}} {getattr(stat, field)}")
+    return "\n".join(lines) + "\n"
+
+
+TRANSPORT_METRICS = [
+    ("requests", "counter", "Webhook requests sent, retries included."),
+    ("failures", "counter", "Webhook requests failed after retries."),
+    ("retries", "counter", "Retried webhook requests."),
+    ("short_circuits", "counter",
+     "Webhook requests failed fast by the open circuit breaker."),
+    ("seconds", "counter", "Wall time of webhook requests in seconds."),
+    ("circuit_open", "gauge", "1 while the circuit breaker is open."),
+]
+
+
+def export_transport_prometheus(metrics):
+    """Renders WebhookTransport.get_metrics in the Prometheus text
+    format."""
+    lines = []
+    for field, kind, help_text in TRANSPORT_METRICS:
+        name = f"gigaturnip_webhook_{field}"
+        if kind == "counter":
+            name += "_total"
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for host, host_metrics in sorted(metrics.items()):
+            # Booleans are written as 0 and 1.
+            value = host_metrics[field] + 0
+            lines.append(f'{name}{{host="{escape_label(host)}"}} {value}')
+    return "\n".join(lines) + "\n"
+
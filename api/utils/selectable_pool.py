@@ -0,0 +1,72 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils import timezone
+
+from api.constans import TaskStageConstants
+from api.models import TaskStage
+from api.utils.cache_versions import get_versions, bump_versions
+
+VERSION_KEY = "selectable_stages"
+USER_VERSION_KEY = "selectable_stages:{}"
+STAGES_KEY = "selectable_stages:{}:{}:{}"
+
+
+def get_selectable_stage_windows(user):
+    """Returns stages where the user may select tasks, as tuples of stage
+    id and start and end time of its DatetimeSort. Cached per user and
+    versions of the stages, which are checked in the database on every
+    call, so changes of ranks, rank limits or stages committed by any
+    process are seen at once.
+    """
+    key = STAGES_KEY.format(user.id, *get_versions(
+        [VERSION_KEY, USER_VERSION_KEY.format(user.id)]))
+    windows = cache.get(key)
+    if windows is None:
+        windows = list(
+            TaskStage.objects
+            .filter(ranks__users=user.id)
+            .filter(ranklimits__is_selection_open=True)
+            .filter(ranklimits__is_listing_allowed=True)
+            .exclude(assign_user_by=TaskStageConstants.INTEGRATOR)
+            .values_list("id", "datetime_sort__start_time",
+                         "datetime_sort__end_time")
+            .distinct()
+        )
+        cache.set(key, windows, settings.SELECTABLE_STAGES_MAX_AGE)
+    return windows
+
+
+def get_selectable_stage_ids(user, now=None):
+    now = now if now else timezone.now()
+    return [
+        stage_id for stage_id, start_time, end_time
+        in get_selectable_stage_windows(user)
+        if (start_time is None or start_time <= now)
+        and (end_time is None or end_time >= now)
+    ]
+
+
+def filter_open_pool(queryset, user):
+    """Filters tasks the user may select. Tasks are looked up in the open
+    pool index of Task by the cached selectable stages of the user, so
+    no joins over ranks are needed.
+    """
+    now = timezone.now()
+    return queryset \
+        .filter(complete=False,
+                assignee__isnull=True,
+                stage_id__in=get_selectable_stage_ids(user, now)) \
+        .filter(Q(start_period__lte=now) | Q(start_period__isnull=True)) \
+        .filter(Q(end_period__gte=now) | Q(end_period__isnull=True))
+
+
+def invalidate_selectable_stages(user_ids=None):
+    """Drops cached selectable stages of the users, of all users if no
+    ids are given. Versions are bumped in the current transaction, so
+    other processes see them with the change.
+    """
+    if user_ids is None:
+        bump_versions([VERSION_KEY])
+        return
+    bump_versions([USER_VERSION_KEY.format(user_id) for user_id in user_ids])
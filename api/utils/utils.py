@@ -1,14 +1,23 @@
+import csv
+import hashlib
+import io
 import json
 from functools import wraps
 from json import JSONDecodeError
 
-from django.db.models import QuerySet, Count, Q, OuterRef
+from django.db.models import QuerySet, Count, Q, OuterRef, F, Exists
+from django.utils.http import parse_etags, quote_etag
+from rest_framework import status
 from rest_framework.response import Response
 
 from api.api_exceptions import CustomApiException
 from api.constans import TaskStageConstants, DjangoORMConstants, ConditionalStageConstants
-from api.models import TaskStage, Task, RankLimit, Campaign, Chain, Notification, RankRecord, AdminPreference, \
-    CustomUser
+from api.models import TaskStage, Task, RankLimit, Chain, Notification, RankRecord, AdminPreference, \
+    CustomUser, TaskFilterField, TaskFilterValue
+from api.utils.access_scope import get_access_scope, get_user_access_context
+from api.utils.chain_graph import get_stage_node
+from api.utils.django_expressions import SubqueryCount
+from api.utils.pagination import KeysetPagination
 from django.contrib import messages
 from django.utils.translation import ngettext
 from django.utils import timezone
@@ -22,54 +31,42 @@ _operators_orm = {
 }
 
 def is_user_campaign_manager(user, campaign_id):
-    campaigns = Campaign.objects \
-        .filter(id=campaign_id) \
-        .filter(campaign_managements__user=user)
-    return bool(campaigns)
+    return campaign_id in get_access_scope(user).managed_campaign_ids
 
 
 def filter_for_user_creatable_stages(queryset, request, ranks=None):
-
-    r = ranks
-    if not r:
-        r = request.user.ranks.all()
-
-    all_rank_limits = RankLimit.objects.filter(
-        rank__in=r,
-        is_creation_open=True,
-        stage__in=queryset
-    ).distinct().select_related("stage")
-
-    stages = queryset.filter(
-        is_creatable=True,
-        ranklimits__in=all_rank_limits
-    ).distinct()
-
-    tasks_user_by_stages = stages.values("id").annotate(
-        total=Count("tasks", filter=Q(tasks__assignee=request.user)),
-        incomplete=Count("tasks", filter=Q(tasks__assignee=request.user)
-                                         & Q(tasks__complete=False)),
+    """Returns stages of the queryset where the user may create a task:
+    some rank limit of the user's ranks is open for creation and the
+    user's tasks on the stage are under its open and total limits. Limits
+    equal to 0 mean no limit. Counting and limit checks are done in one
+    statement.
+    """
+    rank_ids = get_user_access_context(request).rank_ids
+    if not rank_ids:
+        return TaskStage.objects.none()
+
+    user_tasks = Task.objects.filter(
+        stage_id=OuterRef("stage_id"),
+        assignee_id=request.user.id
+    ).values("id")
+    rank_limits = RankLimit.objects.filter(
+        stage_id=OuterRef("id"),
+        rank_id__in=rank_ids,
+        is_creation_open=True
+    )
+    if ranks is not None:
+        rank_limits = rank_limits.filter(rank__in=ranks)
+    rank_limits = rank_limits.annotate(
+        total=SubqueryCount(user_tasks),
+        incomplete=SubqueryCount(user_tasks.filter(complete=False)),
+    ).filter(
+        Q(open_limit=0) | Q(open_limit__gt=F("incomplete")),
+        Q(total_limit=0) | Q(total_limit__gt=F("total"))
     )
 
-    filtered_stages = set()
-    for stage_info in tasks_user_by_stages.iterator():
-        total = stage_info["total"]
-        incomplete = stage_info["incomplete"]
-        rank_limits = all_rank_limits.filter(
-            stage=stage_info["id"],
-            rank__rankrecord__user=request.user
-        )
-
-        for rank_limit in rank_limits:
-            if ((rank_limit.open_limit > incomplete and rank_limit.total_limit > total) or
-                    (rank_limit.open_limit == 0 and rank_limit.total_limit > total) or
-                    (rank_limit.open_limit > incomplete and rank_limit.total_limit == 0) or
-                    (rank_limit.open_limit == 0 and rank_limit.total_limit == 0)
-            ):
-                filtered_stages.add(stage_info["id"])
-
+    stages = queryset.filter(is_creatable=True).filter(Exists(rank_limits))
     return TaskStage.objects.filter(is_creatable=True) \
-        .filter(id__in=filtered_stages) \
+        .filter(id__in=stages.values("id")) \
         .select_related("chain", "assign_user_from_stage")
 
 
@@ -105,6 +102,54 @@ def get_task_responses_filters(schema, values, prefix=None):
     return filters
 
 
+def filter_by_task_filter_values(tasks, schema, values):
+    """Keeps tasks of cases having tasks whose responses match filters of
+    the filter_fields_schema given in values. Each filter is one EXISTS
+    over indexed TaskFilterValue rows of the case. Filters on fields not
+    tracked by TaskFilterField fall back to lookups on responses.
+    """
+    filters = [i for i in schema if i["field_name"] in values]
+    if not filters:
+        return tasks
+    q = Q()
+    for f in filters:
+        q |= Q(stage_id=f["stage_id"], field_name=f["field_name"])
+    field_ids = {
+        (stage_id, field_name): field_id
+        for field_id, stage_id, field_name
+        in TaskFilterField.objects.filter(q)
+        .values_list("id", "stage_id", "field_name")
+    }
+
+    for f in filters:
+        value = values[f["field_name"]]
+        operator = _operators_orm.get(f["condition"])
+        field_id = field_ids.get((int(f["stage_id"]), f["field_name"]))
+        if field_id is None:
+            tasks = tasks.filter(case__in=Task.objects.filter(
+                get_task_responses_filters([f], values)[0]).values("case"))
+            continue
+
+        column = "text_value"
+        if isinstance(value, bool):
+            value = json.dumps(value)
+        elif isinstance(value, (int, float)):
+            column = "number_value"
+        elif f.get("type") in ["number", "integer"]:
+            try:
+                value, column = float(value), "number_value"
+            except (TypeError, ValueError):
+                value = str(value)
+        else:
+            value = str(value)
+        tasks = tasks.filter(Exists(TaskFilterValue.objects.filter(
+            case_id=OuterRef("case_id"),
+            field_id=field_id,
+            **{f"{column}{operator}": value}
+        )))
+    return tasks
+
+
 def filter_for_datetime(tasks):
     filtered_tasks = tasks \
         .filter(
@@ -124,7 +169,7 @@ def filter_for_datetime(tasks):
 
 def filter_for_user_campaigns(queryset, request):
     return queryset.filter(
-        tracks__ranks__in=request.user.ranks.all()
+        tracks__ranks__in=get_user_access_context(request).rank_ids
     ).distinct("id")
 
 
@@ -134,24 +179,89 @@ def filter_for_user_selectable_campaigns(queryset, request):
         .exclude(open=False)
 
 
-def paginate(func):
+def paginate(func=None, page_etag=None):
+    """Paginates the queryset returned by the action and serializes the
+    page. With page_etag, page_etag(request, page) returns data the ETag
+    of the page is computed from before the page is serialized, so pages
+    the client already has in If-None-Match are answered 304 Not
+    Modified without serializing them.
+    """
+    if func is None:
+        return lambda f: paginate(f, page_etag=page_etag)
+
     @wraps(func)
     def inner(self, *args, **kwargs):
         queryset = func(self, *args, **kwargs)
         assert isinstance(queryset, (list, QuerySet)), "apply_pagination expects a List or a QuerySet"
 
-        page = self.paginate_queryset(queryset)
-        if page is not None:
-            serializer = self.get_serializer(page, many=True,
-                                             context={"request": args[0]})
-            return self.get_paginated_response(serializer.data)
-
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+        request = args[0]
+        context = {"context": {"request": request}}
+        if isinstance(queryset, QuerySet) \
+                and KeysetPagination.is_requested(request, queryset):
+            paginator = KeysetPagination()
+            page = paginator.paginate_queryset(queryset, request, view=self)
+            get_response = paginator.get_paginated_response
+        else:
+            paginator = self.paginator
+            page = self.paginate_queryset(queryset)
+            get_response = self.get_paginated_response
+            if page is None:
+                page = list(queryset)
+                get_response = Response
+                context = {}
+
+        etag = None
+        if page_etag is not None:
+            etag = get_etag([
+                request.get_full_path(),
+                getattr(paginator, "count", None),
+                getattr(paginator, "has_next", None),
+                page_etag(request, page),
+            ])
+            if etag_matches(request, etag):
+                response = Response(status=status.HTTP_304_NOT_MODIFIED)
+                response["ETag"] = etag
+                return response
+
+        serializer = self.get_serializer(page, many=True, **context)
+        response = get_response(serializer.data)
+        if etag is not None:
+            response["ETag"] = etag
+        return response
 
     return inner
 
 
+def get_etag(data):
+    content = json.dumps(data, sort_keys=True, default=str)
+    return quote_etag(hashlib.md5(content.encode()).hexdigest())
+
+
+def etag_matches(request, etag):
+    return etag in parse_etags(request.META.get("HTTP_IF_NONE_MATCH", ""))
+
+
+def csv_chunks(columns, rows, chunk_size):
+    """Yields CSV text of the rows, chunk_size rows at a time, with count
+    of rows in every chunk. The first chunk starts with the header. Keys
+    of rows that are not in the columns are left out.
+    """
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns,
+                            extrasaction="ignore")
+    writer.writeheader()
+    count = 0
+    for row in rows:
+        writer.writerow(row)
+        count += 1
+        if count == chunk_size:
+            yield count, buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            count = 0
+    yield count, buffer.getvalue()
+
+
 def filter_for_user_notifications(queryset, request):
     '''
     все сообщения у которых ранг совпадает с рангом пользователя и целевой пользователь
@@ -237,14 +347,10 @@ def str_to_responses_dict(params):
     return result
 
 
-def can_complete(task, user):
-    rank_limits = RankLimit.objects \
-        .filter(stage=task.stage) \
-        .filter(rank__users=user) \
-        .filter(is_submission_open=False)
-    if rank_limits:
-        return False
-    return True
+def can_complete(task, request):
+    rank_limits = get_user_access_context(request).get_rank_limits(
+        task.stage_id)
+    return not any(not i.is_submission_open for i in rank_limits)
 
 
 def array_difference(source, target):
@@ -369,7 +475,7 @@ def connect_user_with_ranks(user, ranks_ids):
 
 
 def give_task_awards(stage, task):
-    task_awards = stage.task_stage_verified.all()
+    task_awards = get_stage_node(stage).task_awards
     for task_award in task_awards:
         rank_record = task_award.connect_user_with_rank(task)
         if rank_record:
@@ -377,11 +483,5 @@ def give_task_awards(stage, task):
             connect_user_with_ranks(rank_record.user, ranks)
 
 
-def process_auto_completed_task(stage, task):
-    if stage.assign_user_by == TaskStageConstants.AUTO_COMPLETE:
-        task.complete = True
-        task.save()
-
-
 def get_conditional_limit_count(stage, filters):
     return stage.out_stages.get().tasks.count()
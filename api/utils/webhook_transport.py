@@ -0,0 +1,275 @@
+import random
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+DEFAULT_CONFIG = {
+    "connect_timeout": 3.05,
+    "read_timeout": 30,
+    "retries": 2,
+    "backoff": 0.5,
+    "pool_connections": 10,
+    "pool_maxsize": 10,
+    "breaker_threshold": 5,
+    "breaker_cooldown": 30,
+    "max_workers": 8,
+}
+
+IDEMPOTENT_METHODS = ["GET", "HEAD", "PUT", "DELETE", "OPTIONS"]
+RETRY_STATUSES = [502, 503, 504]
+
+
+class CircuitOpenError(requests.ConnectionError):
+    """Raised without sending the request while the host is failing."""
+
+
+def is_not_sent(exc):
+    """Returns whether the request failed before the connection was
+    established."""
+    if isinstance(exc, requests.ConnectTimeout):
+        return True
+    reason = exc.args[0] if exc.args else None
+    return isinstance(getattr(reason, "reason", reason), NewConnectionError)
+
+
+class CircuitBreaker:
+    """Counts consecutive failures of a host. After the threshold is
+    reached requests to the host fail fast until the cooldown passes,
+    then a single trial request decides whether to close it again.
+    """
+
+    def __init__(self, threshold, cooldown):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        return self.opened_at is not None
+
+    def allow(self):
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at >= self.cooldown:
+                # Half-open: let one request through, keep others failing.
+                self.opened_at = time.monotonic()
+                return True
+            return False
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        """Returns True if this failure opened the circuit."""
+        with self.lock:
+            self.failures += 1
+            was_open = self.opened_at is not None
+            if self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+            return not was_open and self.opened_at is not None
+
+
+class WebhookTransport:
+    """Shared HTTP client for webhooks with pooled keep-alive connections,
+    timeouts, bounded retries with jittered backoff, per host circuit
+    breakers and in-process metrics.
+    """
+
+    def __init__(self, config=None):
+        self._config = config
+        self._session = None
+        self.breakers = {}
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    @property
+    def config(self):
+        if self._config is None:
+            config = dict(DEFAULT_CONFIG)
+            config.update(getattr(settings, "WEBHOOK_TRANSPORT", {}))
+            self._config = config
+        return self._config
+
+    @property
+    def session(self):
+        with self.lock:
+            if self._session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=self.config["pool_connections"],
+                    pool_maxsize=self.config["pool_maxsize"]
+                )
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                self._session = session
+            return self._session
+
+    def get_breaker(self, host):
+        with self.lock:
+            if host not in self.breakers:
+                self.breakers[host] = CircuitBreaker(
+                    self.config["breaker_threshold"],
+                    self.config["breaker_cooldown"]
+                )
+            return self.breakers[host]
+
+    def count(self, host, metric, value=1):
+        with self.lock:
+            host_metrics = self.metrics.setdefault(host, {
+                "requests": 0, "failures": 0, "retries": 0,
+                "short_circuits": 0, "seconds": 0.0,
+            })
+            host_metrics[metric] += value
+
+    def get_metrics(self, hosts=None):
+        """Returns metrics of the hosts requested by this process, all
+        hosts if hosts is None."""
+        with self.lock:
+            result = {}
+            for host, host_metrics in self.metrics.items():
+                if hosts is not None and host not in hosts:
+                    continue
+                result[host] = dict(host_metrics)
+                result[host]["circuit_open"] = self.breakers[host].is_open \
+                    if host in self.breakers else False
+            return result
+
+    def is_retryable(self, method, response=None, exc=None):
+        """Requests with idempotent methods are retried on connection
+        errors, timeouts and gateway errors. Others are retried only if
+        the connection wasn't established, so the host never got them.
+        """
+        if method not in IDEMPOTENT_METHODS:
+            return exc is not None and is_not_sent(exc)
+        if exc is not None:
+            return isinstance(exc, (requests.ConnectionError,
+                                    requests.Timeout))
+        return response.status_code in RETRY_STATUSES
+
+    def backoff(self, attempt):
+        # Full jitter, so retries of many workers don't come in waves.
+        time.sleep(random.uniform(0, self.config["backoff"] * 2 ** attempt))
+
+    def send(self, method, url, **kwargs):
+        """Sends the request and returns a pair of response and flag that
+        the request opened the circuit of the host. Doesn't touch the
+        database, so it is safe to call from worker threads.
+        """
+        method = method.upper()
+        host = urlsplit(url).netloc
+        breaker = self.get_breaker(host)
+        kwargs.setdefault("timeout", (self.config["connect_timeout"],
+                                      self.config["read_timeout"]))
+        if not breaker.allow():
+            self.count(host, "short_circuits")
+            raise CircuitOpenError(f"Circuit breaker is open for {host}")
+
+        attempt = 0
+        while True:
+            self.count(host, "requests")
+            started = time.monotonic()
+            response, error = None, None
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except requests.RequestException as exc:
+                error = exc
+            self.count(host, "seconds", time.monotonic() - started)
+
+            failed = error is not None or response.status_code >= 500
+            if failed and attempt < self.config["retries"] \
+                    and self.is_retryable(method, response, error):
+                attempt += 1
+                self.count(host, "retries")
+                self.backoff(attempt)
+                continue
+            break
+
+        if failed:
+            self.count(host, "failures")
+            tripped = breaker.record_failure()
+        else:
+            breaker.record_success()
+            tripped = False
+        if error is not None:
+            error.tripped = tripped
+            raise error
+        return response, tripped
+
+    def request(self, method, url, error_source=None, **kwargs):
+        """Sends the request. If it opens the circuit of the host, error
+        is generated on error_source, which is a CampaignInterface.
+        """
+        try:
+            response, tripped = self.send(method, url, **kwargs)
+        except requests.RequestException as exc:
+            if getattr(exc, "tripped", False):
+                self.report_tripped(error_source, url)
+            raise
+        if tripped:
+            self.report_tripped(error_source, url)
+        return response
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def put(self, url, **kwargs):
+        return self.request("PUT", url, **kwargs)
+
+    def patch(self, url, **kwargs):
+        return self.request("PATCH", url, **kwargs)
+
+    def map(self, calls, error_sources=None):
+        """Sends (method, url, kwargs) calls concurrently. Returns list of
+        responses or exceptions in the order of calls.
+        """
+        error_sources = error_sources or [None] * len(calls)
+
+        def send(call):
+            method, url, kwargs = call
+            try:
+                return self.send(method, url, **kwargs)
+            except requests.RequestException as exc:
+                return exc, getattr(exc, "tripped", False)
+
+        workers = min(self.config["max_workers"], len(calls)) or 1
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(send, calls))
+
+        responses = []
+        for (result, tripped), call, source in zip(results, calls,
+                                                   error_sources):
+            if tripped:
+                self.report_tripped(source, call[1])
+            responses.append(result)
+        return responses
+
+    def report_tripped(self, error_source, url):
+        if error_source is None:
+            return
+        host = urlsplit(url).netloc
+        error_source.generate_error(
+            CircuitOpenError,
+            details=f"Webhook host {host} keeps failing, requests to it "
+                    f"are suspended for {self.config['breaker_cooldown']} "
+                    f"seconds.",
+            tb_info="".join(traceback.format_stack()),
+            data=url
+        )
+
+
+transport = WebhookTransport()
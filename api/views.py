@@ -1,15 +1,18 @@
 import csv
 import json
+import traceback
 from datetime import datetime
 from datetime import timedelta
+from itertools import groupby
+from urllib.parse import urlsplit
 
-import requests
 from django.contrib.postgres.aggregates import ArrayAgg
 from django.db.models import (
     Count, Q, Subquery, F, When, Value, TextField, OuterRef, Case as ExCase,Exists
 )
+from django.db import transaction
 from django.db.models.functions import JSONObject
-from django.http import HttpResponse
+from django.http import HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from api.models.stage.stage import Stage
 from django_filters.rest_framework import DjangoFilterBackend
@@ -22,14 +25,15 @@ from rest_framework.response import Response
 from rest_framework.viewsets import GenericViewSet
 
 from api.asyncstuff import (
-    process_completed_task, process_updating_schema_answers
+    process_completed_task, process_updating_schema_answers,
+    enqueue_completed_task, enqueue_completed_tasks, enqueue_export_job
 )
 from api.models import (
     Campaign, Chain, TaskStage, ConditionalStage, Case, Task, Rank,
     RankLimit, Track, RankRecord, CampaignManagement,
     Notification, ResponseFlattener, TaskAward,
     DynamicJson, CustomUser, TestWebhook, Webhook, UserDelete, Category,
-    Country, Language, Volume
+    Country, Language, Volume, PropagationStepStat, ExportJob, TaskTombstone
 )
 from api.permissions import (
     CampaignAccessPolicy, ChainAccessPolicy, TaskStageAccessPolicy,
@@ -38,7 +42,8 @@ from api.permissions import (
     CampaignManagementAccessPolicy, NotificationAccessPolicy,
     ResponseFlattenerAccessPolicy, TaskAwardAccessPolicy,
     DynamicJsonAccessPolicy, UserAccessPolicy, UserStatisticAccessPolicy,
-    CategoryAccessPolicy, CountryAccessPolicy, LanguageAccessPolicy, UserFCMTokenAccessPolicy, VolumeAccessPolicy
+    CategoryAccessPolicy, CountryAccessPolicy, LanguageAccessPolicy, UserFCMTokenAccessPolicy, VolumeAccessPolicy,
+    PropagationStepStatAccessPolicy, ExportJobAccessPolicy
 )
 from api.serializer import (
     CampaignSerializer, ChainSerializer, TaskStageSerializer,
@@ -57,17 +62,30 @@ from api.serializer import (
     LanguageListSerializer, ChainIndividualsSerializer,
     RankGroupedByTrackSerializer, TaskPublicSerializer,
     TaskUserSelectableSerializer, TaskCreateSerializer,
-    TaskStageCreateTaskSerializer, FCMTokenSerializer, VolumeSerializer
+    TaskStageCreateTaskSerializer, FCMTokenSerializer, VolumeSerializer,
+    PropagationJobSerializer, PropagationStepStatSerializer,
+    TaskBulkCompleteSerializer, ExportJobSerializer, TaskChangeSerializer,
+    TaskTombstoneSerializer
 )
 from api.utils import utils
 from .api_exceptions import CustomApiException
-from .constans import ErrorConstants, TaskStageConstants
+from .constans import ErrorConstants, TaskStageConstants, \
+    BulkCompleteConstants, ExportJobConstants
 from .filters import (
     ResponsesContainsFilter,
     CategoryInFilter, #IndividualChainCompleteFilter,
 )
 from api.utils.utils import paginate
+from .utils.access_scope import get_user_access_context
+from .utils.chain_progress import attach_chain_progress, get_chain_progress
+from .utils.change_feed import get_changes
 from .utils.django_expressions import ArraySubquery
+from .utils.exports import download_response
+from .utils.flatten_sql import get_csv_chunks
+from .utils.pagination import CountStrategy
+from .utils.profiling import export_prometheus, export_transport_prometheus
+from .utils.selectable_pool import filter_open_pool
+from .utils.webhook_transport import transport
 
 
 class CategoryViewSet(mixins.ListModelMixin, GenericViewSet):
@@ -331,7 +349,7 @@ class ChainViewSet(viewsets.ModelViewSet):
         )
         return Response(graph)
 
-    @paginate
+    @paginate(page_etag=attach_chain_progress)
     @action(detail=False, methods=["GET"])
     def individuals(self, request):
         qs = self.get_queryset()
@@ -362,125 +380,37 @@ class ChainViewSet(viewsets.ModelViewSet):
         # print(qs)
 
 
-        rank_limits = RankLimit.objects.filter(rank__in=user.ranks.all())
-        all_available_chains = rank_limits.values_list('stage__chain', flat=True).distinct()
-        
-        qs = qs.filter(id__in=all_available_chains).distinct()
+        access_context = get_user_access_context(request)
+        qs = qs.filter(id__in=access_context.scope.rank_chain_ids).distinct()
 
         # filter by highest user ranks
         if request.query_params.get("by_highest_ranks"):
-            ranks = request.user.get_highest_ranks_by_track()
             qs = qs.filter(
-                id__in=RankLimit.objects.filter(rank__in=ranks).values(
-                    "stage__chain")
+                id__in=RankLimit.objects.filter(
+                    rank_id__in=access_context.highest_rank_ids
+                ).values("stage__chain")
             )
 
         
         # print("All stages from the main queryset after filter:")
         # print(qs.values("stages"))
 
-        user_tasks = Task.objects.filter(
-            assignee_id=user.id,
-            stage__in=qs.values("stages")
-        ).select_related("stage")
-
-        # print("All tasks queryset with all fields:")
-        # print(Task.objects.all().values("id", "assignee", "stage", "complete", "reopened"))
-
-        # print("user_tasks queryset:")
-        # print(user_tasks)
-
-         # Get out_stage IDs in a separate, optimized subquery
-        out_stages_subquery = Stage.objects.filter(
-            in_stages=OuterRef('id')
-        ).values_list('id', flat=True)
-
-        # Get in_stage IDs in a separate, optimized subquery
-        # in_stages_subquery = TaskStage.objects.filter(
-        #     out_stages=OuterRef('id')
-        # ).values_list('id', flat=True)
-
-        task_stages_query = TaskStage.objects.select_related("tasks").filter(chain=OuterRef("id")) \
-            .annotate(
-                all_out_stages=ArraySubquery(out_stages_subquery),
-                #all_in_stages=ArraySubquery(in_stages_subquery),
-                #all_out_stages=ArrayAgg("out_stages__id", distinct=True),
-                #all_in_stages=ArrayAgg("in_stages", distinct=True),
-                completed=ArraySubquery(user_tasks.filter(stage_id=OuterRef("id"), complete=True).values_list("id", flat=True)),
-                #not_completed=ArraySubquery(user_tasks.filter(stage_id=OuterRef("id"), complete=False).values_list("id", flat=True)),
-                opened=ArraySubquery(user_tasks.filter(stage_id=OuterRef("id"), complete=False).values_list("id", flat=True)),
-                reopened=ArraySubquery(user_tasks.filter(stage_id=OuterRef("id"), complete=False, reopened=True).values_list("id", flat=True)),
-                #total_count=Count("tasks", filter=Q(tasks__case__in=user_tasks.values("case"))),
-                #complete_count=Count("tasks", filter=Q(tasks__case__in=user_tasks.values("case"), tasks__complete=True))
-            )
-        
-
          # Check if we need to filter by completion status
         completed_param = request.query_params.get('completed', '').lower()
         if completed_param in ['true', 'false']:
-            # Convert string parameter to boolean
+            # Completion of the chains is read from the user's
+            # ChainProgress snapshots, stale ones are rebuilt first.
             completed_filter = (completed_param == 'true')
-
-            # This subquery finds stages that:
-            # 1. Belong to the current chain (chain=OuterRef('id'))
-            # 2. Are marked as required for chain completion (complete_individual_chain=True)
-            # 3. Don't have a completed task from the current user
-            incomplete_required_stages = TaskStage.objects.filter(
-                chain=OuterRef('id'),  # Links to the main query's chain
-                complete_individual_chain=True  # Only stages required for completion
-            ).exclude(
-                # Exclude stages where user has completed tasks
-                id__in=user_tasks.filter(complete=True).values('stage_id')
-            )
-
-            if completed_filter:  # When completed=true
-                # Return chains that have NO incomplete required stages
-                # ~Q(Exists()) means "does not exist"
-                # In other words: all required stages have completed tasks
-                qs = qs.filter(~Q(Exists(incomplete_required_stages)))
-            else:  # When completed=false
-                # Return chains that have AT LEAST ONE incomplete required stage
-                # Exists() means "there is at least one"
-                # In other words: some required stages don't have completed tasks
-                qs = qs.filter(Exists(incomplete_required_stages))
-
-        qs = qs.values("id", "name", "order_in_individuals", "campaign", "new_task_view_mode").annotate(
-            data=ArraySubquery(
-                task_stages_query.values(
-                    info=JSONObject(
-                        id="id",
-                        name="name",
-                        order="order",
-                        created_at="created_at",
-                        skip_empty_individual_tasks="skip_empty_individual_tasks",
-                        completed="completed",
-                        #not_completed="not_completed",
-                        opened="opened",
-                        reopened="reopened",
-                        assign_type="assign_user_by",
-                        out_stages="all_out_stages",
-                        #in_stages="all_in_stages",
-                        #total_count="total_count",
-                        #complete_count="complete_count"
-                    )
-                )
-            ),
-            conditionals=ArraySubquery(
-                ConditionalStage.objects.filter(chain=OuterRef("id")).annotate(
-                    all_out_stages=ArrayAgg("out_stages", distinct=True),
-                    all_in_stages=ArrayAgg("in_stages", distinct=True),
-                ).values(
-                    info=JSONObject(
-                        id="id",
-                        name="name",
-                        order="order",
-                        created_at="created_at",
-                        out_stages="all_out_stages",
-                        in_stages="all_in_stages",
-                    )
-                )
-            )
-        )
+            progress = get_chain_progress(
+                user, list(qs.values_list("id", flat=True)))
+            qs = qs.filter(id__in=[
+                chain_id for chain_id, chain_progress in progress.items()
+                if chain_progress.complete == completed_filter
+            ])
+
+        # Stages and the user's tasks on them are served from ChainProgress
+        # snapshots by ChainIndividualsListSerializer.
+        qs = qs.values("id", "name", "order_in_individuals", "campaign", "new_task_view_mode")
         return qs
     
     @paginate
@@ -607,12 +537,14 @@ class TaskStageViewSet(viewsets.ModelViewSet):
         stages = self.filter_queryset(q)
 
         # filter by highest user ranks
-        ranks = request.user.ranks.all()
+        access_context = get_user_access_context(request)
+        rank_ids = access_context.rank_ids
         if request.query_params.get("by_highest_ranks"):
-            ranks = request.user.get_highest_ranks_by_track()
-        ranks = ranks.prefetch_related("ranklimits").filter(
+            rank_ids = access_context.highest_rank_ids
+        ranks = Rank.objects.filter(
+            id__in=rank_ids,
             ranklimits__is_creation_open=True
-        )
+        ).distinct()
 
         stages = utils.filter_for_user_creatable_stages(stages, request, ranks)
 
@@ -895,6 +827,14 @@ class TaskViewSet(viewsets.ModelViewSet):
     get_integrated_tasks:
     Return integrated tasks of requested task.
 
+    propagation_status:
+    Return state of the latest chain propagation of the task.
+    Used by chains with asynchronous propagation.
+
+    changes:
+    Return tasks of managed campaigns changed and deleted after the
+    cursor, in the order of their transactions.
+
     """
 
     filterset_fields = {
@@ -920,12 +860,12 @@ class TaskViewSet(viewsets.ModelViewSet):
     ]
     ordering_fields = ["created_at", "updated_at"]
     permission_classes = (TaskAccessPolicy,)
+    unfiltered_count_strategy = CountStrategy.ESTIMATE
 
     def get_queryset(self):
         qs = Task.objects.all().select_related('stage')
         if self.action in ["list", "csv", "user_activity",
-                           "user_activity_csv", "search_by_responses",
-                           "user_selectable"]:
+                           "user_activity_csv", "search_by_responses"]:
             return TaskAccessPolicy.scope_queryset(
                 self.request, qs
             )
@@ -983,12 +923,10 @@ class TaskViewSet(viewsets.ModelViewSet):
             case = Case.objects.create()
             task = serializer.save(case=case)
             if task.complete:
-                process_completed_task(task)
-            # if data['complete']:
-            #     result(async_task(process_completed_task,
-            #                       data['id'],
-            #                       task_name='process_completed_task',
-            #                       group='follow_chain'))
+                if task.stage.chain.async_propagation:
+                    enqueue_completed_task(task)
+                else:
+                    process_completed_task(task)
             return Response(
                 serializer.data,
                 status=status.HTTP_201_CREATED
@@ -1017,9 +955,10 @@ class TaskViewSet(viewsets.ModelViewSet):
         data = serializer.validated_data
         data['id'] = instance.id
         next_direct_task = None
+        propagation_job = None
         complete = serializer.validated_data.get("complete", False)
         if (complete and not instance.stage.chain.is_individual) \
-                and not utils.can_complete(instance, request.user):
+                and not utils.can_complete(instance, request):
             err_message = {
                 "detail": f"{ErrorConstants.CANNOT_SUBMIT} {ErrorConstants.TASK_COMPLETED}",
                 "id": instance.id
@@ -1031,7 +970,9 @@ class TaskViewSet(viewsets.ModelViewSet):
                 responses=serializer.validated_data.get("responses", {}),
                 complete=complete
             )
-            if complete:
+            if complete and task.stage.chain.async_propagation:
+                propagation_job = enqueue_completed_task(task)
+            elif complete:
                 next_direct_task = process_completed_task(task)
         except Task.CompletionInProgress:
             err_message = {
@@ -1063,6 +1004,9 @@ class TaskViewSet(viewsets.ModelViewSet):
             response["is_new_campaign"] = instance.get_campaign().id != next_direct_task.get_campaign().id
             response["message"] = "Next direct task is available."
             response["next_direct_id"] = next_direct_task.id
+        if propagation_job:
+            response["message"] = "Task saved. Chain propagation is in progress."
+            response["propagation_job_id"] = propagation_job.id
 
         if instance.stage.auto_notification_recipient_stages.all():
             response["notifications"] = list(
@@ -1079,6 +1023,134 @@ class TaskViewSet(viewsets.ModelViewSet):
         kwargs['partial'] = True
         return self.update(request, *args, **kwargs)
 
+    @action(detail=False, methods=['post'])
+    def bulk_complete(self, request):
+        """
+        Post:
+        Save responses of many tasks and complete them in one request.
+        Expects a list of {"id", "responses", "complete"}. Tasks are locked
+        in one transaction and tasks being submitted by another request are
+        skipped. Tasks are completed and propagated grouped by stage, and
+        chains with asynchronous propagation are queued once per stage.
+        Returns result of every item in the order of the request.
+        """
+        serializer = TaskBulkCompleteSerializer(
+            data=request.data, many=True,
+            max_length=BulkCompleteConstants.MAX_ITEMS
+        )
+        if not serializer.is_valid():
+            return Response(serializer.errors,
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        items = serializer.validated_data
+        results = [{"id": item["id"]} for item in items]
+        requested = {}
+        for item, result in zip(items, results):
+            if item["id"] in requested:
+                result["status"] = BulkCompleteConstants.DUPLICATE
+            else:
+                requested[item["id"]] = (item, result)
+
+        with transaction.atomic():
+            tasks = list(
+                Task.objects.select_for_update(skip_locked=True, of=('self',))
+                .select_related('stage__chain')
+                .filter(id__in=requested.keys())
+                .order_by('stage_id', 'id')
+            )
+            self.check_bulk_not_locked(requested, tasks)
+
+            for stage_id, group in groupby(tasks, key=lambda t: t.stage_id):
+                group = list(group)
+                # Tasks of a stage share one stage instance, so the stage
+                # lookups made by propagation are done once per stage.
+                stage = group[0].stage
+                submission_open = utils.can_complete(group[0], request)
+                completed = []
+                for task in group:
+                    task.stage = stage
+                    item, result = requested[task.id]
+                    if self.bulk_complete_item(request, task, item, result,
+                                               submission_open):
+                        completed.append(task)
+
+                if completed and stage.chain.async_propagation:
+                    jobs = enqueue_completed_tasks(completed)
+                    for task in completed:
+                        result = requested[task.id][1]
+                        result["propagation_job_id"] = jobs[task.id].id
+
+        return Response(results, status=status.HTTP_200_OK)
+
+    @staticmethod
+    def check_bulk_not_locked(requested, tasks):
+        missing = set(requested.keys()) - {task.id for task in tasks}
+        existing = set(Task.objects.filter(id__in=missing)
+                       .values_list('id', flat=True))
+        for task_id in missing:
+            result = requested[task_id][1]
+            if task_id in existing:
+                result["status"] = BulkCompleteConstants.LOCKED
+                result["message"] = f"{ErrorConstants.CANNOT_SUBMIT} " \
+                                    f"{ErrorConstants.TASK_COMPLETED}"
+            else:
+                result["status"] = BulkCompleteConstants.NOT_FOUND
+                result["message"] = ErrorConstants.ENTITY_DOESNT_EXIST % (
+                    'Task', task_id)
+
+    @staticmethod
+    def bulk_complete_item(request, task, item, result, submission_open):
+        """Saves the locked task of one bulk_complete item in a savepoint and
+        propagates it there unless its chain is asynchronous. Errors are
+        recorded in the result of the item and roll back only its task.
+        Returns True if the task was completed.
+        """
+        complete = item["complete"]
+        is_individual = task.stage.chain.is_individual
+        if not request.user.is_superuser and task.assignee_id != request.user.id:
+            result["status"] = BulkCompleteConstants.FORBIDDEN
+            result["message"] = ErrorConstants.CANNOT_SUBMIT
+            return False
+        if complete and not is_individual and not submission_open:
+            result["status"] = BulkCompleteConstants.FORBIDDEN
+            result["message"] = f"{ErrorConstants.CANNOT_SUBMIT} " \
+                                f"{ErrorConstants.TASK_COMPLETED}"
+            return False
+
+        next_direct_task = None
+        try:
+            with transaction.atomic():
+                task.save_completion(responses=item.get("responses"),
+                                     complete=complete,
+                                     replace_responses=True)
+                if complete and not task.stage.chain.async_propagation:
+                    next_direct_task = process_completed_task(task)
+        except Task.AlreadyCompleted:
+            result["status"] = BulkCompleteConstants.FORBIDDEN
+            result["message"] = ErrorConstants.TASK_ALREADY_COMPLETED
+            return False
+        except CustomApiException as exc:
+            result["status"] = BulkCompleteConstants.ERROR
+            result["message"] = exc.detail
+            return False
+        except Exception as exc:
+            task.generate_error(
+                type(exc),
+                details=f"Bulk completion of task {task.id} failed.",
+                tb=exc.__traceback__,
+                tb_info=traceback.format_exc(),
+                data=f"Task: {task.id}\nItem: {item}"
+            )
+            result["status"] = BulkCompleteConstants.ERROR
+            result["message"] = ErrorConstants.BULK_COMPLETE_FAILED
+            return False
+
+        result["status"] = BulkCompleteConstants.COMPLETED if complete \
+            else BulkCompleteConstants.SAVED
+        if next_direct_task:
+            result["next_direct_id"] = next_direct_task.id
+        return complete
+
     @paginate
     @action(detail=False)
     def user_relevant(self, request):
@@ -1122,13 +1194,9 @@ class TaskViewSet(viewsets.ModelViewSet):
         uncompleted tasks that are allowed to the user.
         """
         queryset = self.filter_queryset(
-            self.get_queryset()
-            .select_related('stage')
-            .prefetch_related('stage__ranks__users',
-                              'out_tasks',
-                              'stage__displayed_prev_stages',
-                              'stage__ranklimits')
+            Task.objects.select_related('stage__chain')
         )
+        tasks = filter_open_pool(queryset, request.user)
         """
         stage id
         key
@@ -1136,32 +1204,14 @@ class TaskViewSet(viewsets.ModelViewSet):
         condition
         """
 
-        tasks = queryset
-        while request.method == "POST":
-            stage = queryset.first().stage if queryset else None
-            if not stage or stage and not stage.filter_fields_schema:
-                break
-            all_tasks = Task.objects.filter(
-                case__in=queryset.values("case"),
-            ).select_related("case")
+        if request.method == "POST":
+            first_task = tasks.first()
+            stage = first_task.stage if first_task else None
+            if stage and stage.filter_fields_schema:
+                tasks = utils.filter_by_task_filter_values(
+                    tasks, stage.filter_fields_schema, request.data)
 
-            filters = utils.get_task_responses_filters(stage.filter_fields_schema, request.data)
-
-            if not filters:
-                break
-
-            cases = Case.objects.none()
-            for i, f in enumerate(filters):
-                cases = all_tasks.filter(f).values("case")
-                all_tasks = Task.objects.filter(case__in=cases)
-
-            tasks = tasks.filter(case__in=cases)
-            break
-
-        tasks_selectable = utils.filter_for_user_selectable_tasks(tasks, request.user)
-        by_datetime = utils.filter_for_datetime(tasks_selectable)
-
-        return by_datetime
+        return tasks
 
     @paginate
     @action(detail=False)
@@ -1182,19 +1232,14 @@ class TaskViewSet(viewsets.ModelViewSet):
 
         return groups
 
-    @action(detail=False)
-    def user_activity_csv(self, request):
-        """
-        Get:
-        Return list of activities on stages. Note: if you want download csv file you have to set 'csv' in params as true
-
-        Also for custom statistics you can use filters. And on top of all that you can use filters in csv using 'task_responses' key in params.
-        Params for example:
-        ?csv=true&task_responses={"a":"b"}
+    def get_user_activity_groups(self):
+        """Returns rows of user_activity_csv. Export jobs rebuild them in
+        the worker from the params of the request, see
+        api.utils.exports.load_user_activity.
         """
         tasks = self.filter_queryset(self.get_queryset()) \
             .select_related('stage', 'assignee')
-        groups = tasks.values('stage', 'stage__name', 'assignee').annotate(
+        return tasks.values('stage', 'stage__name', 'assignee').annotate(
             chain_id=F('stage__chain'),
             chain=F('stage__chain__name'),
             email=F("assignee__email"),
@@ -1203,6 +1248,31 @@ class TaskViewSet(viewsets.ModelViewSet):
             **utils.task_stage_queries()
         ).order_by("count_tasks")
 
+    @action(detail=False)
+    def user_activity_csv(self, request):
+        """
+        Get:
+        Return list of activities on stages. Note: if you want download csv file you have to set 'csv' in params as true
+
+        Also for custom statistics you can use filters. And on top of all that you can use filters in csv using 'task_responses' key in params.
+        Params for example:
+        ?csv=true&task_responses={"a":"b"}
+
+        With background=true the csv file is written by an export job,
+        see exportjobs.
+        """
+        if request.query_params.get("background", None):
+            params = {key: value for key, value in
+                      sorted(request.query_params.items())
+                      if key not in ["background", "csv"]}
+            job = enqueue_export_job(
+                request.user, ExportJobConstants.USER_ACTIVITY, params
+            )
+            return Response(ExportJobSerializer(job).data,
+                            status=status.HTTP_202_ACCEPTED)
+
+        groups = self.get_user_activity_groups()
+
         filename = "results"  # utils.request_to_name(request)
         response = HttpResponse(
             content_type='text/csv',
@@ -1212,12 +1282,7 @@ class TaskViewSet(viewsets.ModelViewSet):
         )
 
         if request.query_params.get("csv", None):
-            fieldnames = ["stage", "stage__name", "chain_id", "chain",
-                          "case", "assignee", "email", "rank_ids",
-                          "rank_names",
-                          "complete_true", "complete_false",
-                          "force_complete_false",
-                          "force_complete_true", "count_tasks", ]
+            fieldnames = ExportJobConstants.USER_ACTIVITY_COLUMNS
 
             writer = csv.DictWriter(response, fieldnames=fieldnames)
             writer.writeheader()
@@ -1227,6 +1292,63 @@ class TaskViewSet(viewsets.ModelViewSet):
 
         return Response(groups)
 
+    @action(detail=False)
+    def changes(self, request):
+        """
+        Get:
+        Return tasks of managed stages changed after the cursor and ids of
+        deleted tasks, at most limit of them together, in the order their
+        transactions started. Changes are returned once all transactions
+        started before them finished. Pass the returned cursor as since to
+        get the next changes, repeating while has_more is true.
+
+        Params: since, limit, stage and response_flattener. With
+        response_flattener tasks of its stage are returned flattened.
+        """
+        scope = get_user_access_context(request).scope
+        tasks = Task.objects.filter(stage_id__in=scope.managed_stage_ids)
+        tombstones = TaskTombstone.objects.filter(
+            campaign_id__in=scope.managed_campaign_ids)
+
+        flattener = None
+        stage = request.query_params.get("stage")
+        if request.query_params.get("response_flattener"):
+            flattener = get_object_or_404(
+                ResponseFlattenerAccessPolicy.scope_queryset(
+                    request,
+                    ResponseFlattener.objects.select_related("task_stage")
+                ),
+                id=request.query_params["response_flattener"]
+            )
+            stage = flattener.task_stage_id
+        elif stage is not None:
+            try:
+                stage = int(stage)
+            except ValueError:
+                raise CustomApiException(
+                    status.HTTP_400_BAD_REQUEST,
+                    ErrorConstants.UNSUPPORTED_TYPE % stage
+                )
+        if stage:
+            tasks = tasks.filter(stage_id=stage)
+            tombstones = tombstones.filter(stage_id=stage)
+
+        changed, deleted, cursor, has_more = get_changes(
+            tasks, tombstones,
+            request.query_params.get("since"),
+            request.query_params.get("limit")
+        )
+        if flattener:
+            results = [flattener.flatten_response(task) for task in changed]
+        else:
+            results = TaskChangeSerializer(changed, many=True).data
+        return Response({
+            "results": results,
+            "deleted": TaskTombstoneSerializer(deleted, many=True).data,
+            "cursor": cursor,
+            "has_more": has_more,
+        })
+
     @paginate
     @action(detail=True)
     def get_integrated_tasks(self, request, pk=None):
@@ -1238,6 +1360,22 @@ class TaskViewSet(viewsets.ModelViewSet):
         tasks = tasks.filter(out_tasks=self.get_object())
         return tasks
 
+    @action(detail=True, methods=['get'])
+    def propagation_status(self, request, pk=None):
+        """
+        Get:
+        Return state of the latest chain propagation of the task.
+        """
+        task = self.get_object()
+        job = task.propagation_jobs.order_by('-created_at').first()
+        if job is None:
+            raise CustomApiException(
+                status.HTTP_404_NOT_FOUND,
+                ErrorConstants.ENTITY_DOESNT_EXIST % ('Propagation of task',
+                                                      task.id)
+            )
+        return Response(PropagationJobSerializer(job).data)
+
     @action(detail=True, methods=['post', 'get'])
     def request_assignment(self, request, pk=None):
         """
@@ -1597,6 +1735,7 @@ class NotificationViewSet(viewsets.ModelViewSet):
     #     'updated_at': ['lte', 'gte']
     # }
     permission_classes = (NotificationAccessPolicy,)
+    unfiltered_count_strategy = CountStrategy.ESTIMATE
     filterset_fields = {
         "campaign": ["exact"],
         "rank": ["exact"],
@@ -1714,39 +1853,74 @@ class ResponseFlattenerViewSet(viewsets.ModelViewSet):
     @action(detail=True)
     def csv(self, request, pk=None):
         response_flattener = self.get_object()
-        tasks = response_flattener.task_stage.tasks.all()
+        if request.query_params.get("background"):
+            job = enqueue_export_job(
+                request.user, ExportJobConstants.RESPONSE_FLATTENER,
+                {"response_flattener": response_flattener.id},
+                campaign=response_flattener.get_campaign(), shared=True
+            )
+            return Response(ExportJobSerializer(job).data,
+                            status=status.HTTP_202_ACCEPTED)
+
+        chunks = get_csv_chunks(response_flattener)
         filename = 'results'
-        response = HttpResponse(
-            content_type='text/csv',
-            headers={
-                'Content-Disposition': f'attachment; filename="{filename}.csv"'
-            },
-        )
-        items = []
-        columns = set()
-        for task in tasks:
-            row = response_flattener.flatten_response(task)
-            items.append(row)
-            [columns.add(i) for i in row.keys()]
-        ordered_columns = response_flattener.ordered_columns()
-
-        columns_not_in_main_schema = utils.array_difference(columns,
-                                                            ordered_columns + response_flattener.columns)
-        if columns_not_in_main_schema:
-            for i in items:
-                for column in columns_not_in_main_schema:
-                    if column in i.keys():
-                        del i[column]
-            col = ["description"]
-            ordered_columns += col
-            items[0][col[0]] = ", ".join(columns_not_in_main_schema)
-
-        writer = csv.DictWriter(response, fieldnames=ordered_columns)
-        writer.writeheader()
-        writer.writerows(items)
+        headers = {
+            'Content-Disposition': f'attachment; filename="{filename}.csv"'
+        }
+        # Large stages are exported with ?stream=true, chunks of rows are
+        # sent as soon as they are written.
+        if request.query_params.get("stream") == "true":
+            return StreamingHttpResponse(
+                (text for rows, text in chunks),
+                content_type='text/csv',
+                headers=headers,
+            )
+
+        response = HttpResponse(content_type='text/csv', headers=headers)
+        for rows, text in chunks:
+            response.write(text)
         return response
 
 
+class ExportJobViewSet(mixins.ListModelMixin, mixins.RetrieveModelMixin,
+                       GenericViewSet):
+    """
+    list:
+    Return export jobs of the user and of managed campaigns.
+    Jobs are started by csv endpoints with background=true.
+    read:
+    Return state and progress of the export job.
+    download:
+    Return csv file of the finished export job. Supports Range
+    requests, so interrupted downloads can be resumed.
+    """
+
+    filterset_fields = {
+        'kind': ['exact'],
+        'status': ['exact'],
+        'campaign': ['exact'],
+    }
+    serializer_class = ExportJobSerializer
+    permission_classes = (ExportJobAccessPolicy,)
+
+    def get_queryset(self):
+        return ExportJobAccessPolicy.scope_queryset(
+            self.request, ExportJob.objects.order_by('-created_at')
+        )
+
+    @paginate
+    def list(self, request, *args, **kwargs):
+        return self.filter_queryset(self.get_queryset())
+
+    @action(detail=True)
+    def download(self, request, pk=None):
+        job = self.get_object()
+        if not job.is_ready:
+            raise CustomApiException(status.HTTP_409_CONFLICT,
+                                     ErrorConstants.EXPORT_NOT_READY)
+        return download_response(job, request.META.get("HTTP_RANGE"))
+
+
 class TaskAwardViewSet(viewsets.ModelViewSet):
     filterset_fields = {
         'task_stage_completion': ['exact'],
@@ -1796,8 +1970,9 @@ class TestWebhookViewSet(viewsets.ModelViewSet):
         webhook = Webhook.objects.filter(
             task_stage=expected_task.stage.pk).get()
         if webhook:
-            response = requests.post(webhook.url, json=sent_task.responses,
-                                     headers={}).json()
+            response = transport.post(webhook.url, json=sent_task.responses,
+                                      headers={},
+                                      error_source=webhook.task_stage).json()
         else:
             return Response(status=status.HTTP_400_BAD_REQUEST)
         if response == expected_task.responses:
@@ -2065,4 +2240,64 @@ class VolumeViewSet(viewsets.ModelViewSet):
                 user_has_closing_ranks=Value(False)
             )
 
-        return qs
\ No newline at end of file
+        return qs
+
+
+class PropagationStepStatViewSet(mixins.ListModelMixin, GenericViewSet):
+    """
+    list:
+    Return cost of chain propagation steps on stages of managed campaigns,
+    collected from sampled propagations.
+
+    metrics:
+    Return the same stats in the Prometheus text format, with webhook
+    transport metrics of the hosts of managed campaigns' webhooks.
+    """
+
+    filterset_fields = {
+        'campaign': ['exact'],
+        'chain': ['exact'],
+        'stage': ['exact'],
+        'step': ['exact'],
+    }
+    filter_backends = [DjangoFilterBackend, OrderingFilter]
+    ordering_fields = ['seconds', 'max_seconds', 'queries', 'calls']
+    serializer_class = PropagationStepStatSerializer
+    permission_classes = (PropagationStepStatAccessPolicy,)
+
+    def get_queryset(self):
+        return PropagationStepStatAccessPolicy.scope_queryset(
+            self.request, PropagationStepStat.objects.order_by('-seconds')
+        )
+
+    @paginate
+    def list(self, request, *args, **kwargs):
+        return self.filter_queryset(self.get_queryset())
+
+    @action(detail=False, methods=['get'])
+    def metrics(self, request, *args, **kwargs):
+        """
+        Get:
+        Return propagation step stats in the Prometheus text format.
+        Webhook transport metrics are counted per process, so they are
+        those of the process serving the request.
+        """
+        stats = self.filter_queryset(self.get_queryset()).order_by('id')
+        campaign_ids = get_user_access_context(request).managed_campaign_ids
+        hosts = self.get_webhook_hosts(campaign_ids)
+        content = export_prometheus(stats.iterator()) \
+            + export_transport_prometheus(transport.get_metrics(hosts))
+        return HttpResponse(content, content_type='text/plain; version=0.0.4')
+
+    @staticmethod
+    def get_webhook_hosts(campaign_ids):
+        urls = list(
+            TaskStage.objects.filter(chain__campaign_id__in=campaign_ids)
+            .exclude(webhook_address__isnull=True)
+            .exclude(webhook_address='')
+            .values_list('webhook_address', flat=True)
+        )
+        urls += Webhook.objects.filter(
+            task_stage__chain__campaign_id__in=campaign_ids
+        ).values_list('url', flat=True)
+        return {urlsplit(url).netloc for url in urls}
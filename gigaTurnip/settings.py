@@ -208,7 +208,7 @@ REST_FRAMEWORK = {
     ],
     "DEFAULT_FILTER_BACKENDS": ["django_filters.rest_framework.DjangoFilterBackend"],
     "DEFAULT_SCHEMA_CLASS": "rest_framework.schemas.coreapi.AutoSchema",
-    "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.LimitOffsetPagination",
+    "DEFAULT_PAGINATION_CLASS": "api.utils.pagination.CountingLimitOffsetPagination",
     "PAGE_SIZE": 10,
     "EXCEPTION_HANDLER": "api.api_exceptions.custom_exception_handler",
     "DEFAULT_RENDERER_CLASSES": [
@@ -254,3 +254,61 @@ Q_CLUSTER = {
     "orm": "default",
     "save_limit": 25000,
 }
+
+# Seconds a process keeps selectable stages of a user cached. Entries are
+# keyed by versions checked in the database, so this only bounds memory
+# taken by entries of old versions.
+SELECTABLE_STAGES_MAX_AGE = 60
+
+# Seconds the ids access policies scope a user's querysets by are cached.
+# Entries are keyed by versions checked in the database, so this only
+# bounds memory taken by entries of old versions.
+ACCESS_SCOPE_MAX_AGE = 300
+
+# File storage background exports are written to, see
+# api.utils.exports. BACKEND is any django storage class.
+EXPORT_STORAGE = {
+    "BACKEND": "django.core.files.storage.FileSystemStorage",
+    "OPTIONS": {"location": os.path.join(BASE_DIR, "exports")},
+}
+
+# Seconds an export job may run on the django_q cluster.
+EXPORT_JOB_TIMEOUT = 3600
+
+# Seconds an in progress export job may go without saving progress before
+# it is failed and identical exports start a new job.
+EXPORT_JOB_LEASE = 600
+
+# Counting of paginated lists, see api.utils.pagination.CountingMixin.
+# strategy is one of "exact", "estimate" and "cached".
+PAGINATION_COUNT = {
+    "strategy": "exact",
+    "estimate_threshold": 10000,
+    "cache_timeout": 30,
+}
+
+# Outgoing webhook requests: timeouts are in seconds, retries are used
+# on connection errors and on 502-504 of idempotent requests. After
+# breaker_threshold consecutive failures requests to the host fail fast
+# for breaker_cooldown seconds.
+WEBHOOK_TRANSPORT = {
+    "connect_timeout": 3.05,
+    "read_timeout": 30,
+    "retries": 2,
+    "backoff": 0.5,
+    "pool_connections": 10,
+    "pool_maxsize": 10,
+    "breaker_threshold": 5,
+    "breaker_cooldown": 30,
+    "max_workers": 8,
+}
+
+# Audit logs of a transaction are written after it commits. When True
+# they are written by the django_q cluster instead of the request.
+AUDIT_LOG_ASYNC = True
+
+# Share of chain propagations profiled step by step into
+# PropagationStepStat, from 0 (off) to 1 (every propagation).
+PROPAGATION_PROFILING = {
+    "sample_rate": float(os.getenv("PROPAGATION_PROFILING_SAMPLE_RATE", 0)),
+}